@@ -0,0 +1,111 @@
+# activity_log.py
+"""
+Аудит действий пользователей в lib.user_activity_log без задержки ответа.
+
+После каждого запроса вошедшего пользователя (user_id в таблице обязателен) собирается
+запись: действие (endpoint), ресурс из параметров пути (/books/<int:book_id> -> book, id),
+IP, User-Agent, метод и код ответа. Запись кладётся в очередь EventSink и вставляется
+пачкой фоновым потоком; на пути запроса — только выбор по выборке и put_nowait.
+
+Выборка (доля записываемых запросов):
+    ACTIVITY_SAMPLE_READ   для GET/HEAD/OPTIONS (0.1)
+    ACTIVITY_SAMPLE_WRITE  для остальных методов (1 — изменения пишутся всегда)
+    ACTIVITY_SAMPLE_RATES  переопределения по действию: "books_list=0.01,book_detail=0.5"
+Доля записана в additional_data.sample_rate: оценка числа запросов — сумма 1/sample_rate.
+
+ACTIVITY_LOG=0 отключает аудит. Очередь настраивается как у event_sink с префиксом
+ACTIVITY_LOG_ (по умолчанию при переполнении записи отбрасываются: аудит не тормозит ответы).
+"""
+import json
+import os
+import random
+from datetime import datetime
+
+from flask import request
+from flask_login import current_user
+
+from event_sink import EventSink
+from models import UserActivityLog
+
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# Служебные endpoint'ы не аудируются
+SKIP_ENDPOINTS = frozenset({"static", "metrics", "debug_queries", "debug_pool"})
+USER_AGENT_MAX = 512
+
+_sink = EventSink(UserActivityLog.__table__, env_prefix="ACTIVITY_LOG", default_overflow="drop")
+
+
+def _parse_rates(raw: str) -> dict:
+    rates = {}
+    for part in filter(None, (p.strip() for p in raw.split(","))):
+        action, _, rate = part.partition("=")
+        rates[action.strip()] = float(rate)
+    return rates
+
+
+class Sampler:
+    """Доля записываемых запросов по действию и методу."""
+
+    def __init__(self, read: float = 0.1, write: float = 1.0, overrides: dict | None = None):
+        self.read = read
+        self.write = write
+        self.overrides = overrides or {}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            read=float(os.getenv("ACTIVITY_SAMPLE_READ", "0.1")),
+            write=float(os.getenv("ACTIVITY_SAMPLE_WRITE", "1")),
+            overrides=_parse_rates(os.getenv("ACTIVITY_SAMPLE_RATES", "")),
+        )
+
+    def rate(self, action: str, method: str) -> float:
+        rate = self.overrides.get(action)
+        if rate is None:
+            rate = self.read if method in READ_METHODS else self.write
+        return rate
+
+
+def _resource(view_args: dict | None):
+    """Последний целочисленный параметр пути *_id — ресурс действия."""
+    for name, value in reversed(list((view_args or {}).items())):
+        if name.endswith("_id") and isinstance(value, int):
+            return name[:-len("_id")], value
+    return None, None
+
+
+def activity_row(user_id: int, action: str, rate: float, status: int) -> dict:
+    resource_type, resource_id = _resource(request.view_args)
+    return {
+        "user_id": user_id,
+        "action": action,
+        "resource_type": resource_type,
+        "resource_id": resource_id,
+        "ip_address": request.remote_addr,
+        "user_agent": (request.user_agent.string or "")[:USER_AGENT_MAX] or None,
+        "created_at": datetime.utcnow(),
+        "additional_data": json.dumps({"method": request.method, "status": status, "sample_rate": rate}),
+    }
+
+
+def init_app(app, engine_getter):
+    """Подключает аудит ко всем роутам; engine_getter() -> engine, в который пишутся записи."""
+    if os.getenv("ACTIVITY_LOG", "1") in ("0", "false", "no"):
+        return
+    sampler = Sampler.from_env()
+    _sink.default_engine = engine_getter()
+
+    def record_activity(response):
+        action = request.endpoint
+        if action is None or action in SKIP_ENDPOINTS:
+            return response
+        rate = sampler.rate(action, request.method)
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return response
+        user_id = current_user.get_id()
+        if user_id is None:
+            return response
+        _sink.put(engine_getter(), activity_row(int(user_id), action, rate, response.status_code))
+        return response
+
+    app.after_request(record_activity)
@@ -0,0 +1,37 @@
+"""Add composite indexes for borrow history keyset pagination
+
+Revision ID: 003_borrow_history_indexes
+Revises: 002_user_activity_log
+Create Date: 2024-01-03 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '003_borrow_history_indexes'
+down_revision: Union[str, None] = '002_user_activity_log'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Имя индекса -> определение. IF NOT EXISTS: индексы могли быть уже созданы через Base.metadata.create_all
+INDEXES = {
+    'ix_borrows_borrowed_at_id': '(borrowed_at, id)',
+    'ix_borrows_student_borrowed_at_id': '(student_id, borrowed_at, id)',
+    'ix_borrows_book_borrowed_at_id': '(book_id, borrowed_at, id)',
+    'ix_borrows_branch_borrowed_at_id': '(branch_id, borrowed_at, id)',
+    # Частичный индекс для фильтра "только не возвращённые"
+    'ix_borrows_active_borrowed_at_id': '(borrowed_at, id) WHERE returned_at IS NULL',
+}
+
+
+def upgrade() -> None:
+    for name, definition in INDEXES.items():
+        op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON lib.borrows {definition}')
+
+
+def downgrade() -> None:
+    for name in INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS lib.{name}')
@@ -0,0 +1,57 @@
+"""Add denormalized active_count to inventories
+
+Revision ID: 004_inventory_active_count
+Revises: 003_borrow_history_indexes
+Create Date: 2024-01-04 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision: str = '004_inventory_active_count'
+down_revision: Union[str, None] = '003_borrow_history_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    columns = [c['name'] for c in inspector.get_columns('inventories', schema='lib')]
+
+    # Колонка могла быть уже создана через Base.metadata.create_all
+    if 'active_count' not in columns:
+        op.add_column(
+            'inventories',
+            sa.Column('active_count', sa.Integer(), nullable=False, server_default=sa.text('0')),
+            schema='lib'
+        )
+
+    # Backfill: число невозвращённых выдач по каждой паре (book_id, branch_id)
+    op.execute("""
+        UPDATE lib.inventories i
+        SET active_count = COALESCE(a.cnt, 0)
+        FROM lib.inventories i2
+        LEFT JOIN (
+            SELECT book_id, branch_id, COUNT(*) AS cnt
+            FROM lib.borrows
+            WHERE returned_at IS NULL
+            GROUP BY book_id, branch_id
+        ) a ON a.book_id = i2.book_id AND a.branch_id = i2.branch_id
+        WHERE i2.id = i.id
+    """)
+
+    checks = [c['name'] for c in inspector.get_check_constraints('inventories', schema='lib')]
+    if 'ck_inventories_active_nonneg' not in checks:
+        op.create_check_constraint(
+            'ck_inventories_active_nonneg', 'inventories', 'active_count >= 0', schema='lib'
+        )
+
+
+def downgrade() -> None:
+    op.drop_constraint('ck_inventories_active_nonneg', 'inventories', type_='check', schema='lib')
+    op.drop_column('inventories', 'active_count', schema='lib')
@@ -0,0 +1,48 @@
+"""Deduplicate authors and make full_name unique
+
+Revision ID: 005_unique_author_names
+Revises: 004_inventory_active_count
+Create Date: 2024-01-05 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision: str = '005_unique_author_names'
+down_revision: Union[str, None] = '004_inventory_active_count'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    constraints = [c['name'] for c in inspector.get_unique_constraints('authors', schema='lib')]
+    if 'uq_authors_full_name' in constraints:
+        return
+
+    # Дубликаты по имени сливаем в автора с минимальным id: сначала переносим связи с книгами
+    op.execute("""
+        WITH keep AS (
+            SELECT full_name, MIN(id) AS keep_id FROM lib.authors GROUP BY full_name HAVING COUNT(*) > 1
+        )
+        INSERT INTO lib.book_authors (book_id, author_id)
+        SELECT ba.book_id, keep.keep_id
+        FROM lib.book_authors ba
+        JOIN lib.authors a ON a.id = ba.author_id
+        JOIN keep ON keep.full_name = a.full_name AND a.id <> keep.keep_id
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute("""
+        DELETE FROM lib.authors a
+        USING lib.authors b
+        WHERE a.full_name = b.full_name AND a.id > b.id
+    """)
+    op.create_unique_constraint('uq_authors_full_name', 'authors', ['full_name'], schema='lib')
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_authors_full_name', 'authors', type_='unique', schema='lib')
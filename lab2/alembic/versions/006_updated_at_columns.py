@@ -0,0 +1,88 @@
+"""Add updated_at to books, branches, students, inventories; delete counters for ETag markers
+
+Revision ID: 006_updated_at_columns
+Revises: 005_unique_author_names
+Create Date: 2024-01-06 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision: str = '006_updated_at_columns'
+down_revision: Union[str, None] = '005_unique_author_names'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('books', 'branches', 'students', 'inventories')
+
+# Удаление не меняет ни max(id), ни max(updated_at): маркер условного GET (app.table_marker)
+# берёт число операторов DELETE/TRUNCATE из lib.table_deletes вместо count(*) по таблице.
+# Триггер уровня оператора: массовое удаление — одно обновление счётчика
+COUNT_DELETES_FUNCTION = """
+    CREATE OR REPLACE FUNCTION lib.trg_count_deletes()
+    RETURNS TRIGGER AS $$
+    BEGIN
+      INSERT INTO lib.table_deletes AS d (table_name, deletes) VALUES (TG_TABLE_NAME, 1)
+      ON CONFLICT (table_name) DO UPDATE SET deletes = d.deletes + 1;
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+
+def _utc_now(conn):
+    # now() в колонке timestamp — местное время сервера, а ORM пишет datetime.utcnow()
+    if conn.dialect.name == 'postgresql':
+        return sa.text("timezone('utc', now())")
+    return sa.func.now()
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    for table in TABLES:
+        columns = [c['name'] for c in inspector.get_columns(table, schema='lib')]
+        # Колонка могла быть уже создана через Base.metadata.create_all;
+        # существующие строки получают время из server_default — в UTC, как и записи ORM
+        if 'updated_at' not in columns:
+            op.add_column(
+                table,
+                sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=_utc_now(conn)),
+                schema='lib'
+            )
+        # max(updated_at) для маркера ETag — по индексу; индекс мог быть уже создан через create_all
+        indexes = [i['name'] for i in inspector.get_indexes(table, schema='lib')]
+        if f'ix_{table}_updated_at' not in indexes:
+            op.create_index(f'ix_{table}_updated_at', table, ['updated_at'], schema='lib')
+
+    if conn.dialect.name != 'postgresql':
+        return
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS lib.table_deletes (
+          table_name text PRIMARY KEY,
+          deletes bigint NOT NULL DEFAULT 0
+        )
+    """)
+    op.execute(COUNT_DELETES_FUNCTION)
+    for table in TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_count_deletes ON lib.{table}")
+        op.execute(f"""
+            CREATE TRIGGER {table}_count_deletes AFTER DELETE OR TRUNCATE ON lib.{table}
+            FOR EACH STATEMENT EXECUTE FUNCTION lib.trg_count_deletes()
+        """)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in TABLES:
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_count_deletes ON lib.{table}")
+        op.execute("DROP FUNCTION IF EXISTS lib.trg_count_deletes()")
+        op.execute("DROP TABLE IF EXISTS lib.table_deletes")
+    for table in TABLES:
+        op.drop_index(f'ix_{table}_updated_at', table_name=table, schema='lib')
+        op.drop_column(table, 'updated_at', schema='lib')
@@ -0,0 +1,121 @@
+"""Monthly range partitions for event_log and user_activity_log
+
+Revision ID: 007_partition_log_tables
+Revises: 006_updated_at_columns
+Create Date: 2024-01-07 00:00:00.000000
+
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision: str = '007_partition_log_tables'
+down_revision: Union[str, None] = '006_updated_at_columns'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Секции вперёд от текущего месяца; дальше их создаёт partitions.maintain()
+MONTHS_AHEAD = 3
+
+TABLES = ('event_log', 'user_activity_log')
+
+
+def _add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _is_partitioned(conn, table: str) -> bool:
+    return bool(conn.execute(text(
+        "SELECT c.relkind = 'p' FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = 'lib' AND c.relname = :table"
+    ), {"table": table}).scalar())
+
+
+def _partition_table(conn, table: str) -> None:
+    old = f"{table}_unpartitioned"
+    op.execute(f"ALTER TABLE lib.{table} RENAME TO {old}")
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": f"lib.{old}"}).scalar()
+
+    # Родитель с теми же колонками и значениями по умолчанию (nextval той же последовательности)
+    op.execute(f"""
+        CREATE TABLE lib.{table} (LIKE lib.{old} INCLUDING DEFAULTS)
+        PARTITION BY RANGE (created_at)
+    """)
+    # Строку без created_at (триггер инвентаря пишет только event и details) некуда направить
+    op.execute(f"ALTER TABLE lib.{table} ALTER COLUMN created_at SET DEFAULT timezone('utc', now())")
+    op.execute(f"CREATE TABLE lib.{table}_default PARTITION OF lib.{table} DEFAULT")
+
+    # Помесячные секции: от месяца самой старой записи до текущего + MONTHS_AHEAD
+    oldest = conn.execute(text(f"SELECT min(created_at) FROM lib.{old}")).scalar()
+    current = date(datetime.utcnow().year, datetime.utcnow().month, 1)
+    month = date(oldest.year, oldest.month, 1) if oldest else current
+    while month <= _add_months(current, MONTHS_AHEAD):
+        nxt = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE lib.{table}_p{month:%Y%m} PARTITION OF lib.{table} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{nxt.isoformat()}')"
+        )
+        month = nxt
+
+    op.execute(f"INSERT INTO lib.{table} SELECT * FROM lib.{old}")
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY lib.{table}.id")
+    op.execute(f"DROP TABLE lib.{old}")
+
+    # Ключ секционированной таблицы обязан включать created_at; id по-прежнему уникален (последовательность)
+    op.execute(f"ALTER TABLE lib.{table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, created_at)")
+    # BRIN по времени вставки: килобайты вместо B-tree размером с таблицу, строки и так упорядочены
+    op.execute(f"CREATE INDEX ix_{table}_created_at_brin ON lib.{table} USING brin (created_at)")
+    if table == 'user_activity_log':
+        _activity_user_fk_and_index()
+
+
+def _activity_user_fk_and_index() -> None:
+    op.execute("""
+        ALTER TABLE lib.user_activity_log
+        ADD CONSTRAINT user_activity_log_user_id_fkey
+        FOREIGN KEY (user_id) REFERENCES lib.users (id) ON DELETE CASCADE
+    """)
+    op.execute("CREATE INDEX ix_user_activity_log_user_id ON lib.user_activity_log (user_id)")
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+
+    for table in TABLES:
+        # Таблица могла быть уже секционирована (повторный прогон после ручного восстановления)
+        if _is_partitioned(conn, table):
+            continue
+        _partition_table(conn, table)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+
+    for table in TABLES:
+        if not _is_partitioned(conn, table):
+            continue
+        partitioned = f"{table}_partitioned"
+        op.execute(f"ALTER TABLE lib.{table} RENAME TO {partitioned}")
+        op.execute(f"ALTER TABLE lib.{partitioned} RENAME CONSTRAINT {table}_pkey TO {partitioned}_pkey")
+        sequence = conn.execute(
+            text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": f"lib.{partitioned}"}
+        ).scalar()
+        op.execute(f"CREATE TABLE lib.{table} (LIKE lib.{partitioned} INCLUDING DEFAULTS)")
+        op.execute(f"INSERT INTO lib.{table} SELECT * FROM lib.{partitioned}")
+        if sequence:
+            op.execute(f"ALTER SEQUENCE {sequence} OWNED BY lib.{table}.id")
+        # Снятые (detach) секции остаются отдельными таблицами и в обратную миграцию не входят
+        op.execute(f"DROP TABLE lib.{partitioned} CASCADE")
+        op.execute(f"ALTER TABLE lib.{table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)")
+        if table == 'user_activity_log':
+            op.execute("CREATE INDEX ix_user_activity_log_created_at ON lib.user_activity_log (created_at)")
+            _activity_user_fk_and_index()
@@ -0,0 +1,96 @@
+"""JSONB details and search indexes for event_log
+
+Revision ID: 008_event_log_jsonb_search
+Revises: 007_partition_log_tables
+Create Date: 2024-01-08 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision: str = '008_event_log_jsonb_search'
+down_revision: Union[str, None] = '007_partition_log_tables'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Имя индекса -> определение. На секционированной таблице индекс создаётся в каждой секции.
+# IF NOT EXISTS: btree-индексы могли быть уже созданы через Base.metadata.create_all
+INDEXES = {
+    # Лента журнала и фильтр по типу события: keyset-страница — один проход по индексу
+    'ix_event_log_created_at_id': '(created_at, id)',
+    'ix_event_log_event_created_at_id': '(event, created_at, id)',
+    # Поиск по ключам details (details @> '{"book_id": 5}'); jsonb_path_ops компактнее и нужен только @>
+    'ix_event_log_details_gin': 'USING gin (details jsonb_path_ops)',
+}
+
+TRIGGER_FUNCTION = """
+    CREATE OR REPLACE FUNCTION lib.trg_inventories_validate()
+    RETURNS TRIGGER AS $$
+    BEGIN
+      IF NEW.copies_total < 0 THEN
+        INSERT INTO lib.event_log(event, details) VALUES
+          ('NEGATIVE_INVENTORY_ATTEMPT', {details});
+        RAISE EXCEPTION 'Количество экземпляров не может быть отрицательным';
+      END IF;
+      RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+
+def _details_type(conn) -> str | None:
+    return conn.execute(text(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_schema = 'lib' AND table_name = 'event_log' AND column_name = 'details'"
+    )).scalar()
+
+
+def _has_trigger_function(conn) -> bool:
+    return conn.execute(text("SELECT to_regproc('lib.trg_inventories_validate') IS NOT NULL")).scalar()
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+
+    if _details_type(conn) == 'text':
+        # Старые строки писались вручную как текст: невалидный JSON сохраняется JSON-строкой, а не роняет миграцию
+        op.execute("""
+            CREATE FUNCTION lib.event_details_to_jsonb(value text) RETURNS jsonb AS $$
+            BEGIN
+              RETURN value::jsonb;
+            EXCEPTION WHEN others THEN
+              RETURN to_jsonb(value);
+            END;
+            $$ LANGUAGE plpgsql IMMUTABLE
+        """)
+        # Переписывает все присоединённые секции; снятые (detach) секции остаются с text
+        op.execute(
+            "ALTER TABLE lib.event_log ALTER COLUMN details TYPE jsonb "
+            "USING lib.event_details_to_jsonb(details)"
+        )
+        op.execute("DROP FUNCTION lib.event_details_to_jsonb(text)")
+
+    if _has_trigger_function(conn):
+        op.execute(TRIGGER_FUNCTION.format(details="to_jsonb(NEW)"))
+
+    for name, definition in INDEXES.items():
+        op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON lib.event_log {definition}')
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+
+    for name in INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS lib.{name}')
+    if _details_type(conn) == 'jsonb':
+        op.execute("ALTER TABLE lib.event_log ALTER COLUMN details TYPE text USING details::text")
+    if _has_trigger_function(conn):
+        op.execute(TRIGGER_FUNCTION.format(details="to_json(NEW)::text"))
@@ -0,0 +1,195 @@
+"""Full-text catalog search: books.search_vector, search_words, triggers
+
+Revision ID: 009_catalog_search
+Revises: 008_event_log_jsonb_search
+Create Date: 2024-01-09 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision: str = '009_catalog_search'
+down_revision: Union[str, None] = '008_event_log_jsonb_search'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Документ книги: название — вес A, авторы — B, издательство — C (веса ts_rank 1.0 / 0.4 / 0.2)
+DOCUMENT_FUNCTION = """
+    CREATE OR REPLACE FUNCTION lib.book_search_document(p_book_id integer, p_title text, p_publisher_id integer)
+    RETURNS tsvector AS $$
+    DECLARE
+      authors text;
+      publisher text;
+    BEGIN
+      SELECT string_agg(a.full_name, ' ' ORDER BY a.full_name) INTO authors
+      FROM lib.book_authors ba JOIN lib.authors a ON a.id = ba.author_id
+      WHERE ba.book_id = p_book_id;
+      SELECT p.name INTO publisher FROM lib.publishers p WHERE p.id = p_publisher_id;
+      RETURN setweight(to_tsvector('russian', coalesce(p_title, '')), 'A')
+          || setweight(to_tsvector('russian', coalesce(authors, '')), 'B')
+          || setweight(to_tsvector('russian', coalesce(publisher, '')), 'C');
+    END;
+    $$ LANGUAGE plpgsql STABLE;
+"""
+
+# Строковый триггер: документ пересчитывается при вставке и смене названия или издательства
+BOOKS_FUNCTION = """
+    CREATE OR REPLACE FUNCTION lib.trg_books_search_vector()
+    RETURNS TRIGGER AS $$
+    BEGIN
+      NEW.search_vector := lib.book_search_document(NEW.id, NEW.title, NEW.publisher_id);
+      RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Триггеры уровня оператора (таблица переходов changed): одна пересборка документов на весь
+# оператор — импорт каталога через COPY не платит отдельным UPDATE за каждую связь
+REFRESH_FUNCTION = """
+    CREATE OR REPLACE FUNCTION lib.trg_book_search_refresh()
+    RETURNS TRIGGER AS $$
+    BEGIN
+      IF TG_TABLE_NAME = 'book_authors' THEN
+        UPDATE lib.books b SET search_vector = lib.book_search_document(b.id, b.title, b.publisher_id)
+        WHERE b.id IN (SELECT book_id FROM changed);
+      ELSIF TG_TABLE_NAME = 'authors' THEN
+        UPDATE lib.books b SET search_vector = lib.book_search_document(b.id, b.title, b.publisher_id)
+        WHERE b.id IN (SELECT ba.book_id FROM lib.book_authors ba JOIN changed c ON c.id = ba.author_id);
+      ELSE
+        UPDATE lib.books b SET search_vector = lib.book_search_document(b.id, b.title, b.publisher_id)
+        WHERE b.publisher_id IN (SELECT id FROM changed);
+      END IF;
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Словарь для исправления опечаток: слова без стемминга (конфигурация simple) от трёх букв
+WORDS_FUNCTION = """
+    CREATE OR REPLACE FUNCTION lib.trg_search_words()
+    RETURNS TRIGGER AS $$
+    BEGIN
+      IF TG_TABLE_NAME = 'books' THEN
+        INSERT INTO lib.search_words (word)
+        SELECT DISTINCT w FROM changed c, unnest(tsvector_to_array(to_tsvector('simple', c.title))) AS w
+        WHERE length(w) >= 3
+        ON CONFLICT DO NOTHING;
+      ELSIF TG_TABLE_NAME = 'authors' THEN
+        INSERT INTO lib.search_words (word)
+        SELECT DISTINCT w FROM changed c, unnest(tsvector_to_array(to_tsvector('simple', c.full_name))) AS w
+        WHERE length(w) >= 3
+        ON CONFLICT DO NOTHING;
+      ELSE
+        INSERT INTO lib.search_words (word)
+        SELECT DISTINCT w FROM changed c, unnest(tsvector_to_array(to_tsvector('simple', c.name))) AS w
+        WHERE length(w) >= 3
+        ON CONFLICT DO NOTHING;
+      END IF;
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Имя триггера -> (таблица, определение)
+TRIGGERS = {
+    'books_search_vector': (
+        'books',
+        'BEFORE INSERT OR UPDATE OF title, publisher_id ON lib.books '
+        'FOR EACH ROW EXECUTE FUNCTION lib.trg_books_search_vector()',
+    ),
+    'book_authors_search_insert': (
+        'book_authors',
+        'AFTER INSERT ON lib.book_authors REFERENCING NEW TABLE AS changed '
+        'FOR EACH STATEMENT EXECUTE FUNCTION lib.trg_book_search_refresh()',
+    ),
+    'book_authors_search_delete': (
+        'book_authors',
+        'AFTER DELETE ON lib.book_authors REFERENCING OLD TABLE AS changed '
+        'FOR EACH STATEMENT EXECUTE FUNCTION lib.trg_book_search_refresh()',
+    ),
+    'authors_search_refresh': (
+        'authors',
+        'AFTER UPDATE ON lib.authors REFERENCING NEW TABLE AS changed '
+        'FOR EACH STATEMENT EXECUTE FUNCTION lib.trg_book_search_refresh()',
+    ),
+    'publishers_search_refresh': (
+        'publishers',
+        'AFTER UPDATE ON lib.publishers REFERENCING NEW TABLE AS changed '
+        'FOR EACH STATEMENT EXECUTE FUNCTION lib.trg_book_search_refresh()',
+    ),
+}
+for _table in ('books', 'authors', 'publishers'):
+    # Столбец в списке UPDATE OF с таблицей переходов недопустим: вставка и изменение — отдельно
+    for _event in ('INSERT', 'UPDATE'):
+        TRIGGERS[f'{_table}_search_words_{_event.lower()}'] = (
+            _table,
+            f'AFTER {_event} ON lib.{_table} REFERENCING NEW TABLE AS changed '
+            f'FOR EACH STATEMENT EXECUTE FUNCTION lib.trg_search_words()',
+        )
+
+FUNCTIONS = {
+    'book_search_document(integer, text, integer)': DOCUMENT_FUNCTION,
+    'trg_books_search_vector()': BOOKS_FUNCTION,
+    'trg_book_search_refresh()': REFRESH_FUNCTION,
+    'trg_search_words()': WORDS_FUNCTION,
+}
+
+
+def _has_extension(conn, name: str) -> bool:
+    return conn.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = :name)"), {"name": name}
+    ).scalar()
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+
+    # IF NOT EXISTS: колонка и таблица могли быть уже созданы через Base.metadata.create_all
+    op.execute("ALTER TABLE lib.books ADD COLUMN IF NOT EXISTS search_vector tsvector")
+    op.execute("CREATE TABLE IF NOT EXISTS lib.search_words (word text PRIMARY KEY)")
+    for definition in FUNCTIONS.values():
+        op.execute(definition)
+
+    # Заполнение существующего каталога — до триггеров, одним проходом по каждой таблице
+    op.execute(
+        "UPDATE lib.books SET search_vector = lib.book_search_document(id, title, publisher_id) "
+        "WHERE search_vector IS NULL"
+    )
+    for table, column in (('books', 'title'), ('authors', 'full_name'), ('publishers', 'name')):
+        op.execute(f"""
+            INSERT INTO lib.search_words (word)
+            SELECT DISTINCT w FROM lib.{table}, unnest(tsvector_to_array(to_tsvector('simple', {column}))) AS w
+            WHERE length(w) >= 3
+            ON CONFLICT DO NOTHING
+        """)
+
+    for name, (table, definition) in TRIGGERS.items():
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON lib.{table}")
+        op.execute(f"CREATE TRIGGER {name} {definition}")
+
+    op.execute("CREATE INDEX IF NOT EXISTS ix_books_search_vector ON lib.books USING gin (search_vector)")
+    # pg_trgm — contrib-модуль; без него поиск работает, но опечатки не исправляются
+    if _has_extension(conn, 'pg_trgm'):
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_search_words_trgm ON lib.search_words USING gin (word gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+
+    for name, (table, _) in TRIGGERS.items():
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON lib.{table}")
+    for signature in FUNCTIONS:
+        op.execute(f"DROP FUNCTION IF EXISTS lib.{signature}")
+    op.execute("DROP TABLE IF EXISTS lib.search_words")
+    op.execute("DROP INDEX IF EXISTS lib.ix_books_search_vector")
+    op.execute("ALTER TABLE lib.books DROP COLUMN IF EXISTS search_vector")
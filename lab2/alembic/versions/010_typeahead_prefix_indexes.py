@@ -0,0 +1,40 @@
+"""Prefix indexes for typeahead lookups on students, books, branches
+
+Revision ID: 010_typeahead_prefix_indexes
+Revises: 009_catalog_search
+Create Date: 2024-01-10 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '010_typeahead_prefix_indexes'
+down_revision: Union[str, None] = '009_catalog_search'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Имя индекса -> (таблица, колонка). Выражение совпадает с typeahead._pg_suggest: в collation C
+# LIKE 'префикс%' — диапазон индекса, а ORDER BY идёт в порядке индекса
+INDEXES = {
+    'ix_students_full_name_prefix': ('students', 'full_name'),
+    'ix_books_title_prefix': ('books', 'title'),
+    'ix_branches_name_prefix': ('branches', 'name'),
+}
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for name, (table, column) in INDEXES.items():
+        op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON lib.{table} ((lower({column}) COLLATE "C"), id)')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for name in INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS lib.{name}')
@@ -0,0 +1,55 @@
+"""Daily circulation rollups and their refresh high-water marks
+
+Revision ID: 011_circulation_rollups
+Revises: 010_typeahead_prefix_indexes
+Create Date: 2024-01-11 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '011_circulation_rollups'
+down_revision: Union[str, None] = '010_typeahead_prefix_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # IF NOT EXISTS: таблицы и индекс могли быть уже созданы через Base.metadata.create_all
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS lib.circulation_daily (
+            day date NOT NULL,
+            book_id integer NOT NULL REFERENCES lib.books(id) ON DELETE CASCADE,
+            branch_id integer NOT NULL REFERENCES lib.branches(id) ON DELETE CASCADE,
+            faculty_id integer NOT NULL REFERENCES lib.faculties(id) ON DELETE CASCADE,
+            borrows integer NOT NULL DEFAULT 0,
+            returns integer NOT NULL DEFAULT 0,
+            loan_seconds bigint NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, book_id, branch_id, faculty_id)
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS lib.rollup_state (
+            name text PRIMARY KEY,
+            last_borrow_id integer NOT NULL DEFAULT 0,
+            last_returned_at timestamp,
+            refreshed_at timestamp
+        )
+    """)
+    # Строка отметок создаётся здесь: первые параллельные обновления блокируют её, а не вставляют
+    op.execute("INSERT INTO lib.rollup_state (name, last_borrow_id) VALUES ('circulation', 0) ON CONFLICT DO NOTHING")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_borrows_returned_at ON lib.borrows (returned_at)")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("DROP INDEX IF EXISTS lib.ix_borrows_returned_at")
+    op.execute("DROP TABLE IF EXISTS lib.rollup_state")
+    op.execute("DROP TABLE IF EXISTS lib.circulation_daily")
@@ -0,0 +1,95 @@
+"""
+Накладные расходы аудита действий (activity_log) на задержку запроса.
+
+Два экземпляра приложения — с аудитом (ACTIVITY_LOG=1, худший случай: пишется каждый
+запрос) и без него — поочерёдно обслуживают --requests запросов вошедшего пользователя
+к --path через тестовый клиент Flask. Выводятся p50/p99 обоих вариантов и прирост p99;
+код возврата 1, если прирост больше --budget-ms.
+
+Схема должна быть инициализирована: DB_BOOTSTRAP=off flask --app app init-db --demo
+Пользователь bench-activity создаётся в БД при первом запуске.
+Запуск (из lab2): python benchmarks/activity_overhead.py --requests 3000 --budget-ms 2
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_BOOTSTRAP", "off")
+
+import event_sink  # noqa: E402
+from models import Book, User  # noqa: E402
+
+BENCH_USER = "bench-activity"
+
+
+def _make_client(app_module, audit: bool, user_id: int):
+    os.environ["ACTIVITY_LOG"] = "1" if audit else "0"
+    os.environ["ACTIVITY_SAMPLE_READ"] = "1"
+    client = app_module.create_app("off").test_client()
+    with client.session_transaction() as http_session:
+        http_session["_user_id"] = str(user_id)
+        http_session["_fresh"] = True
+    return client
+
+
+def _bench_user(app_module) -> int:
+    with app_module.SessionLocal() as session:
+        user = session.query(User).filter_by(username=BENCH_USER).one_or_none()
+        if user is None:
+            user = User(username=BENCH_USER, email=f"{BENCH_USER}@example.com", password_hash="-")
+            session.add(user)
+            session.commit()
+        return user.id
+
+
+def _percentiles(latencies: list) -> tuple:
+    latencies = sorted(latencies)
+    return statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.99) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--path", default=None, help="По умолчанию — карточка первой книги")
+    parser.add_argument("--budget-ms", type=float, default=2.0, help="Допустимый прирост p99, мс")
+    args = parser.parse_args()
+
+    import app as app_module
+
+    user_id = _bench_user(app_module)
+    path = args.path
+    if path is None:
+        with app_module.SessionLocal() as session:
+            path = f"/books/{session.query(Book.id).order_by(Book.id).limit(1).scalar()}"
+    clients = {False: _make_client(app_module, False, user_id), True: _make_client(app_module, True, user_id)}
+    timings = {False: [], True: []}
+
+    for audit in (False, True):  # прогрев
+        for _ in range(100):
+            clients[audit].get(path)
+    # Чередование блоками: фоновые помехи (автовакуум, кэш ОС) делятся поровну
+    for block in range(args.requests // 100):
+        for audit in (False, True) if block % 2 else (True, False):
+            client = clients[audit]
+            for _ in range(100):
+                started = time.perf_counter()
+                client.get(path)
+                timings[audit].append(time.perf_counter() - started)
+    event_sink.flush()
+
+    print(f"{args.path or path}, {len(timings[False])} запросов на вариант, аудит каждого запроса")
+    print(f"{'аудит':<8}{'p50, мс':>10}{'p99, мс':>10}")
+    results = {}
+    for audit in (False, True):
+        results[audit] = _percentiles(timings[audit])
+        print(f"{'да' if audit else 'нет':<8}{results[audit][0]:>10.2f}{results[audit][1]:>10.2f}")
+    added = results[True][1] - results[False][1]
+    print(f"прирост p99: {added:.2f} мс (бюджет {args.budget_ms:.2f} мс)")
+    sys.exit(0 if added <= args.budget_ms else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Скорость и память CSV-выгрузки (csv_export.py): COPY TO STDOUT против серверного курсора.
+
+Каждый способ выгружает --export целиком (в /dev/null или --output) в отдельном процессе,
+чтобы пиковый RSS (ru_maxrss) не смешивался между прогонами. Выводятся объём CSV, время,
+МБ/с, RSS процесса до выгрузки и пиковый RSS.
+
+--seed N дописывает в lib.borrows возвращённые выдачи (generate_series в PostgreSQL, по
+существующим читателям, книгам и филиалам), пока их не станет не меньше N; счётчики
+инвентаря не меняются.
+
+Схема должна быть инициализирована: DB_BOOTSTRAP=off flask --app app init-db --demo
+Запуск (из lab2): python benchmarks/csv_export.py --seed 2000000 --methods copy,cursor
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_BOOTSTRAP", "off")
+
+from sqlalchemy import text  # noqa: E402
+
+_SEED_SQL = text("""
+    WITH s AS (SELECT array_agg(id) AS ids FROM lib.students),
+         b AS (SELECT array_agg(id) AS ids FROM lib.books),
+         r AS (SELECT array_agg(id) AS ids FROM lib.branches)
+    INSERT INTO lib.borrows (student_id, book_id, branch_id, borrowed_at, returned_at)
+    SELECT s.ids[1 + g % cardinality(s.ids)], b.ids[1 + g % cardinality(b.ids)],
+           r.ids[1 + g % cardinality(r.ids)],
+           timestamp '2020-01-01' + g * interval '1 minute',
+           timestamp '2020-01-01' + g * interval '1 minute' + interval '14 days'
+    FROM s, b, r, generate_series(1, :n) AS g
+""")
+
+
+def _rss_mb() -> float:
+    # Linux: ru_maxrss в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _current_rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def seed(app_module, rows: int):
+    with app_module.engine.begin() as conn:
+        have = conn.execute(text("SELECT count(*) FROM lib.borrows")).scalar()
+        if have < rows:
+            print(f"Досеиваем выдачи: {have} -> {rows}", file=sys.stderr)
+            conn.execute(_SEED_SQL, {"n": rows - have})
+            conn.execute(text("ANALYZE lib.borrows"))
+
+
+def worker(args):
+    import app as app_module
+    from csv_export import write_export
+
+    stmt = app_module.EXPORTS[args.export](app_module.MultiDict())
+    rss_before = _current_rss_mb()
+    with open(args.output, "wb") as f:
+        stats = write_export(app_module.SessionLocal, stmt, f, gzip=args.gzip, method=args.worker)
+    print(json.dumps({
+        "method": args.worker, "mb": stats.bytes / 2 ** 20, "written_mb": stats.written / 2 ** 20,
+        "seconds": stats.elapsed, "mb_per_sec": stats.mb_per_sec,
+        "rss_before_mb": rss_before, "peak_rss_mb": _rss_mb(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--export", default="borrows", choices=("borrows", "inventory"))
+    parser.add_argument("--methods", default="copy,cursor", help="Через запятую: copy, cursor")
+    parser.add_argument("--gzip", action="store_true", help="Сжимать поток (уровень 6)")
+    parser.add_argument("--output", default=os.devnull)
+    parser.add_argument("--seed", type=int, default=0, help="Минимум строк в lib.borrows")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    if args.seed:
+        import app as app_module
+        seed(app_module, args.seed)
+
+    print(f"{'способ':<8} {'CSV, МБ':>9} {'записано':>9} {'время, с':>9} {'МБ/с':>7} {'RSS до':>8} {'пик RSS':>8}")
+    for method in args.methods.split(","):
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", method, "--export", args.export,
+               "--output", args.output] + (["--gzip"] if args.gzip else [])
+        r = json.loads(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout)
+        print(f"{r['method']:<8} {r['mb']:>9.1f} {r['written_mb']:>9.1f} {r['seconds']:>9.1f} "
+              f"{r['mb_per_sec']:>7.1f} {r['rss_before_mb']:>8.1f} {r['peak_rss_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
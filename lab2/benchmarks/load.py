@@ -0,0 +1,109 @@
+"""
+Нагрузочный тест: пропускная способность gunicorn при разном числе воркеров.
+
+Для каждого значения --workers поднимается gunicorn (gunicorn.conf.py, "app:create_app()"),
+затем --concurrency клиентских потоков с keep-alive соединениями в течение --duration секунд
+запрашивают --path. Выводятся запросы/с и задержки p50/p99.
+
+Схема должна быть инициализирована: DB_BOOTSTRAP=off flask --app app init-db --demo
+Запуск (из lab2): python benchmarks/load.py --workers 1,2,4 --concurrency 32 --duration 15
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+LAB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _wait_ready(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/")
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn не поднялся на порту {port}")
+
+
+def run_load(port: int, path: str, concurrency: int, duration: float) -> dict:
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        local, failed = [], 0
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+                continue
+            local.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies.sort()
+    return {
+        "rps": len(latencies) / duration,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0,
+        "errors": errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Список значений через запятую")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--path", default="/books")
+    parser.add_argument("--port", type=int, default=7109)
+    args = parser.parse_args()
+
+    print(f"ядер: {os.cpu_count()}, потоков на воркер: {args.threads}, клиентов: {args.concurrency}, "
+          f"{args.path}, {args.duration:.0f} с")
+    print(f"{'воркеров':<10}{'запросов/с':>12}{'p50, мс':>10}{'p99, мс':>10}{'ошибок':>8}")
+    for workers in (int(w) for w in args.workers.split(",")):
+        env = dict(os.environ, GUNICORN_WORKERS=str(workers), GUNICORN_THREADS=str(args.threads),
+                   GUNICORN_BIND=f"127.0.0.1:{args.port}", DB_BOOTSTRAP=os.getenv("DB_BOOTSTRAP", "check"))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--access-logfile", "/dev/null",
+             "app:create_app()"],
+            cwd=LAB_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_ready(args.port)
+            run_load(args.port, args.path, args.concurrency, 2.0)  # прогрев
+            r = run_load(args.port, args.path, args.concurrency, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{workers:<10}{r['rps']:>12.0f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Задержка поиска по каталогу (search.search_books) на большом каталоге.
+
+--seed N дописывает в каталог синтетические книги, пока их не станет не меньше N: названия
+из 2–5 слов словаря (--vocabulary слов, частоты убывают примерно по закону Ципфа: первые
+слова встречаются в каждом пятом названии, хвост — единожды), у каждой книги один автор
+из --authors и одно из 200 издательств. Вставка идёт пачками по 100000 через триггеры
+поискового документа (миграция 009), как при обычной записи.
+
+Затем для каждого класса запросов (частое слово, среднее, редкое, два слова из одного
+названия, фамилия автора, опечатка) выполняется --repeat запросов первой страницы и
+выводятся p50/p99 в мс и среднее число книг на странице (не больше 20).
+
+Схема должна быть инициализирована: DB_BOOTSTRAP=off flask --app app init-db
+Запуск (из lab2): python benchmarks/search.py --seed 1000000 --repeat 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_BOOTSTRAP", "off")
+
+from sqlalchemy import text  # noqa: E402
+
+# Частые слова каталога идут первыми; остальной словарь — псевдослова из слогов
+COMMON = (
+    "история основы введение теория практика методы анализ системы управление развитие "
+    "экономика право физика химия математика биология русский язык литература философия "
+    "психология социология программирование данные сети информатика алгоритмы механика "
+    "искусство культура политика география медицина техника инженерия строительство "
+    "электроника энергетика статистика логика геометрия алгебра музыка архитектура"
+).split()
+SYLLABLES = ("ка ро ми на ло ве ти со па ду ре ли ма но ры зо ку те ви ба го ле мо се ра "
+             "де по ни жа ту ха ше цы че вы ко фи мы лу бе").split()
+SURNAMES = ("Иванов Петров Смирнов Кузнецов Попов Соколов Лебедев Козлов Новиков Морозов "
+            "Волков Зайцев Павлов Семёнов Голубев Виноградов Богданов Воробьёв Фёдоров Михайлов").split()
+
+BATCH = 100_000
+
+
+def vocabulary(size: int) -> list:
+    rng = random.Random(1)
+    words, seen = list(COMMON), set(COMMON)
+    while len(words) < size:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def author_names(size: int) -> list:
+    rng = random.Random(2)
+    names = set()
+    while len(names) < size:
+        stem = rng.choice(SURNAMES) if rng.random() < 0.5 else "".join(
+            rng.choice(SYLLABLES) for _ in range(3)).capitalize() + "ов"
+        names.add(f"{stem} {rng.choice('АБВГДЕЖИКЛМНОПРСТ')}. {rng.choice('АБВГДЕЖИКЛМНОПРСТ')}.")
+    return sorted(names)
+
+
+def seed(engine, books: int, vocab: list, authors: list):
+    with engine.begin() as conn:
+        have = conn.execute(text("SELECT count(*) FROM lib.books")).scalar()
+        if have >= books:
+            return
+        conn.execute(text("INSERT INTO lib.publishers (name) SELECT 'Издательство ' || g FROM generate_series(1, 200) g "
+                          "ON CONFLICT DO NOTHING"))
+        conn.execute(text("INSERT INTO lib.authors (full_name) SELECT unnest(CAST(:names AS text[])) "
+                          "ON CONFLICT DO NOTHING"), {"names": authors})
+    started = time.perf_counter()
+    while have < books:
+        n = min(BATCH, books - have)
+        with engine.begin() as conn:
+            first_id = conn.execute(text("SELECT coalesce(max(id), 0) FROM lib.books")).scalar()
+            # power(V, random()) — логарифмически равномерный номер слова: частоты ~ 1/номер
+            conn.execute(text("""
+                INSERT INTO lib.books (title, publisher_id, year, pages, price)
+                SELECT initcap(array_to_string(ARRAY(
+                         SELECT w.vocab[least(cardinality(w.vocab), floor(power(cardinality(w.vocab), random()))::int)]
+                         FROM generate_series(1, 2 + (g % 4))
+                       ), ' ')),
+                       p.ids[1 + g % cardinality(p.ids)], 1950 + g % 75, 50 + g % 900, 100 + g % 2000
+                FROM generate_series(1, :n) AS g,
+                     (SELECT CAST(:vocab AS text[]) AS vocab) AS w,
+                     (SELECT array_agg(id) AS ids FROM lib.publishers) AS p
+            """), {"n": n, "vocab": vocab})
+            conn.execute(text("""
+                INSERT INTO lib.book_authors (book_id, author_id)
+                SELECT b.id, a.ids[1 + b.id % cardinality(a.ids)]
+                FROM lib.books b, (SELECT array_agg(id) AS ids FROM lib.authors) AS a
+                WHERE b.id > :first_id
+            """), {"first_id": first_id})
+        have += n
+        print(f"книг: {have}, {time.perf_counter() - started:.0f} с", file=sys.stderr)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE lib.books"))
+
+
+def typo(word: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(word))
+    return word[:i] + rng.choice("абвгдеклмнопрст") + word[i + 1:]
+
+
+def query_classes(session, vocab: list, rng: random.Random) -> dict:
+    titles = [t for (t,) in session.execute(text(
+        "SELECT title FROM lib.books TABLESAMPLE SYSTEM (1) WHERE title LIKE '% %' LIMIT 500"))]
+    surnames = [n.split()[0] for (n,) in session.execute(text(
+        "SELECT full_name FROM lib.authors ORDER BY random() LIMIT 200"))]
+    return {
+        "частое слово": lambda: rng.choice(vocab[:3]),
+        "среднее слово": lambda: rng.choice(vocab[50:200]),
+        "редкое слово": lambda: rng.choice(vocab[len(vocab) // 2:]),
+        "два слова названия": lambda: " ".join(rng.choice(titles).split()[:2]),
+        "фамилия автора": lambda: rng.choice(surnames),
+        "опечатка": lambda: typo(rng.choice(vocab[50:200]), rng),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, help="Минимум книг в каталоге")
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--authors", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--budget-ms", type=float, default=20.0, help="Допустимый p99, мс")
+    args = parser.parse_args()
+
+    import app as app_module
+    from search import search_books
+
+    vocab = vocabulary(args.vocabulary)
+    if args.seed:
+        seed(app_module.engine, args.seed, vocab, author_names(args.authors))
+
+    rng = random.Random(3)
+    worst = 0.0
+    with app_module.SessionLocal() as session:
+        total = session.execute(text("SELECT count(*) FROM lib.books")).scalar()
+        print(f"Книг в каталоге: {total}")
+        print(f"{'запрос':<20} {'p50, мс':>8} {'p99, мс':>8} {'на странице':>11}")
+        for name, make in query_classes(session, vocab, rng).items():
+            for _ in range(10):  # прогрев
+                search_books(session, make())
+            timings, found = [], []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                page = search_books(session, make())
+                timings.append(time.perf_counter() - started)
+                found.append(len(page.hits))
+            timings.sort()
+            p99 = timings[int(len(timings) * 0.99) - 1] * 1000
+            worst = max(worst, p99)
+            print(f"{name:<20} {statistics.median(timings) * 1000:>8.2f} {p99:>8.2f} "
+                  f"{statistics.mean(found):>11.1f}")
+    sys.exit(1 if worst > args.budget_ms else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Память и скорость потокового API чтения (streaming.py) против выборки списком (.all()).
+
+Каждый способ выгружает историю выдач (borrow_rows_select, как /api/borrows) в отдельном
+процессе, чтобы пиковый RSS (ru_maxrss) не смешивался между прогонами:
+    stream  GET /api/borrows через тестовый клиент Flask, ответ читается по фрагментам
+    all     session.execute(...).all() и те же NDJSON-строки — как списки до потокового API
+Выводятся число записей, объём NDJSON, время, МБ/с, RSS процесса до выгрузки и пиковый RSS.
+
+--seed N дописывает в lib.borrows возвращённые выдачи (как benchmarks/csv_export.py).
+
+Схема должна быть инициализирована: DB_BOOTSTRAP=off flask --app app init-db --demo
+Запуск (из lab2): python benchmarks/streaming.py --seed 2000000 --methods stream,all
+"""
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_BOOTSTRAP", "off")
+
+# Замер памяти и досев выдач — из соседнего benchmarks/csv_export.py (имя csv_export занято модулем приложения)
+_spec = importlib.util.spec_from_file_location(
+    "csv_export_bench", os.path.join(os.path.dirname(os.path.abspath(__file__)), "csv_export.py"))
+csv_export_bench = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(csv_export_bench)
+
+
+def _stream(app_module) -> tuple:
+    client = app_module.create_app("off").test_client()
+    response = client.get("/api/borrows", buffered=False)
+    rows = size = 0
+    try:
+        for chunk in response.iter_encoded():
+            size += len(chunk)
+            # Служебные строки ({"_resume": ...}) — не записи
+            rows += chunk.count(b"\n") - chunk.count(b'{"_')
+    finally:
+        response.close()
+    return rows, size
+
+
+def _all(app_module) -> tuple:
+    from werkzeug.datastructures import MultiDict
+    from streaming import _line
+
+    stmt = app_module.borrow_rows_select(MultiDict()).order_by(
+        app_module.Borrow.borrowed_at, app_module.Borrow.id)
+    with app_module.SessionLocal() as session:
+        rows = session.execute(stmt).all()
+    size = sum(len(_line(dict(row._mapping)).encode()) for row in rows)
+    return len(rows), size
+
+
+METHODS = {"stream": _stream, "all": _all}
+
+
+def worker(method: str):
+    import app as app_module
+
+    rss_before = csv_export_bench._current_rss_mb()
+    started = time.perf_counter()
+    rows, size = METHODS[method](app_module)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "method": method, "rows": rows, "mb": size / 2 ** 20, "seconds": elapsed,
+        "mb_per_sec": size / 2 ** 20 / elapsed, "rss_before_mb": rss_before, "peak_rss_mb": csv_export_bench._rss_mb(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--methods", default="stream,all", help="Через запятую: stream, all")
+    parser.add_argument("--seed", type=int, default=0, help="Минимум строк в lib.borrows")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker)
+        return
+
+    if args.seed:
+        import app as app_module
+        csv_export_bench.seed(app_module, args.seed)
+
+    print(f"{'способ':<8} {'записей':>9} {'NDJSON, МБ':>11} {'время, с':>9} {'МБ/с':>7} {'RSS до':>8} {'пик RSS':>8}")
+    for method in args.methods.split(","):
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", method]
+        r = json.loads(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout)
+        print(f"{r['method']:<8} {r['rows']:>9} {r['mb']:>11.1f} {r['seconds']:>9.1f} "
+              f"{r['mb_per_sec']:>7.1f} {r['rss_before_mb']:>8.1f} {r['peak_rss_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# catalog_import.py
+"""
+Потоковый импорт каталога (CSV / NDJSON) в books, publishers, authors, book_authors.
+
+Файл читается построчно и обрабатывается чанками фиксированного размера, поэтому
+память не зависит от размера файла. На каждый чанк — постоянное число операторов:
+издательства и авторы разрешаются пачкой через resolvers (SELECT + INSERT ... ON CONFLICT
+DO NOTHING, с LRU-кэшем между чанками), книги и связи с авторами загружаются через COPY (PostgreSQL + psycopg2)
+или одним executemany на остальных СУБД. Каждый чанк — отдельная транзакция.
+
+Формат записи (CSV-заголовок или ключи NDJSON):
+    title, publisher, year, pages, illustrations, price, authors
+authors — строка через запятую (как в форме книги) или список (NDJSON).
+"""
+import csv
+import io
+import json
+import time
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from sqlalchemy import insert, text
+
+from models import Book, BookAuthor
+from resolvers import publisher_resolver, author_resolver
+import ref_cache
+
+DEFAULT_CHUNK_SIZE = 5000
+FORMATS = ("csv", "ndjson")
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    books: int = 0
+    skipped: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "books": self.books,
+            "skipped": self.skipped,
+            "elapsed": round(self.elapsed, 3),
+            "rows_per_sec": round(self.rows_per_sec, 1),
+        }
+
+
+def detect_format(filename: str) -> str:
+    return "ndjson" if filename.lower().endswith((".ndjson", ".jsonl")) else "csv"
+
+
+def iter_records(stream, fmt: str):
+    """Генератор сырых записей из текстового потока."""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "ndjson":
+        for line in stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+    else:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+
+
+def _int_or_none(value):
+    if value in (None, ""):
+        return None
+    return int(value)
+
+
+def parse_record(raw) -> dict | None:
+    """Нормализует запись; None — строка некорректна или нарушает ограничения таблицы books."""
+    if not isinstance(raw, dict):
+        return None
+    title, publisher = raw.get("title"), raw.get("publisher")
+    # В NDJSON значение может оказаться числом, списком или объектом — такая строка отклоняется
+    if not isinstance(title, str) or not isinstance(publisher, (str, type(None))):
+        return None
+    title = title.strip()
+    if not title:
+        return None
+    try:
+        year = _int_or_none(raw.get("year"))
+        pages = _int_or_none(raw.get("pages"))
+        illustrations = _int_or_none(raw.get("illustrations")) or 0
+        price = raw.get("price")
+        price = Decimal(str(price)) if price not in (None, "") else None
+    except (TypeError, ValueError, InvalidOperation):
+        return None
+    if (year is not None and not 1500 <= year <= 2100) or (pages is not None and pages < 1) \
+            or illustrations < 0 or (price is not None and price < 0):
+        return None
+
+    authors = raw.get("authors") or []
+    if isinstance(authors, str):
+        authors = authors.split(",")
+    elif not isinstance(authors, list):
+        return None
+    # dict.fromkeys: убираем повторы, сохраняя порядок (PK book_authors не допускает дублей)
+    authors = list(dict.fromkeys(a.strip() for a in authors if isinstance(a, str) and a.strip()))
+    return {
+        "title": title,
+        "publisher": (publisher or "").strip() or None,
+        "year": year,
+        "pages": pages,
+        "illustrations": illustrations,
+        "price": price,
+        "authors": authors,
+    }
+
+
+def _chunks(iterable, size: int):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _copy_rows(session, table: str, columns: list, rows: list):
+    """COPY ... FROM STDIN для пачки строк через драйвер psycopg2."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(["\\N" if v is None else v for v in row])
+    buf.seek(0)
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf
+        )
+    finally:
+        cursor.close()
+
+
+def _load_books(session, records: list, publisher_ids: dict) -> list:
+    """Вставляет книги чанка; возвращает их id в порядке записей."""
+    rows = [
+        {
+            "title": r["title"],
+            "publisher_id": publisher_ids.get(r["publisher"]),
+            "year": r["year"],
+            "pages": r["pages"],
+            "illustrations": r["illustrations"],
+            "price": r["price"],
+        }
+        for r in records
+    ]
+    bind = session.get_bind()
+    if bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg2":
+        # id выделяются заранее одним запросом к последовательности, сами строки идут через COPY
+        book_ids = list(session.scalars(
+            text("SELECT nextval(pg_get_serial_sequence('lib.books', 'id')) FROM generate_series(1, :n)"),
+            {"n": len(rows)},
+        ))
+        columns = ["id", "title", "publisher_id", "year", "pages", "illustrations", "price"]
+        _copy_rows(session, "lib.books", columns, ([bid] + [r[c] for c in columns[1:]] for bid, r in zip(book_ids, rows)))
+        return book_ids
+    return list(session.scalars(insert(Book).returning(Book.id, sort_by_parameter_order=True), rows))
+
+
+def _load_chunk(session, records: list) -> int:
+    publisher_ids = publisher_resolver.resolve(session, {r["publisher"] for r in records})
+    author_ids = author_resolver.resolve(session, {a for r in records for a in r["authors"]})
+    book_ids = _load_books(session, records, publisher_ids)
+
+    links = [(book_id, author_ids[a]) for book_id, r in zip(book_ids, records) for a in r["authors"]]
+    if links:
+        bind = session.get_bind()
+        if bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg2":
+            _copy_rows(session, "lib.book_authors", ["book_id", "author_id"], links)
+        else:
+            session.execute(insert(BookAuthor.__table__), [{"book_id": b, "author_id": a} for b, a in links])
+    # Запись идёт мимо ORM flush — справочный кэш нужно уведомить явно
+    ref_cache.mark_changed(session, "books", "book_authors", "publishers", "authors")
+    return len(book_ids)
+
+
+def import_catalog(session_factory, stream, fmt: str = "csv", chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   progress=None) -> ImportStats:
+    """
+    Импортирует каталог из текстового потока. session_factory — sessionmaker приложения.
+    progress(stats) вызывается после каждого чанка.
+    """
+    stats = ImportStats()
+    started = time.perf_counter()
+    for raw_chunk in _chunks(iter_records(stream, fmt), chunk_size):
+        records = [r for r in map(parse_record, raw_chunk) if r is not None]
+        stats.rows += len(raw_chunk)
+        stats.skipped += len(raw_chunk) - len(records)
+        if records:
+            with session_factory() as session, session.begin():
+                stats.books += _load_chunk(session, records)
+        stats.elapsed = time.perf_counter() - started
+        if progress:
+            progress(stats)
+    stats.elapsed = time.perf_counter() - started
+    return stats
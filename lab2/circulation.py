@@ -0,0 +1,252 @@
+# circulation.py
+"""
+Сводки выдач для аналитики (/dashboard): дневные счётчики по книге, филиалу и факультету
+читателя в lib.circulation_daily, без просмотра lib.borrows на каждый вопрос.
+
+    circulation_daily   (day, book_id, branch_id, faculty_id) -> borrows (выдачи за день
+                        borrowed_at), returns и loan_seconds (возвраты за день returned_at и
+                        суммарная длительность этих выдач: средний срок = loan_seconds / returns)
+    rollup_state        отметки уже учтённого: last_borrow_id и last_returned_at
+
+refresh() добавляет к сводке только новое с прошлого раза, одной транзакцией:
+  * выдачи с id в (last_borrow_id, новая отметка];
+  * возвраты — каждый один раз, когда и id выдачи, и returned_at попали под отметки:
+    у новых выдач — с returned_at до новой отметки, у старых — с returned_at после прежней.
+Отметки не заходят в последние CIRCULATION_SETTLE_SECONDS (60) секунд: id и время
+присваиваются до COMMIT, и строка, зафиксированная чуть позже соседней, не должна
+оказаться ниже уже сдвинутой отметки. Транзакции записи дольше этого окна не учитываются.
+
+Строка rollup_state блокируется (FOR UPDATE): параллельные обновления не считают одно дважды.
+Факультет — текущий факультет читателя на момент учёта выдачи.
+
+Обновление — командой `flask refresh-circulation` (cron) и само в фоне не чаще раза в
+CIRCULATION_REFRESH_INTERVAL секунд на процесс (init_app; 0 — только командой).
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import BigInteger, cast, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import Book, Borrow, Branch, CirculationDaily, Faculty, RollupState, Student
+
+NAME = "circulation"
+KEY_COLUMNS = ("day", "book_id", "branch_id", "faculty_id")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RefreshReport:
+    rows: int = 0  # строк сводки добавлено или дополнено
+    last_borrow_id: int = 0
+    last_returned_at: datetime | None = None
+
+
+def settle_seconds() -> float:
+    return float(os.getenv("CIRCULATION_SETTLE_SECONDS", "60"))
+
+
+def _loan_seconds(dialect: str):
+    if dialect == "postgresql":
+        seconds = func.extract("epoch", Borrow.returned_at - Borrow.borrowed_at)
+    else:
+        seconds = (func.julianday(Borrow.returned_at) - func.julianday(Borrow.borrowed_at)) * 86400
+    # round: разность julianday в SQLite — float, и 2 суток не должны стать 172799 секундами
+    return cast(func.round(func.sum(seconds)), BigInteger)
+
+
+def _upsert(session, rows, columns: tuple) -> int:
+    """INSERT ... SELECT сгруппированных строк; существующие ключи дня дополняются (ON CONFLICT DO UPDATE)."""
+    dialect = session.get_bind().dialect.name
+    table = CirculationDaily.__table__
+    if dialect == "postgresql":
+        stmt = postgresql.insert(table)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table)
+    else:
+        raise NotImplementedError(f"Сводки выдач не поддерживаются для {dialect}")
+    stmt = stmt.from_select(KEY_COLUMNS + columns, rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={c: table.c[c] + stmt.excluded[c] for c in columns},
+    )
+    return session.execute(stmt).rowcount
+
+
+def _grouped(day, *aggregates, where):
+    """Строки сводки: ключ (день, книга, филиал, факультет читателя) и агрегаты по выдачам where."""
+    key = (day.label("day"), Borrow.book_id, Borrow.branch_id, Student.faculty_id)
+    return (
+        select(*key, *aggregates)
+        .select_from(Borrow)
+        .join(Student, Student.id == Borrow.student_id)
+        .where(*where)
+        .group_by(*key)
+    )
+
+
+def _lock_state(session) -> RollupState:
+    state = session.scalars(select(RollupState).where(RollupState.name == NAME).with_for_update()).one_or_none()
+    if state is None:
+        # Миграция 011 создаёт строку заранее; здесь — для схемы из create_all
+        state = RollupState(name=NAME, last_borrow_id=0)
+        session.add(state)
+        session.flush()
+    return state
+
+
+def refresh(session, now: datetime | None = None) -> RefreshReport:
+    """Добавляет к сводке выдачи и возвраты после отметок и сдвигает отметки; COMMIT — на вызывающем."""
+    state = _lock_state(session)
+    old_id, old_returned = state.last_borrow_id, state.last_returned_at
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=settle_seconds())
+
+    # Отметка id — до первой выдачи моложе cutoff (проход по PK после old_id)
+    unsettled = session.scalar(select(func.min(Borrow.id)).where(Borrow.id > old_id, Borrow.borrowed_at >= cutoff))
+    if unsettled is not None:
+        new_id = unsettled - 1
+    else:
+        new_id = session.scalar(select(func.max(Borrow.id)).where(Borrow.id > old_id)) or old_id
+    new_returned = max(cutoff, old_returned) if old_returned else cutoff
+
+    dialect = session.get_bind().dialect.name
+    returned = (Borrow.returned_at.is_not(None), Borrow.returned_at <= new_returned)
+    report = RefreshReport(last_borrow_id=new_id, last_returned_at=new_returned)
+    if new_id > old_id:
+        new_rows = (Borrow.id > old_id, Borrow.id <= new_id)
+        report.rows += _upsert(session, _grouped(func.date(Borrow.borrowed_at), func.count(), where=new_rows),
+                               ("borrows",))
+        report.rows += _upsert(
+            session,
+            _grouped(func.date(Borrow.returned_at), func.count(), _loan_seconds(dialect), where=new_rows + returned),
+            ("returns", "loan_seconds"),
+        )
+    # Возвраты уже учтённых выдач — диапазон индекса по returned_at
+    old_returns = (Borrow.id <= old_id, *returned)
+    if old_returned:
+        old_returns += (Borrow.returned_at > old_returned,)
+    if old_id:
+        report.rows += _upsert(
+            session,
+            _grouped(func.date(Borrow.returned_at), func.count(), _loan_seconds(dialect), where=old_returns),
+            ("returns", "loan_seconds"),
+        )
+
+    state.last_borrow_id = new_id
+    state.last_returned_at = new_returned
+    state.refreshed_at = datetime.utcnow()
+    return report
+
+
+# ---------- Запросы панели (только сводка, без lib.borrows) ----------
+
+def daily_by_branch(session, since: date) -> list:
+    """Выдачи и возвраты по филиалам по дням с since, новые дни сверху."""
+    return session.execute(
+        select(CirculationDaily.day, Branch.name.label("branch"),
+               func.sum(CirculationDaily.borrows).label("borrows"),
+               func.sum(CirculationDaily.returns).label("returns"))
+        .join(Branch, Branch.id == CirculationDaily.branch_id)
+        .where(CirculationDaily.day >= since)
+        .group_by(CirculationDaily.day, Branch.id, Branch.name)
+        .order_by(CirculationDaily.day.desc(), Branch.name)
+    ).all()
+
+
+def top_books_by_faculty(session, since: date, per_faculty: int = 5) -> list:
+    """Самые выдаваемые книги каждого факультета с since: (faculty, title, borrows, place)."""
+    borrows = func.sum(CirculationDaily.borrows)
+    ranked = (
+        select(CirculationDaily.faculty_id, CirculationDaily.book_id, borrows.label("borrows"),
+               func.row_number().over(partition_by=CirculationDaily.faculty_id,
+                                      order_by=(borrows.desc(), CirculationDaily.book_id)).label("place"))
+        .where(CirculationDaily.day >= since)
+        .group_by(CirculationDaily.faculty_id, CirculationDaily.book_id)
+        .having(borrows > 0)
+        .subquery()
+    )
+    return session.execute(
+        select(Faculty.name.label("faculty"), Book.title, ranked.c.borrows, ranked.c.place)
+        .join(Faculty, Faculty.id == ranked.c.faculty_id)
+        .join(Book, Book.id == ranked.c.book_id)
+        .where(ranked.c.place <= per_faculty)
+        .order_by(Faculty.name, ranked.c.place)
+    ).all()
+
+
+def loan_duration_by_branch(session, since: date) -> list:
+    """Средний срок выдачи в днях по филиалам для возвратов с since: (branch, returns, avg_days)."""
+    rows = session.execute(
+        select(Branch.name.label("branch"),
+               func.sum(CirculationDaily.returns).label("returns"),
+               func.sum(CirculationDaily.loan_seconds).label("loan_seconds"))
+        .join(Branch, Branch.id == CirculationDaily.branch_id)
+        .where(CirculationDaily.day >= since)
+        .group_by(Branch.id, Branch.name)
+        .having(func.sum(CirculationDaily.returns) > 0)
+        .order_by(Branch.name)
+    ).all()
+    return [(r.branch, r.returns, r.loan_seconds / r.returns / 86400) for r in rows]
+
+
+def state(session) -> RollupState | None:
+    return session.get(RollupState, NAME)
+
+
+def refresh_all(engine) -> RefreshReport:
+    """refresh() в отдельной транзакции на engine (команда и фоновое обновление)."""
+    with Session(engine) as session, session.begin():
+        return refresh(session)
+
+
+_state = {"next_run": 0.0, "running": False}
+_state_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # Поток обновления остался в родителе: потомок обновит сводку на первом запросе
+    global _state_lock
+    _state_lock = threading.Lock()
+    _state.update(next_run=0.0, running=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _run_refresh(engine):
+    try:
+        report = refresh_all(engine)
+        if report.rows:
+            logger.info("Сводка выдач: %d строк, отметки id=%d, returned_at=%s",
+                        report.rows, report.last_borrow_id, report.last_returned_at)
+    except Exception:
+        logger.exception("Ошибка обновления сводки выдач")
+    finally:
+        _state["running"] = False
+
+
+def init_app(app, engine_getter):
+    """Фоновое обновление сводки: проверка срока — на запросе, сама работа — в отдельном потоке."""
+    interval = float(os.getenv("CIRCULATION_REFRESH_INTERVAL", "300"))
+    if interval <= 0:
+        return
+
+    def schedule_refresh():
+        now = time.monotonic()
+        if now < _state["next_run"]:
+            return
+        with _state_lock:
+            if now < _state["next_run"] or _state["running"]:
+                return
+            _state.update(next_run=now + interval, running=True)
+        threading.Thread(target=_run_refresh, args=(engine_getter(),),
+                         name="circulation-refresh", daemon=True).start()
+
+    app.before_request(schedule_refresh)
@@ -0,0 +1,75 @@
+# conditional.py
+"""
+Условные GET (ETag / Last-Modified) для страниц со списками.
+
+Перед основной работой view вызывается marker() — дешёвый запрос, возвращающий маркеры
+изменений (count/max(id)/max(updated_at) по таблицам страницы). ETag — хэш маркеров,
+endpoint, строки запроса и текущего пользователя (шапка страницы зависит от входа).
+Если клиент прислал совпадающий If-None-Match (или, без него, If-Modified-Since не старше
+последнего изменения), отдаётся 304 без основного запроса и без рендеринга шаблона.
+
+Ответы с ожидающими flash-сообщениями не кэшируются: сообщение должно быть показано.
+"""
+import hashlib
+from datetime import timezone
+from functools import wraps
+
+from flask import current_app, make_response, request, session as http_session
+from flask_login import current_user
+
+
+def page_etag(*parts) -> str:
+    raw = "|".join(map(str, parts)).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()
+
+
+def _http_date(value):
+    """Время из БД (naive UTC) -> aware UTC с точностью до секунды, как в HTTP-заголовках."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def _not_modified(etag: str, last_modified) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return since is not None and last_modified is not None and last_modified <= since
+
+
+def _set_validators(response, etag: str, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Браузер обязан перепроверять страницу при каждом показе, а не держать её по эвристике
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Cookie")
+
+
+def conditional_get(marker):
+    """
+    Декоратор view: marker() -> (маркеры, время последнего изменения или None).
+    Не-GET запросы и ответы с flash-сообщениями проходят без изменений.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET" or "_flashes" in http_session:
+                return view(*args, **kwargs)
+
+            parts, last_modified = marker()
+            last_modified = _http_date(last_modified)
+            etag = page_etag(request.endpoint, request.query_string.decode("latin-1"),
+                             current_user.get_id(), *parts)
+            if _not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            _set_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,187 @@
+# csv_export.py
+"""
+Потоковая выгрузка запроса в CSV (отчёты: история выдач, инвентарь с доступностью).
+
+CSV отдаётся фрагментами не больше EXPORT_CHUNK_BYTES (64 КБ), память не зависит от объёма:
+    PostgreSQL + psycopg2  COPY (<запрос>) TO STDOUT — строки формирует сервер, приложение
+                           только пересылает байты; COPY идёт в отдельном потоке, фрагменты
+                           передаются через очередь из EXPORT_QUEUE_CHUNKS элементов (обратное
+                           давление: медленный клиент притормаживает COPY, а не копит память)
+    остальные СУБД         серверный курсор (yield_per) и csv.writer в буфер фрагмента
+Формат в обоих случаях одинаков: заголовок, разделитель «,», NULL — пустое поле, строки через \\n.
+gzip_chunks() сжимает поток на лету (формат gzip).
+"""
+import csv
+import io
+import os
+import queue
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+DEFAULT_CHUNK_BYTES = 64 * 1024
+METHODS = ("copy", "cursor")
+
+_END = object()
+
+
+def settings() -> dict:
+    return {
+        "chunk_bytes": int(os.getenv("EXPORT_CHUNK_BYTES", str(DEFAULT_CHUNK_BYTES))),
+        "queue_chunks": int(os.getenv("EXPORT_QUEUE_CHUNKS", "4")),
+    }
+
+
+@dataclass
+class ExportStats:
+    bytes: int = 0
+    written: int = 0  # после сжатия
+    elapsed: float = 0.0
+
+    @property
+    def mb_per_sec(self) -> float:
+        return self.bytes / 2 ** 20 / self.elapsed if self.elapsed else 0.0
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _ChunkWriter:
+    """Файл для copy_expert: копит строки COPY и отдаёт их в очередь фрагментами."""
+
+    def __init__(self, chunks: queue.Queue, chunk_bytes: int):
+        self.chunks = chunks
+        self.chunk_bytes = chunk_bytes
+        self.parts = []
+        self.size = 0
+        self.cancelled = False
+
+    def write(self, data: bytes):
+        if self.cancelled:
+            raise _Cancelled()
+        self.parts.append(data)
+        self.size += len(data)
+        if self.size >= self.chunk_bytes:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.chunks.put(b"".join(self.parts))
+            self.parts, self.size = [], 0
+
+
+def _copy_sql(conn, stmt) -> str:
+    compiled = stmt.compile(dialect=conn.dialect)
+    cursor = conn.connection.driver_connection.cursor()
+    try:
+        # Параметры подставляет драйвер (mogrify) — COPY не принимает связанные параметры
+        sql = cursor.mogrify(str(compiled), compiled.params).decode("utf-8")
+    finally:
+        cursor.close()
+    return f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+
+
+def _copy_chunks(conn, stmt, options: dict):
+    chunks = queue.Queue(maxsize=options["queue_chunks"])
+    writer = _ChunkWriter(chunks, options["chunk_bytes"])
+    copy_sql = _copy_sql(conn, stmt)
+
+    def run():
+        cursor = conn.connection.driver_connection.cursor()
+        try:
+            cursor.copy_expert(copy_sql, writer)
+            writer.flush()
+            chunks.put(_END)
+        except BaseException as e:
+            chunks.put(e)
+        finally:
+            cursor.close()
+
+    thread = threading.Thread(target=run, name="csv-export-copy", daemon=True)
+    thread.start()
+    finished = False
+    try:
+        while True:
+            item = chunks.get()
+            if item is _END:
+                finished = True
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        if not finished:
+            # Клиент ушёл или ошибка: останавливаем COPY и освобождаем очередь, чтобы поток завершился;
+            # соединение после прерванного COPY в пул не возвращается
+            writer.cancelled = True
+            while thread.is_alive():
+                try:
+                    chunks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            conn.invalidate()
+
+
+def _cursor_chunks(conn, stmt, options: dict):
+    result = conn.execute(stmt.execution_options(yield_per=1000))
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(result.keys())
+    for row in result:
+        writer.writerow(row)
+        if buf.tell() >= options["chunk_bytes"]:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def export_chunks(session_factory, stmt, method: str | None = None):
+    """
+    Генератор фрагментов CSV (bytes) для stmt (select именованных колонок).
+    method: copy / cursor; по умолчанию copy для PostgreSQL + psycopg2.
+    Соединение берётся через сессию: в @read_only-роуте RoutingSession выберет реплику.
+    """
+    options = settings()
+    with session_factory() as session:
+        conn = session.connection(bind_arguments={"clause": stmt})
+        if method is None:
+            method = "copy" if conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2" else "cursor"
+        if method not in METHODS:
+            raise ValueError(f"Неизвестный способ выгрузки: {method}")
+        chunks = _copy_chunks if method == "copy" else _cursor_chunks
+        yield from chunks(conn, stmt, options)
+
+
+def gzip_chunks(chunks, level: int = 6):
+    """Сжимает поток фрагментов в формат gzip, не накапливая его в памяти."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def write_export(session_factory, stmt, fileobj, gzip: bool = False, method: str | None = None,
+                 progress=None) -> ExportStats:
+    """Выгрузка в двоичный файл (CLI, бенчмарк); progress(stats) — после каждого фрагмента."""
+    stats = ExportStats()
+    started = time.perf_counter()
+
+    def counted():
+        for chunk in export_chunks(session_factory, stmt, method):
+            stats.bytes += len(chunk)
+            yield chunk
+
+    for data in (gzip_chunks(counted()) if gzip else counted()):
+        fileobj.write(data)
+        stats.written += len(data)
+        stats.elapsed = time.perf_counter() - started
+        if progress:
+            progress(stats)
+    stats.elapsed = time.perf_counter() - started
+    return stats
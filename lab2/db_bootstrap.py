@@ -1,27 +1,130 @@
 # db_bootstrap.py
+import ast
+import glob
+import os
+
 from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import Session
 
-from models import Base, metadata, Publisher, Faculty, Branch, Book, Author, BookAuthor, \
-    Inventory, BookFaculty, Student, EventLog, User, UserActivityLog
+from models import Base, Faculty, Branch, Book, BookAuthor, Inventory, BookFaculty, Student
+from resolvers import publisher_resolver, author_resolver
 
-def init_db(engine, with_demo=True):
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+# Режимы запуска (DB_BOOTSTRAP):
+#   auto  — DDL, миграции до head и демо-данные при каждом старте процесса (локальная разработка);
+#   check — один запрос: ревизия Alembic в БД должна совпадать с head; DDL не выполняется;
+#   off   — без обращения к БД (тесты, CLI-команды инициализации).
+BOOTSTRAP_MODES = ("auto", "check", "off")
+
+
+class SchemaNotReady(RuntimeError):
+    pass
+
+
+def bootstrap(engine, mode: str = "auto"):
+    """Подготовка БД при старте процесса согласно режиму DB_BOOTSTRAP."""
+    if mode == "auto":
+        # То же, что `flask init-db --demo`
+        init_db(engine, with_demo=True)
+    elif mode == "check":
+        check_db(engine)
+    elif mode != "off":
+        raise ValueError(f"DB_BOOTSTRAP: неизвестный режим {mode!r}, ожидается один из {BOOTSTRAP_MODES}")
+
+
+def _alembic_config():
+    from alembic.config import Config
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "alembic"))
+    return config
+
+
+def _revision_ids(path: str) -> tuple:
+    """revision и down_revision из файла миграции (разбор AST, модуль не импортируется)."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    ids = {}
+    for node in tree.body:
+        target = node.target if isinstance(node, ast.AnnAssign) else (
+            node.targets[0] if isinstance(node, ast.Assign) and len(node.targets) == 1 else None)
+        if isinstance(target, ast.Name) and target.id in ("revision", "down_revision") and node.value is not None:
+            ids[target.id] = ast.literal_eval(node.value)
+    return ids.get("revision"), ids.get("down_revision")
+
+
+def alembic_head() -> str:
     """
-    Создаёт схему lib (если нет), таблицы ORM, представление v_active_borrows и триггер-валидатор.
-    Можно также наполнить демо-данными.
+    Последняя ревизия из alembic/versions — по файлам, без обращения к БД.
+    Сам alembic не импортируется: его импорт (~150 мс) дороже всей проверки в режиме check.
     """
-    # 1) Схема и таблицы
+    versions = os.path.join(os.path.dirname(ALEMBIC_INI), "alembic", "versions")
+    revisions, parents = set(), set()
+    for path in glob.glob(os.path.join(versions, "*.py")):
+        revision, down_revision = _revision_ids(path)
+        if revision:
+            revisions.add(revision)
+        if isinstance(down_revision, (tuple, list)):
+            parents.update(down_revision)
+        elif down_revision:
+            parents.add(down_revision)
+    heads = revisions - parents
+    if len(heads) != 1:
+        raise SchemaNotReady(f"Ожидалась одна head-ревизия Alembic, найдено: {sorted(heads)}")
+    return heads.pop()
+
+
+def check_db(engine, expected: str | None = None) -> str:
+    """Проверка схемы одним запросом; SchemaNotReady — если схема не создана или не обновлена."""
+    expected = expected or alembic_head()
+    try:
+        with engine.connect() as conn:
+            current = conn.execute(text("SELECT version_num FROM lib.alembic_version")).scalar()
+    except DBAPIError as e:
+        raise SchemaNotReady("Схема lib не инициализирована: выполните `flask init-db`") from e
+    if current != expected:
+        raise SchemaNotReady(
+            f"Ревизия схемы {current!r} не совпадает с {expected!r}: выполните `flask init-db`"
+        )
+    return current
+
+
+def upgrade_schema(engine=None):
+    """alembic upgrade head: на соединении engine или, без него, по DATABASE_URL (alembic/env.py)."""
+    from alembic import command
+    config = _alembic_config()
+    if engine is None:
+        command.upgrade(config, "head")
+        return
     with engine.begin() as conn:
-        conn.exec_driver_sql("CREATE SCHEMA IF NOT EXISTS lib;")
-    Base.metadata.create_all(engine)
+        config.attributes["connection"] = conn
+        command.upgrade(config, "head")
 
-    # 2) Представление активных выдач и триггер-хук
-    _create_view_and_triggers(engine)
 
-    # 3) Демо-наполнение (опционально)
+def init_db(engine, with_demo=True):
+    """
+    Создаёт схему lib (если нет), таблицы ORM, представление v_active_borrows и триггер-валидатор,
+    доводит схему миграциями до head. Можно также наполнить демо-данными.
+    """
+    # 1) Схема, таблицы, представление активных выдач и триггер-хук
+    _create_tables(engine)
+
+    # 2) Миграции: create_all не меняет существующие таблицы, и в базе прежней версии без них нет
+    #    колонок и ограничений (active_count, updated_at, уникальность имён), на которые опираются
+    #    демо-данные, а в новой — секций журналов, индексов и триггеров поиска (007–010)
+    upgrade_schema(engine)
+
+    # 3) Демо-наполнение (опционально) — на схеме последней ревизии
     if with_demo:
         _seed_demo(engine)
 
+def _create_tables(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE SCHEMA IF NOT EXISTS lib;")
+    Base.metadata.create_all(engine)
+    _create_view_and_triggers(engine)
+
 def _create_view_and_triggers(engine):
     create_view = """
     CREATE OR REPLACE VIEW lib.v_active_borrows AS
@@ -37,7 +140,7 @@ def _create_view_and_triggers(engine):
     BEGIN
       IF NEW.copies_total < 0 THEN
         INSERT INTO lib.event_log(event, details) VALUES
-          ('NEGATIVE_INVENTORY_ATTEMPT', to_json(NEW)::text);
+          ('NEGATIVE_INVENTORY_ATTEMPT', to_jsonb(NEW));
         RAISE EXCEPTION 'Количество экземпляров не может быть отрицательным';
       END IF;
       RETURN NEW;
@@ -59,11 +162,9 @@ def _create_view_and_triggers(engine):
 
 def _seed_demo(engine):
     with Session(engine) as session, session.begin():
-        # Издатель
-        pub = session.query(Publisher).filter_by(name="Наука").one_or_none()
-        if not pub:
-            pub = Publisher(name="Наука")
-            session.add(pub)
+        # Издатель и авторы — одним пакетом через общие резолверы
+        pub_id = publisher_resolver.resolve_one(session, "Наука")
+        author_ids = author_resolver.resolve(session, ["Иванов И.И.", "Петров П.П.", "Сидоров С.С."])
 
         # Факультеты
         fac_names = ["Физический", "Математический", "Исторический"]
@@ -83,20 +184,18 @@ def _seed_demo(engine):
         # Книги и авторы
         qm = session.query(Book).filter_by(title="Квантовая механика").one_or_none()
         if not qm:
-            qm = Book(title="Квантовая механика", publisher=pub, year=2018,
+            qm = Book(title="Квантовая механика", publisher_id=pub_id, year=2018,
                       pages=520, illustrations=40, price=1250.00)
             session.add(qm)
-            a1 = _get_or_create_author(session, "Иванов И.И.")
-            a2 = _get_or_create_author(session, "Петров П.П.")
-            session.add_all([BookAuthor(book=qm, author=a1), BookAuthor(book=qm, author=a2)])
+            session.add_all([BookAuthor(book=qm, author_id=author_ids["Иванов И.И."]),
+                             BookAuthor(book=qm, author_id=author_ids["Петров П.П."])])
 
         he = session.query(Book).filter_by(title="История Европы").one_or_none()
         if not he:
-            he = Book(title="История Европы", publisher=pub, year=2015,
+            he = Book(title="История Европы", publisher_id=pub_id, year=2015,
                       pages=430, illustrations=16, price=980.00)
             session.add(he)
-            a3 = _get_or_create_author(session, "Сидоров С.С.")
-            session.add(BookAuthor(book=he, author=a3))
+            session.add(BookAuthor(book=he, author_id=author_ids["Сидоров С.С."]))
 
     # Инвентарь и связи факультетов
     with Session(engine) as session, session.begin():
@@ -122,14 +221,6 @@ def _seed_demo(engine):
             hist = session.query(Faculty).filter_by(name="Исторический").one()
             session.add(Student(full_name="Студент 2", faculty_id=hist.id))
 
-def _get_or_create_author(session: Session, full_name: str) -> Author:
-    a = session.query(Author).filter_by(full_name=full_name).one_or_none()
-    if not a:
-        a = Author(full_name=full_name)
-        session.add(a)
-        session.flush()
-    return a
-
 def _upsert_inventory(session: Session, book_id: int, branch_id: int, copies: int):
     inv = session.query(Inventory).filter_by(book_id=book_id, branch_id=branch_id).one_or_none()
     if not inv:
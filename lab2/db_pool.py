@@ -0,0 +1,207 @@
+# db_pool.py
+"""
+Engine с настраиваемым пулом соединений и живой статистикой пула.
+
+Параметры берутся из окружения:
+    DB_POOL_SIZE            постоянных соединений в пуле (5)
+    DB_MAX_OVERFLOW         дополнительных соединений сверх пула (10)
+    DB_POOL_TIMEOUT         сколько ждать свободное соединение, с (30)
+    DB_POOL_RECYCLE         пересоздавать соединения старше, с (1800; -1 — не пересоздавать)
+    DB_POOL_PRE_PING        проверять соединение перед выдачей (1)
+    DB_STATEMENT_TIMEOUT_MS statement_timeout на стороне PostgreSQL (0 — без ограничения)
+    DB_LOCK_TIMEOUT_MS      lock_timeout на стороне PostgreSQL (0 — без ограничения)
+
+Статистика (на процесс): выдано сейчас, overflow, число выдач и таймаутов, ожидание
+свободного соединения (сумма, максимум, гистограмма) и время удержания соединения
+(гистограмма). Отдаётся функцией pool_stats(engine) и на /debug/pool.
+
+Пул — стандартный QueuePool; учёт ведут события пула на engine (connect, checkout, checkin —
+время выдачи хранится в connection_record.info) и обёртка публичного engine.raw_connection(),
+через который соединение берут и Connection, и Session: она вызывается один раз на выдачу и
+измеряет ожидание вместе с открытием нового соединения и pre-ping. dispose() (в том числе
+после fork) начинает статистику заново.
+"""
+import functools
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from flask import abort, jsonify
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+# Верхние границы корзин гистограмм, мс
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def pool_settings() -> dict:
+    return {
+        "pool_size": _env_int("DB_POOL_SIZE", 5),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") not in ("0", "false", "no"),
+        "statement_timeout_ms": _env_int("DB_STATEMENT_TIMEOUT_MS", 0),
+        "lock_timeout_ms": _env_int("DB_LOCK_TIMEOUT_MS", 0),
+    }
+
+
+class Histogram:
+    def __init__(self, bounds=BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # последняя корзина — больше верхней границы
+        self.total = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect_left(self.bounds, ms)] += 1
+        self.total += ms
+
+    def as_dict(self) -> dict:
+        buckets = {f"le_{b}": n for b, n in zip(self.bounds, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {"count": sum(self.counts), "sum_ms": round(self.total, 3), "buckets": buckets}
+
+
+class PoolStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.wait_max_ms = 0.0
+        self.wait = Histogram()
+        self.hold = Histogram()
+
+    def observe_wait(self, ms: float):
+        with self.lock:
+            self.checkouts += 1
+            self.wait.observe(ms)
+            self.wait_max_ms = max(self.wait_max_ms, ms)
+
+    def observe_hold(self, ms: float):
+        with self.lock:
+            self.hold.observe(ms)
+
+    def count_connect(self):
+        with self.lock:
+            self.connects += 1
+
+    def count_timeout(self):
+        with self.lock:
+            self.timeouts += 1
+
+
+_stats = weakref.WeakKeyDictionary()  # engine -> PoolStats
+
+
+def _on_connect(stats, dbapi_connection, connection_record):
+    stats().count_connect()
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info["checked_out_at"] = time.perf_counter()
+
+
+def _on_checkin(stats, dbapi_connection, connection_record):
+    started = connection_record.info.pop("checked_out_at", None)
+    if started is not None:
+        stats().observe_hold((time.perf_counter() - started) * 1000)
+
+
+def instrument(engine):
+    """Подключает статистику к пулу engine (QueuePool); повторный вызов ничего не меняет."""
+    if engine in _stats or not isinstance(engine.pool, QueuePool):
+        return engine
+    _stats[engine] = PoolStats()
+    stats = functools.partial(_stats.get, engine)
+    event.listen(engine, "connect", functools.partial(_on_connect, stats))
+    event.listen(engine, "checkout", _on_checkout)
+    event.listen(engine, "checkin", functools.partial(_on_checkin, stats))
+    event.listen(engine, "engine_disposed", lambda e: _stats.__setitem__(e, PoolStats()))
+
+    raw_connection = engine.raw_connection
+
+    @functools.wraps(raw_connection)
+    def timed_raw_connection():
+        started = time.perf_counter()
+        try:
+            connection = raw_connection()
+        except PoolTimeoutError:
+            stats().count_timeout()
+            raise
+        stats().observe_wait((time.perf_counter() - started) * 1000)
+        return connection
+
+    engine.raw_connection = timed_raw_connection
+    return engine
+
+
+def create_engine_from_env(url: str, **kwargs):
+    """create_engine с параметрами пула и таймаутами из окружения (для SQLite — без пула)."""
+    if url.startswith("sqlite"):
+        return create_engine(url, future=True, **kwargs)
+    settings = pool_settings()
+    options = []
+    if settings["statement_timeout_ms"]:
+        options.append(f"-c statement_timeout={settings['statement_timeout_ms']}")
+    if settings["lock_timeout_ms"]:
+        options.append(f"-c lock_timeout={settings['lock_timeout_ms']}")
+    connect_args = kwargs.pop("connect_args", {})
+    if options and url.startswith("postgresql"):
+        connect_args = {**connect_args, "options": " ".join(options)}
+    return instrument(create_engine(
+        url,
+        future=True,
+        poolclass=QueuePool,
+        pool_size=settings["pool_size"],
+        max_overflow=settings["max_overflow"],
+        pool_timeout=settings["pool_timeout"],
+        pool_recycle=settings["pool_recycle"],
+        pool_pre_ping=settings["pool_pre_ping"],
+        connect_args=connect_args,
+        **kwargs,
+    ))
+
+
+def pool_stats(engine) -> dict:
+    """Текущее состояние и накопленная статистика пула engine."""
+    pool = engine.pool
+    result = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        result.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "timeout_s": pool.timeout(),
+        })
+    stats = _stats.get(engine)
+    if stats is not None:
+        with stats.lock:
+            result.update({
+                "checkouts": stats.checkouts,
+                "timeouts": stats.timeouts,
+                "connects": stats.connects,
+                "wait_max_ms": round(stats.wait_max_ms, 3),
+                "wait": stats.wait.as_dict(),
+                "hold": stats.hold.as_dict(),
+            })
+    return result
+
+
+def init_app(app, engine_getter):
+    """/debug/pool — только в debug или при POOL_STATS_DEBUG=1; engine_getter() -> текущий engine."""
+    def debug_pool():
+        if not (app.debug or os.getenv("POOL_STATS_DEBUG") == "1"):
+            abort(404)
+        return jsonify(pool_stats(engine_getter()))
+
+    app.add_url_rule("/debug/pool", "debug_pool", debug_pool)
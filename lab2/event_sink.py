@@ -0,0 +1,332 @@
+# event_sink.py
+"""
+Асинхронная запись журнала событий (lib.event_log) и других журналов только на добавление.
+
+Событие не добавляется в транзакцию запроса: оно кладётся в ограниченную очередь в памяти,
+фоновый поток собирает пачку (до EVENT_SINK_BATCH_SIZE строк или EVENT_SINK_FLUSH_INTERVAL
+секунд) и вставляет её одним executemany через собственное соединение. Запрос не ждёт записи.
+
+    emit(engine, event, details)          — сразу в очередь (переживает ROLLBACK запроса)
+    emit_on_commit(session, event, ...)   — в очередь после COMMIT сессии, при ROLLBACK отбрасывается
+
+Переполнение очереди (EVENT_SINK_OVERFLOW):
+    block  ждать место до EVENT_SINK_BLOCK_TIMEOUT секунд, затем отбросить (по умолчанию)
+    drop   отбросить сразу
+    spill  дописать в локальный файл EVENT_SINK_SPILL_PATH (NDJSON); когда очередь опустеет,
+           фоновый поток дозаписывает файл в основную БД (engine из configure())
+
+Отброшенные, сброшенные в файл и записанные события считаются в /metrics. При выходе
+процесса (atexit, worker_exit gunicorn) очереди дописываются — shutdown(); flush() ждёт,
+пока записано всё, что уже в очереди (тесты, CLI).
+
+EventSink(table, env_prefix) — та же очередь для другой таблицы со своими настройками
+<env_prefix>_QUEUE_SIZE, _BATCH_SIZE, _OVERFLOW, ... (журнал действий — activity_log.py).
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import DateTime, insert
+
+import metrics
+import on_commit
+from models import EventLog
+
+OVERFLOW_POLICIES = ("block", "drop", "spill")
+
+_PENDING_KEY = "event_sink_pending"
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+WRITTEN = metrics.counter("event_log_written_total", "Строки, записанные фоновым писателем", ("table",))
+DROPPED = metrics.counter("event_log_dropped_total", "Строки, отброшенные при переполнении или ошибке записи",
+                          ("table",))
+SPILLED = metrics.counter("event_log_spilled_total", "Строки, сброшенные в локальный файл при переполнении",
+                          ("table",))
+
+_sinks = weakref.WeakSet()
+
+
+def _settings(prefix: str, table_name: str, default_overflow: str) -> dict:
+    overflow = os.getenv(f"{prefix}_OVERFLOW", default_overflow)
+    if overflow not in OVERFLOW_POLICIES:
+        raise ValueError(f"{prefix}_OVERFLOW: ожидается одно из {OVERFLOW_POLICIES}, получено {overflow!r}")
+    return {
+        "queue_size": int(os.getenv(f"{prefix}_QUEUE_SIZE", "10000")),
+        "batch_size": int(os.getenv(f"{prefix}_BATCH_SIZE", "500")),
+        "overflow": overflow,
+        "block_timeout": float(os.getenv(f"{prefix}_BLOCK_TIMEOUT", "1")),
+        "flush_interval": float(os.getenv(f"{prefix}_FLUSH_INTERVAL", "0.2")),
+        "spill_path": os.getenv(f"{prefix}_SPILL_PATH")
+        or os.path.join(tempfile.gettempdir(), f"library-{table_name}-spill.ndjson"),
+        "shutdown_timeout": float(os.getenv(f"{prefix}_SHUTDOWN_TIMEOUT", "5")),
+    }
+
+
+@contextmanager
+def _locked_spill(path: str):
+    """Файл переполнения под flock; если его успели забрать на дозапись — открывается заново."""
+    while True:
+        f = open(path, "a", encoding="utf-8")
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            same_file = os.fstat(f.fileno()).st_ino == os.stat(path).st_ino
+        except FileNotFoundError:
+            same_file = False
+        if same_file:
+            break
+        f.close()
+    try:
+        yield f
+    finally:
+        f.close()  # закрытие снимает блокировку
+
+
+class EventSink:
+    """Очередь строк таблицы table и фоновый поток, пишущий их пачками."""
+
+    def __init__(self, table, env_prefix: str = "EVENT_SINK", default_overflow: str = "block"):
+        self.table = table
+        self.settings = _settings(env_prefix, table.name, default_overflow)
+        self.default_engine = None
+        self._datetime_columns = [c.name for c in table.columns if isinstance(c.type, DateTime)]
+        self._reset()
+        _sinks.add(self)
+
+    def _reset(self):
+        # После fork поток и соединения писателя остались в родителе: потомок начинает с новой очереди
+        self._queue = queue.Queue(self.settings["queue_size"])
+        self._lock = threading.Lock()
+        self._thread = None
+        self._connections = {}  # engine -> соединение писателя
+
+    # ---------------- постановка в очередь ----------------
+
+    def put(self, engine, row: dict):
+        self._ensure_thread()
+        item = (engine, row)
+        policy = self.settings["overflow"]
+        try:
+            if policy == "block":
+                self._queue.put(item, timeout=self.settings["block_timeout"])
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            self._overflow([row])
+
+    def _overflow(self, rows: list):
+        """Строки, которые не удалось поставить в очередь или записать: в файл переполнения или в счётчик потерь."""
+        if self.settings["overflow"] == "spill":
+            self._spill(rows)
+        else:
+            DROPPED.inc(len(rows), table=self.table.name)
+
+    # ---------------- фоновый поток ----------------
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"sink-{self.table.name}", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=1)
+            except queue.Empty:
+                self._replay_when_idle()
+                continue
+            if not self._flush_batch(self._collect_batch(first)):
+                return
+
+    def _replay_when_idle(self):
+        # Очередь пуста: время дозаписать события, сброшенные в файл
+        try:
+            self._replay_spill()
+        except Exception:
+            logger.exception("Ошибка дозаписи файла переполнения журнала событий")
+
+    def _collect_batch(self, first) -> list:
+        # Пачка копится до batch_size или flush_interval: при редких событиях писатель
+        # не делает INSERT на каждую строку и не отнимает процессор у запросов
+        batch = [first]
+        deadline = time.monotonic() + self.settings["flush_interval"]
+        while len(batch) < self.settings["batch_size"] and batch[-1] is not _STOP:
+            try:
+                batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush_batch(self, batch: list) -> bool:
+        """Пишет пачку; False — в пачке был сигнал остановки."""
+        try:
+            self._write([item for item in batch if item is not _STOP])
+        except Exception:
+            # Поток писателя не должен умирать: иначе flush() и очередь встанут навсегда
+            logger.exception("Ошибка фоновой записи журнала событий")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+        return not any(item is _STOP for item in batch)
+
+    def _write(self, items: list):
+        by_engine = {}
+        for engine, row in items:
+            by_engine.setdefault(engine, []).append(row)
+        for engine, rows in by_engine.items():
+            try:
+                self._insert(engine, rows)
+            except Exception:
+                logger.exception("Не удалось записать %d строк в %s", len(rows), self.table.name)
+                self._drop_connection(engine)
+                self._overflow(rows)
+            else:
+                WRITTEN.inc(len(rows), table=self.table.name)
+
+    def _insert(self, engine, rows: list):
+        conn = self._connections.get(engine)
+        if conn is None:
+            conn = self._connections[engine] = engine.connect()
+        with conn.begin():
+            conn.execute(insert(self.table), rows)
+
+    def _drop_connection(self, engine):
+        conn = self._connections.pop(engine, None)
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    # ---------------- файл переполнения ----------------
+
+    def _spill(self, rows: list):
+        lines = "".join(json.dumps(row, default=datetime.isoformat) + "\n" for row in rows)
+        with _locked_spill(self.settings["spill_path"]) as f:
+            f.write(lines)
+        SPILLED.inc(len(rows), table=self.table.name)
+
+    def _claim_spill(self) -> str | None:
+        """Забирает файл переполнения под уникальным именем (файл общий для воркеров)."""
+        path = self.settings["spill_path"]
+        if self.default_engine is None or not os.path.exists(path):
+            return None
+        claimed = f"{path}.{os.getpid()}.replay"
+        with _locked_spill(path):
+            os.replace(path, claimed)
+        return claimed
+
+    def _replay_spill(self):
+        claimed = self._claim_spill()
+        if claimed is None:
+            return
+        with open(claimed, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        for row in rows:
+            for name in self._datetime_columns:
+                if row.get(name) is not None:
+                    row[name] = datetime.fromisoformat(row[name])
+        size = self.settings["batch_size"]
+        try:
+            for i in range(0, len(rows), size):
+                self._insert(self.default_engine, rows[i:i + size])
+                WRITTEN.inc(len(rows[i:i + size]), table=self.table.name)
+        except Exception:
+            # Оставшиеся строки возвращаются в файл переполнения до следующей попытки
+            logger.exception("Не удалось дозаписать строки из %s", claimed)
+            self._drop_connection(self.default_engine)
+            self._spill(rows[i:])
+        os.remove(claimed)
+
+    # ---------------- завершение ----------------
+
+    def flush(self):
+        """Ждёт, пока будет записано всё, что уже поставлено в очередь."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def shutdown(self):
+        """Дописывает очередь и останавливает поток (не дольше EVENT_SINK_SHUTDOWN_TIMEOUT)."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=self.settings["shutdown_timeout"])
+        except queue.Full:
+            logger.warning("Очередь %s не дописана при завершении", self.table.name)
+            return
+        thread.join(self.settings["shutdown_timeout"])
+        for engine in list(self._connections):
+            self._drop_connection(engine)
+        self._thread = None
+
+
+_sink = EventSink(EventLog.__table__)
+
+
+def configure(engine):
+    """Основная БД: в неё дозаписывается файл переполнения."""
+    _sink.default_engine = engine
+
+
+def _engine_of(session):
+    bind = session.get_bind()
+    return getattr(bind, "engine", bind)
+
+
+def _row(event: str, details: dict | None) -> dict:
+    # Время события — момент вызова, а не момент записи пачки
+    return {"event": event, "details": details, "created_at": datetime.utcnow()}
+
+
+def emit(bind, event: str, details: dict | None = None):
+    """Событие в очередь немедленно, независимо от исхода транзакций; bind — Engine или Connection."""
+    _sink.put(getattr(bind, "engine", bind), _row(event, details))
+
+
+def emit_on_commit(session, event: str, details: dict | None = None):
+    """Событие в очередь после COMMIT транзакции сессии; при ROLLBACK отбрасывается."""
+    on_commit.add(session, _PENDING_KEY, (_engine_of(session), _row(event, details)))
+
+
+def flush():
+    """Ждёт записи очередей всех писателей процесса."""
+    for sink in list(_sinks):
+        sink.flush()
+
+
+def shutdown():
+    """Дописывает очереди всех писателей процесса."""
+    for sink in list(_sinks):
+        sink.shutdown()
+
+
+def _reset_after_fork():
+    for sink in list(_sinks):
+        sink._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(shutdown)
+
+
+def _enqueue_committed(items: list):
+    for engine, row in items:
+        _sink.put(engine, row)
+
+
+on_commit.register(_PENDING_KEY, _enqueue_committed)
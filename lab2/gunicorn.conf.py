@@ -0,0 +1,37 @@
+# gunicorn.conf.py
+"""
+Production-запуск: gunicorn -c gunicorn.conf.py "app:create_app()"
+
+Pre-fork: мастер один раз импортирует приложение (preload_app) и проверяет схему
+(DB_BOOTSTRAP=check), затем форкает воркеры. Пул соединений engine сбрасывается в каждом
+воркере после fork (os.register_at_fork в app.py), поэтому сокеты мастера не разделяются.
+
+Воркеры — по числу ядер, в каждом gthread-потоки: запрос большую часть времени ждёт БД.
+"""
+import multiprocessing
+import os
+import tempfile
+
+# Снимки метрик воркеров (metrics.py): общий каталог, /metrics любого воркера суммирует все
+if not os.getenv("METRICS_DIR"):
+    os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="library-metrics-")
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:7009")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = 30
+keepalive = 5
+# Периодический перезапуск воркеров ограничивает рост памяти (кэши справочников, фрагментация)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = 500
+accesslog = "-"
+errorlog = "-"
+
+
+def worker_exit(server, worker):
+    # Дописать очередь журнала событий (event_sink) до выхода воркера
+    import event_sink
+    event_sink.shutdown()
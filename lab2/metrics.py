@@ -0,0 +1,325 @@
+# metrics.py
+"""
+Метрики в текстовом формате Prometheus на /metrics без внешних зависимостей и сервисов.
+
+Для каждого роута (endpoint Flask) собираются гистограммы полного времени запроса,
+времени в БД (из query_stats) и времени рендеринга шаблонов (сигналы Flask), а также
+число запросов по коду ответа. Доменные счётчики объявляются через counter().
+
+Несколько воркеров: если задан METRICS_DIR, каждый процесс раз в METRICS_FLUSH_INTERVAL
+секунд (и при выходе) сохраняет снимок своих значений в METRICS_DIR/<pid>.json, а /metrics
+суммирует снимки всех процессов. Снимки завершившихся воркеров сливаются в archive.json,
+поэтому счётчики не «откатываются» при перезапуске воркеров. Без METRICS_DIR — значения
+только текущего процесса.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, request
+from flask.signals import before_render_template, template_rendered
+
+import on_commit
+
+# Границы корзин гистограмм, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_PENDING_KEY = "metrics_on_commit"
+_ARCHIVE = "archive.json"
+
+_lock = threading.Lock()
+_families = {}   # name -> Metric
+_values = {}     # (name, labels) -> float | [счётчики корзин..., сумма]
+_state = {"dirty": False, "flusher": None}
+
+
+def _metrics_dir():
+    return os.getenv("METRICS_DIR") or None
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _families[name] = self
+
+    def _key(self, labels: dict) -> tuple:
+        return self.name, tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            _values[key] = _values.get(key, 0) + amount
+            _state["dirty"] = True
+        _ensure_flusher()
+
+    def inc_on_commit(self, session, amount: float = 1, **labels):
+        """Увеличить после COMMIT транзакции сессии; при ROLLBACK — не учитывать."""
+        on_commit.add(session, _PENDING_KEY, (self, amount, labels))
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            data = _values.get(key)
+            if data is None:
+                data = _values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            data[bisect_left(self.buckets, value)] += 1
+            data[-1] += value
+            _state["dirty"] = True
+        _ensure_flusher()
+
+
+def counter(name, documentation, labelnames=()) -> Counter:
+    return _families.get(name) or Counter(name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+    return _families.get(name) or Histogram(name, documentation, labelnames, buckets)
+
+
+REQUEST_LATENCY = histogram("http_request_duration_seconds", "Полное время обработки запроса", ("endpoint",))
+REQUEST_DB_TIME = histogram("http_request_db_seconds", "Время SQL-запросов за запрос", ("endpoint",))
+REQUEST_RENDER_TIME = histogram("http_request_render_seconds", "Время рендеринга шаблонов за запрос", ("endpoint",))
+REQUESTS = counter("http_requests_total", "Число запросов по коду ответа", ("endpoint", "method", "status"))
+
+
+# ---------------- снимки и агрегация между процессами ----------------
+
+def _snapshot() -> dict:
+    # Ключ — JSON-массив [имя, значения меток...]: переживает сохранение в файл
+    with _lock:
+        return {json.dumps([name, *labels]): (list(v) if isinstance(v, list) else v)
+                for (name, labels), v in _values.items()}
+
+
+def _merge(total: dict, snapshot: dict):
+    for key, value in snapshot.items():
+        current = total.get(key)
+        if current is None:
+            total[key] = list(value) if isinstance(value, list) else value
+        elif isinstance(value, list):
+            total[key] = [a + b for a, b in zip(current, value)]
+        else:
+            total[key] = current + value
+
+
+def _write_json(path: str, data: dict):
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def flush():
+    """Сохраняет снимок текущего процесса в METRICS_DIR (если задан)."""
+    directory = _metrics_dir()
+    if not directory:
+        return
+    _state["dirty"] = False
+    os.makedirs(directory, exist_ok=True)
+    _write_json(os.path.join(directory, f"{os.getpid()}.json"), _snapshot())
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect() -> dict:
+    """Суммарные значения всех процессов (или только текущего без METRICS_DIR)."""
+    directory = _metrics_dir()
+    if not directory:
+        return _snapshot()
+    flush()
+    total = {}
+    with open(os.path.join(directory, ".lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        archive_path = os.path.join(directory, _ARCHIVE)
+        archive = _read_json(archive_path)
+        archived = False
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            name = os.path.basename(path)[:-len(".json")]
+            if not name.isdigit():
+                continue
+            snapshot = _read_json(path)
+            if int(name) != os.getpid() and not _pid_alive(int(name)):
+                # Воркер завершился: его значения переносятся в архив, файл удаляется
+                _merge(archive, snapshot)
+                os.remove(path)
+                archived = True
+            else:
+                _merge(total, snapshot)
+        if archived:
+            _write_json(archive_path, archive)
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    _merge(total, archive)
+    return total
+
+
+def _ensure_flusher():
+    if _state["flusher"] is not None or not _metrics_dir():
+        return
+    with _lock:
+        if _state["flusher"] is not None:
+            return
+        interval = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                if _state["dirty"]:
+                    flush()
+
+        _state["flusher"] = threading.Thread(target=loop, name="metrics-flush", daemon=True)
+        _state["flusher"].start()
+
+
+def _reset_after_fork():
+    # Значения родителя остаются за ним; поток сброса в потомке не существует
+    global _lock
+    _lock = threading.Lock()
+    _values.clear()
+    _state.update(dirty=False, flusher=None)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(flush)
+
+
+# ---------------- формат Prometheus ----------------
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+
+def render(values: dict) -> str:
+    by_family = {}
+    for key, value in values.items():
+        name, *labels = json.loads(key)
+        by_family.setdefault(name, []).append((labels, value))
+    lines = []
+    for name, family in sorted(_families.items()):
+        lines.append(f"# HELP {name} {family.documentation}")
+        lines.append(f"# TYPE {name} {family.kind}")
+        for labels, value in sorted(by_family.get(name, ())):
+            if family.kind == "histogram":
+                cumulative = 0
+                for bound, count in zip((*family.buckets, math.inf), value[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(family.labelnames, labels, [('le', _format_value(bound))])} "
+                                 f"{cumulative}")
+                lines.append(f"{name}_sum{_labels(family.labelnames, labels)} {_format_value(value[-1])}")
+                lines.append(f"{name}_count{_labels(family.labelnames, labels)} {cumulative}")
+            else:
+                lines.append(f"{name}{_labels(family.labelnames, labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------- интеграция с Flask и SQLAlchemy ----------------
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_render_time = 0.0
+
+
+def _record(status: int):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return
+    endpoint = request.endpoint or "unknown"
+    REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint)
+    stats = g.get("query_stats")
+    REQUEST_DB_TIME.observe(stats.total_time if stats else 0.0, endpoint=endpoint)
+    REQUEST_RENDER_TIME.observe(g.get("metrics_render_time", 0.0), endpoint=endpoint)
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=status)
+
+
+def _finish_request(response):
+    _record(response.status_code)
+    return response
+
+
+def _teardown_request(exc):
+    # Необработанное исключение: after_request не вызывался
+    if exc is not None:
+        _record(500)
+
+
+def _before_render(sender, template, context, **extra):
+    g.metrics_render_started = time.perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    started = g.pop("metrics_render_started", None)
+    if started is not None:
+        g.metrics_render_time = g.get("metrics_render_time", 0.0) + time.perf_counter() - started
+
+
+def _metrics_view():
+    return Response(render(collect()), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+def init_app(app):
+    """Подключает сбор метрик ко всем роутам приложения и /metrics."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.add_url_rule("/metrics", "metrics", _metrics_view)
+
+
+def _apply_pending(items: list):
+    for metric, amount, labels in items:
+        metric.inc(amount, **labels)
+
+
+on_commit.register(_PENDING_KEY, _apply_pending)
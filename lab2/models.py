@@ -4,15 +4,52 @@ from datetime import datetime
 from typing import List
 
 from sqlalchemy import (
-    Column, Integer, BigInteger, String, Text, Numeric, DateTime, ForeignKey,
-    UniqueConstraint, CheckConstraint, MetaData
+    Column, Integer, BigInteger, String, Text, Numeric, Date, DateTime, ForeignKey,
+    UniqueConstraint, CheckConstraint, MetaData, Index, JSON, text
 )
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import declarative_base, deferred, relationship
+from sqlalchemy.sql.expression import FunctionElement
 
 # Все таблицы в схеме lib
 metadata = MetaData(schema="lib")
 Base = declarative_base(metadata=metadata)
 
+
+class utcnow(FunctionElement):
+    """Текущее время сервера БД в UTC без часового пояса — как datetime.utcnow() на стороне приложения."""
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    # now() в колонке timestamp — местное время сервера (TimeZone), а не UTC
+    return "timezone('utc', now())"
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    # SQLite: CURRENT_TIMESTAMP — уже UTC
+    return "CURRENT_TIMESTAMP"
+
+
+def updated_at_column():
+    """Время последнего изменения строки: ставится при INSERT и при каждом UPDATE через SQLAlchemy
+    (ORM и Core); server_default — для вставок мимо SQLAlchemy (COPY, psql). Используется в ETag списков.
+    Все значения — UTC: иначе max(updated_at) на сервере не в UTC не сдвигается после правки.
+    У каждой таблицы — индекс ix_<таблица>_updated_at: max(updated_at) читается из индекса."""
+    return Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                  server_default=utcnow())
+
+class TableDeletes(Base):
+    """Число операторов DELETE/TRUNCATE по таблице (PostgreSQL, триггеры миграции 006): удаление
+    не меняет ни max(id), ни max(updated_at), а count(*) для ETag — проход по всей таблице."""
+    __tablename__ = "table_deletes"
+    table_name = Column(Text, primary_key=True)
+    deletes = Column(BigInteger, nullable=False, default=0, server_default=text("0"))
+
 class Publisher(Base):
     __tablename__ = "publishers"
     id = Column(Integer, primary_key=True)
@@ -25,6 +62,11 @@ class Author(Base):
     id = Column(Integer, primary_key=True)
     full_name = Column(Text, nullable=False)
 
+    # Уникальность имени нужна для INSERT ... ON CONFLICT при массовом импорте
+    __table_args__ = (
+        UniqueConstraint("full_name", name="uq_authors_full_name"),
+    )
+
     books = relationship("BookAuthor", back_populates="author")
 
 class Branch(Base):
@@ -32,6 +74,11 @@ class Branch(Base):
     id = Column(Integer, primary_key=True)
     name = Column(Text, unique=True, nullable=False)
     address = Column(Text)
+    updated_at = updated_at_column()
+
+    __table_args__ = (
+        Index("ix_branches_updated_at", "updated_at"),
+    )
 
     inventories = relationship("Inventory", back_populates="branch")
     book_faculties = relationship("BookFaculty", back_populates="branch")
@@ -50,6 +97,11 @@ class Student(Base):
     id = Column(Integer, primary_key=True)
     full_name = Column(Text, nullable=False)
     faculty_id = Column(Integer, ForeignKey("lib.faculties.id"), nullable=False)
+    updated_at = updated_at_column()
+
+    __table_args__ = (
+        Index("ix_students_updated_at", "updated_at"),
+    )
 
     faculty = relationship("Faculty", back_populates="students")
     borrows = relationship("Borrow", back_populates="student")
@@ -63,12 +115,17 @@ class Book(Base):
     pages = Column(Integer)
     illustrations = Column(Integer, default=0)
     price = Column(Numeric(10, 2))
+    updated_at = updated_at_column()
+    # Поисковый документ (название, авторы, издательство); в PostgreSQL его ведут триггеры (search.py),
+    # в других СУБД колонка не используется. Отложенная: списки книг её не читают
+    search_vector = deferred(Column(Text().with_variant(TSVECTOR(), "postgresql")))
 
     __table_args__ = (
         CheckConstraint("year BETWEEN 1500 AND 2100", name="ck_books_year"),
         CheckConstraint("pages >= 1", name="ck_books_pages"),
         CheckConstraint("illustrations >= 0", name="ck_books_illustrations"),
         CheckConstraint("price >= 0", name="ck_books_price"),
+        Index("ix_books_updated_at", "updated_at"),
     )
 
     publisher = relationship("Publisher", back_populates="books")
@@ -85,16 +142,26 @@ class BookAuthor(Base):
     book = relationship("Book", back_populates="authors")
     author = relationship("Author", back_populates="books")
 
+class SearchWord(Base):
+    """Словарь слов каталога для исправления опечаток в поиске (PostgreSQL + pg_trgm); ведут триггеры."""
+    __tablename__ = "search_words"
+    word = Column(Text, primary_key=True)
+
 class Inventory(Base):
     __tablename__ = "inventories"
     id = Column(Integer, primary_key=True)
     book_id = Column(Integer, ForeignKey("lib.books.id", ondelete="CASCADE"), nullable=False)
     branch_id = Column(Integer, ForeignKey("lib.branches.id", ondelete="CASCADE"), nullable=False)
     copies_total = Column(Integer, nullable=False)
+    # Денормализованный счётчик невозвращённых выдач; ведётся borrow_book()/return_book()
+    active_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    updated_at = updated_at_column()
 
     __table_args__ = (
         UniqueConstraint("book_id", "branch_id", name="uq_inventories_book_branch"),
         CheckConstraint("copies_total >= 0", name="ck_inventories_nonneg"),
+        CheckConstraint("active_count >= 0", name="ck_inventories_active_nonneg"),
+        Index("ix_inventories_updated_at", "updated_at"),
     )
 
     book = relationship("Book", back_populates="inventories")
@@ -119,10 +186,42 @@ class Borrow(Base):
     borrowed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
     returned_at = Column(DateTime)
 
+    # Индексы под keyset-пагинацию истории выдач: (borrowed_at, id) и те же ключи с фильтрами
+    __table_args__ = (
+        Index("ix_borrows_borrowed_at_id", "borrowed_at", "id"),
+        Index("ix_borrows_student_borrowed_at_id", "student_id", "borrowed_at", "id"),
+        Index("ix_borrows_book_borrowed_at_id", "book_id", "borrowed_at", "id"),
+        Index("ix_borrows_branch_borrowed_at_id", "branch_id", "borrowed_at", "id"),
+        Index("ix_borrows_active_borrowed_at_id", "borrowed_at", "id",
+              postgresql_where=text("returned_at IS NULL"),
+              sqlite_where=text("returned_at IS NULL")),
+        # Новые возвраты для сводки выдач (circulation.py): диапазон returned_at после отметки
+        Index("ix_borrows_returned_at", "returned_at"),
+    )
+
     student = relationship("Student", back_populates="borrows")
     book = relationship("Book", back_populates="borrows")
     branch = relationship("Branch", back_populates="borrows")
 
+class CirculationDaily(Base):
+    """Дневная сводка выдач по книге, филиалу и факультету читателя; ведёт circulation.refresh()."""
+    __tablename__ = "circulation_daily"
+    day = Column(Date, primary_key=True)
+    book_id = Column(Integer, ForeignKey("lib.books.id", ondelete="CASCADE"), primary_key=True)
+    branch_id = Column(Integer, ForeignKey("lib.branches.id", ondelete="CASCADE"), primary_key=True)
+    faculty_id = Column(Integer, ForeignKey("lib.faculties.id", ondelete="CASCADE"), primary_key=True)
+    borrows = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    returns = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    loan_seconds = Column(BigInteger, nullable=False, default=0, server_default=text("0"))
+
+class RollupState(Base):
+    """Отметки инкрементального обновления сводок: что из lib.borrows уже учтено."""
+    __tablename__ = "rollup_state"
+    name = Column(Text, primary_key=True)
+    last_borrow_id = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    last_returned_at = Column(DateTime)
+    refreshed_at = Column(DateTime)
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
@@ -145,16 +244,24 @@ class User(Base):
         return str(self.id)
 
 class EventLog(Base):
+    # В PostgreSQL — помесячные секции по created_at (миграция 007, partitions.py), ключ (id, created_at)
     __tablename__ = "event_log"
-    id = Column(BigInteger, primary_key=True)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
     event = Column(Text, nullable=False)
-    details = Column(Text)  # храним JSON как текст для простоты; можно поменять на JSONB через Dialect
+    # В PostgreSQL — JSONB с GIN-индексом (миграция 008): поиск по ключам через @>
+    details = Column(JSON().with_variant(JSONB(), "postgresql"))
+
+    __table_args__ = (
+        # Keyset-пагинация журнала по (created_at, id): вся лента и лента одного типа события
+        Index("ix_event_log_created_at_id", "created_at", "id"),
+        Index("ix_event_log_event_created_at_id", "event", "created_at", "id"),
+    )
 
 class UserActivityLog(Base):
-    """Таблица для логирования действий пользователей"""
+    """Таблица для логирования действий пользователей (в PostgreSQL секционирована, как event_log)"""
     __tablename__ = "user_activity_log"
-    id = Column(BigInteger, primary_key=True)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
     user_id = Column(Integer, ForeignKey("lib.users.id", ondelete="CASCADE"), nullable=False)
     action = Column(Text, nullable=False)  
     resource_type = Column(Text)  
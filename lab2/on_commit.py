@@ -0,0 +1,50 @@
+# on_commit.py
+"""
+Действия, отложенные до COMMIT транзакции сессии: перенос в общие кэши (resolvers, ref_cache,
+user_cache), счётчики /metrics, события журнала (event_sink).
+
+Модуль регистрирует обработчик своего ключа — register(key, handler) — и копит элементы
+в транзакции через add(session, key, item) или pending(session, key, factory), если
+накопленное нужно читать до COMMIT. После COMMIT внешней транзакции handler(накопленное)
+вызывается один раз на ключ; при ROLLBACK и при закрытии сессии без COMMIT накопленное
+отбрасывается. Всё хранится в session.info[_INFO_KEY]: {ключ: накопленное}.
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_INFO_KEY = "on_commit"
+
+_handlers = {}  # ключ -> handler(накопленное)
+
+
+def register(key: str, handler):
+    """handler(накопленное) вызывается после COMMIT транзакции, в которой под key что-то накоплено."""
+    _handlers[key] = handler
+
+
+def pending(session, key: str, factory=list):
+    """Накопленное под key в текущей транзакции сессии (создаётся factory() при первом обращении)."""
+    return session.info.setdefault(_INFO_KEY, {}).setdefault(key, factory())
+
+
+def add(session, key: str, item):
+    """Добавляет item в список, который после COMMIT получит обработчик key."""
+    pending(session, key).append(item)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_committed(session):
+    for key, items in session.info.pop(_INFO_KEY, {}).items():
+        _handlers[key](items)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    session.info.pop(_INFO_KEY, None)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_pending_on_close(session, transaction):
+    # Сессия закрыта без COMMIT: внешняя транзакция завершилась откатом
+    if transaction.parent is None:
+        session.info.pop(_INFO_KEY, None)
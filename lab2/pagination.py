@@ -0,0 +1,47 @@
+# pagination.py
+"""
+Keyset-пагинация: курсоры для постраничного вывода длинных списков.
+
+Курсор — непрозрачная строка (base64 от JSON), в которой хранится ключ
+последней показанной строки. Следующая страница запрашивается условием
+«ключ меньше курсора», поэтому БД читает ровно один диапазон индекса,
+а не сортирует и пропускает все предыдущие строки, как при OFFSET.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+
+class CursorError(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(*values) -> str:
+    """Упаковывает значения ключа (int, str, datetime) в курсор."""
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> tuple:
+    """Распаковывает курсор из `size` значений; при порче курсора — CursorError."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != size:
+            raise CursorError("Некорректный курсор")
+        return tuple(_decode_value(v) for v in values)
+    except (binascii.Error, UnicodeError, ValueError, TypeError) as e:
+        raise CursorError("Некорректный курсор") from e
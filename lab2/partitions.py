@@ -0,0 +1,198 @@
+# partitions.py
+"""
+Помесячные секции журналов lib.event_log и lib.user_activity_log (PostgreSQL).
+
+Таблицы секционированы по RANGE (created_at) миграцией 007: секция месяца называется
+<таблица>_pYYYYMM, строки вне созданных секций попадают в <таблица>_default.
+
+    ensure_partitions  создаёт секции от текущего месяца на PARTITION_MONTHS_AHEAD вперёд;
+                       строки нового диапазона, уже попавшие в default, переносятся в секцию
+    apply_retention    снимает (detach) или удаляет (drop) секции старше срока хранения —
+                       история удаляется целыми таблицами, без DELETE и последующего VACUUM
+    maintain           оба шага для всех журналов под advisory-блокировкой (воркеров несколько)
+
+Срок хранения в месяцах: EVENT_LOG_RETENTION_MONTHS, ACTIVITY_LOG_RETENTION_MONTHS
+(0 — хранить всё). PARTITION_RETENTION_MODE: detach (секция остаётся отдельной таблицей
+для выгрузки в архив) или drop.
+
+Обслуживание (DDL) выполняется только командой `flask maintain-partitions` (cron). Веб-процесс
+DDL не выполняет: init_app не чаще раза в PARTITION_CHECK_INTERVAL секунд проверяет одним
+запросом к каталогу, есть ли секция следующего месяца, и пишет предупреждение, если её нет.
+"""
+import logging
+import os
+import re
+import time
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+RETENTION_ENV = {
+    "event_log": "EVENT_LOG_RETENTION_MONTHS",
+    "user_activity_log": "ACTIVITY_LOG_RETENTION_MONTHS",
+}
+PARTITIONED_TABLES = tuple(RETENTION_ENV)
+RETENTION_MODES = ("detach", "drop")
+SCHEMA = "lib"
+
+# Ключ pg_advisory_xact_lock: обслуживание секций выполняет один процесс за раз
+_LOCK_KEY = 0x6C69627061727473
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_partitioned(conn, table: str) -> bool:
+    return bool(conn.execute(text(
+        "SELECT c.relkind = 'p' FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = :schema AND c.relname = :table"
+    ), {"schema": SCHEMA, "table": table}).scalar())
+
+
+def list_partitions(conn, table: str) -> dict:
+    """{первый день месяца: имя секции} для присоединённых помесячных секций."""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "JOIN pg_namespace n ON n.oid = p.relnamespace "
+        "WHERE n.nspname = :schema AND p.relname = :table"
+    ), {"schema": SCHEMA, "table": table}).scalars()
+    pattern = re.compile(rf"^{re.escape(table)}_p(\d{{4}})(\d{{2}})$")
+    months = {}
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            months[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return months
+
+
+def create_partition(conn, table: str, month: date) -> str:
+    """
+    Секция месяца month. Если в default уже есть строки этого месяца, секция создаётся
+    отдельной таблицей, строки переносятся в неё из default, затем она присоединяется.
+    """
+    name = partition_name(table, month)
+    lo, hi = month, add_months(month, 1)
+    bounds = {"lo": datetime(lo.year, lo.month, 1), "hi": datetime(hi.year, hi.month, 1)}
+    default = f"{SCHEMA}.{table}_default"
+    has_default = conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": default}).scalar()
+    in_default = has_default and conn.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {default} WHERE created_at >= :lo AND created_at < :hi)"
+    ), bounds).scalar()
+    values = f"FOR VALUES FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"
+    if not in_default:
+        conn.execute(text(f"CREATE TABLE {SCHEMA}.{name} PARTITION OF {SCHEMA}.{table} {values}"))
+        return name
+    conn.execute(text(
+        f"CREATE TABLE {SCHEMA}.{name} (LIKE {SCHEMA}.{table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {default} WHERE created_at >= :lo AND created_at < :hi RETURNING *) "
+        f"INSERT INTO {SCHEMA}.{name} SELECT * FROM moved"
+    ), bounds)
+    conn.execute(text(f"ALTER TABLE {SCHEMA}.{table} ATTACH PARTITION {SCHEMA}.{name} {values}"))
+    return name
+
+
+def ensure_partitions(conn, table: str, months_ahead: int, today: date | None = None) -> list:
+    """Создаёт недостающие секции с текущего месяца на months_ahead вперёд; имена созданных."""
+    current = month_start(today or datetime.utcnow().date())
+    existing = list_partitions(conn, table)
+    created = []
+    for n in range(months_ahead + 1):
+        month = add_months(current, n)
+        if month not in existing:
+            created.append(create_partition(conn, table, month))
+    return created
+
+
+def apply_retention(conn, table: str, keep_months: int, mode: str = "detach",
+                    today: date | None = None) -> list:
+    """
+    Снимает или удаляет секции, целиком лежащие раньше keep_months последних месяцев
+    (текущий месяц входит в срок). keep_months <= 0 — ничего не делать.
+    """
+    if keep_months <= 0:
+        return []
+    if mode not in RETENTION_MODES:
+        raise ValueError(f"PARTITION_RETENTION_MODE: ожидается одно из {RETENTION_MODES}, получено {mode!r}")
+    cutoff = add_months(month_start(today or datetime.utcnow().date()), -(keep_months - 1))
+    removed = []
+    for month, name in sorted(list_partitions(conn, table).items()):
+        if month >= cutoff:
+            break
+        conn.execute(text(f"ALTER TABLE {SCHEMA}.{table} DETACH PARTITION {SCHEMA}.{name}"))
+        if mode == "drop":
+            conn.execute(text(f"DROP TABLE {SCHEMA}.{name}"))
+        removed.append(name)
+    return removed
+
+
+def maintain(engine, today: date | None = None) -> dict:
+    """Секции вперёд и срок хранения для всех журналов; {таблица: (созданные, снятые)}."""
+    if engine.dialect.name != "postgresql":
+        return {}
+    months_ahead = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+    mode = os.getenv("PARTITION_RETENTION_MODE", "detach")
+    report = {}
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(conn, table):
+                continue
+            created = ensure_partitions(conn, table, months_ahead, today)
+            removed = apply_retention(conn, table, int(os.getenv(RETENTION_ENV[table], "0")), mode, today)
+            report[table] = (created, removed)
+    return report
+
+
+def missing_partitions(engine, today: date | None = None) -> list:
+    """Имена отсутствующих секций следующего месяца — один запрос к каталогу, без DDL."""
+    if engine.dialect.name != "postgresql":
+        return []
+    month = add_months(month_start(today or datetime.utcnow().date()), 1)
+    with engine.connect() as conn:
+        tables = conn.execute(text(
+            "SELECT p.relname FROM pg_class p JOIN pg_namespace n ON n.oid = p.relnamespace "
+            "WHERE n.nspname = :schema AND p.relkind = 'p' AND p.relname = ANY(:tables) "
+            "AND NOT EXISTS (SELECT 1 FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "                WHERE i.inhparent = p.oid AND c.relname = p.relname || :suffix) "
+            "ORDER BY p.relname"
+        ), {"schema": SCHEMA, "tables": list(PARTITIONED_TABLES), "suffix": f"_p{month:%Y%m}"}).scalars().all()
+    return [partition_name(table, month) for table in tables]
+
+
+def init_app(app, engine_getter):
+    """Предупреждение в журнал, если секции следующего месяца нет; сами секции создаёт только cron."""
+    interval = float(os.getenv("PARTITION_CHECK_INTERVAL", "3600"))
+    if interval <= 0:
+        return
+    state = {"next_check": 0.0}
+
+    def check_partitions():
+        now = time.monotonic()
+        if now < state["next_check"]:
+            return
+        state["next_check"] = now + interval
+        try:
+            missing = missing_partitions(engine_getter())
+        except Exception:
+            logger.exception("Не удалось проверить секции журналов")
+            return
+        if missing:
+            logger.warning("Нет секций следующего месяца: %s — запустите `flask maintain-partitions`",
+                           ", ".join(missing))
+
+    app.before_request(check_partitions)
@@ -0,0 +1,172 @@
+# query_stats.py
+"""
+Учёт SQL-операторов: сколько запросов, сколько времени в БД и какие самые медленные.
+
+Слушатели before/after_cursor_execute вешаются на класс Engine, поэтому учитываются все
+engine процесса (основной, тестовый и т.д.). Статистика собирается:
+  * на каждый HTTP-запрос Flask (flask.g) — отдаётся в заголовках X-DB-Queries,
+    X-DB-Time-Ms и Server-Timing, последние запросы видны на /debug/queries;
+  * внутри count_queries() — для тестов с бюджетом запросов (фикстура query_budget).
+
+Потоковые ответы (NDJSON /api/*, CSV /export/*) выполняют основную часть запросов уже после
+отправки заголовков: X-DB-* и Server-Timing учитывают только запросы до начала тела, а запись
+в /debug/queries дополняется полной статистикой, когда поток закрыт (streamed: true).
+
+Время начала оператора хранится по его контексту выполнения; если оператор упал,
+after_cursor_execute не вызывается, и запись снимает слушатель handle_error.
+"""
+import heapq
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import g, has_request_context, jsonify, request, abort
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOWEST_KEEP = 5
+HISTORY_SIZE = 100
+STATEMENT_MAX_LEN = 500
+
+_local = threading.local()
+_history = deque(maxlen=HISTORY_SIZE)
+_history_lock = threading.Lock()
+
+
+class QueryStats:
+    def __init__(self, keep_statements: bool = False):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest = []  # min-heap (elapsed, statement) из SLOWEST_KEEP самых медленных
+        # Полный список операторов — только для count_queries(): нужен в сообщении о превышении бюджета
+        self.statements = [] if keep_statements else None
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        if self.statements is not None:
+            self.statements.append(statement)
+        item = (elapsed, statement[:STATEMENT_MAX_LEN])
+        if len(self.slowest) < SLOWEST_KEEP:
+            heapq.heappush(self.slowest, item)
+        else:
+            heapq.heappushpop(self.slowest, item)
+
+    def as_dict(self) -> dict:
+        return {
+            "queries": self.count,
+            "db_time_ms": round(self.total_time * 1000, 2),
+            "slowest": [
+                {"ms": round(elapsed * 1000, 2), "statement": stmt}
+                for elapsed, stmt in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+
+def _collectors() -> list:
+    if not hasattr(_local, "collectors"):
+        _local.collectors = []
+    return _local.collectors
+
+
+def _start_key(context, cursor):
+    # context есть у всех операторов Connection; cursor — на случай его отсутствия
+    return context if context is not None else cursor
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_stats_start", {})[_start_key(context, cursor)] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_stats_start", {}).pop(_start_key(context, cursor), None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    if has_request_context():
+        stats = g.get("query_stats")
+        if stats is not None:
+            stats.record(statement, elapsed)
+    for stats in _collectors():
+        stats.record(statement, elapsed)
+
+
+def _handle_error(exception_context):
+    # Упавший оператор: after_cursor_execute не будет, снимаем его время начала
+    conn, context = exception_context.connection, exception_context.execution_context
+    if conn is not None and context is not None and not conn.closed:
+        conn.info.get("query_stats_start", {}).pop(context, None)
+
+
+def install():
+    """Подключает слушатели ко всем Engine (повторный вызов безопасен)."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+@contextmanager
+def count_queries():
+    """Считает все SQL-операторы, выполненные в текущем потоке внутри блока."""
+    install()
+    stats = QueryStats(keep_statements=True)
+    _collectors().append(stats)
+    try:
+        yield stats
+    finally:
+        _collectors().remove(stats)
+
+
+def current() -> QueryStats | None:
+    """Статистика текущего HTTP-запроса."""
+    return g.get("query_stats") if has_request_context() else None
+
+
+def _start_request():
+    g.query_stats = QueryStats()
+
+
+def _finish_request(response):
+    stats = g.get("query_stats")
+    if stats is None:
+        return response
+    db_ms = stats.total_time * 1000
+    response.headers["X-DB-Queries"] = str(stats.count)
+    response.headers["X-DB-Time-Ms"] = f"{db_ms:.2f}"
+    response.headers.add("Server-Timing", f"db;dur={db_ms:.2f};desc=\"{stats.count} queries\"")
+    entry = {"method": request.method, "path": request.path, "endpoint": request.endpoint,
+             "status": response.status_code}
+    entry.update(stats.as_dict())
+    with _history_lock:
+        _history.append(entry)
+    if response.is_streamed:
+        # Тело ещё не отдано: запросы генератора учитываются в той же статистике (stream_with_context)
+        def finish_stream():
+            with _history_lock:
+                entry.update(stats.as_dict(), streamed=True)
+
+        response.call_on_close(finish_stream)
+    return response
+
+
+def _debug_queries():
+    with _history_lock:
+        items = list(_history)
+    return jsonify(requests=items[::-1])
+
+
+def init_app(app):
+    """Подключает учёт к приложению; /debug/queries — только в debug или при QUERY_STATS_DEBUG=1."""
+    install()
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+    def debug_queries():
+        if not (app.debug or os.getenv("QUERY_STATS_DEBUG") == "1"):
+            abort(404)
+        return _debug_queries()
+
+    app.add_url_rule("/debug/queries", "debug_queries", debug_queries)
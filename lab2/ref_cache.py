@@ -0,0 +1,81 @@
+# ref_cache.py
+"""
+Кэш данных, построенных из таблиц каталога: списки подсказок (typeahead.py) и индекс
+поиска (search.py) для СУБД без собственных индексов.
+
+У каждой таблицы есть счётчик версии. Запись кэша хранит версии таблиц, из которых она
+построена, и считается актуальной, пока версии не изменились: запросы получают
+данные из памяти без единого обращения к БД.
+
+Версии повышаются после COMMIT:
+  * автоматически — для таблиц ORM-объектов, прошедших через flush (add/изменение/delete);
+  * явно через mark_changed(session, *tables) — для записи через Core (INSERT/UPDATE без ORM).
+При ROLLBACK отметки отбрасываются.
+
+Версии живут в памяти процесса: запись, сделанная другим процессом (другой воркер, psql),
+будет видна не позже чем через REF_CACHE_MAX_AGE секунд.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import on_commit
+
+MAX_AGE = float(os.getenv("REF_CACHE_MAX_AGE", "30"))
+
+_PENDING_KEY = "ref_cache_changed"
+
+_lock = threading.Lock()
+_versions = {}
+_entries = {}  # key -> (версии таблиц, время загрузки, значение)
+
+
+def version(table: str) -> int:
+    with _lock:
+        return _versions.get(table, 0)
+
+
+def bump(*tables: str):
+    """Повышает версии таблиц; записи кэша, зависящие от них, устаревают."""
+    with _lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+
+
+def get(key: str, tables: tuple, loader):
+    """Значение по ключу; loader() вызывается, если запись устарела или отсутствует."""
+    now = time.monotonic()
+    with _lock:
+        versions = tuple(_versions.get(t, 0) for t in tables)
+        entry = _entries.get(key)
+    if entry is not None and entry[0] == versions and now - entry[1] < MAX_AGE:
+        return entry[2]
+    value = loader()
+    # Сохраняем с версиями, снятыми до загрузки: изменение во время загрузки не «залипнет»
+    with _lock:
+        _entries[key] = (versions, now, value)
+    return value
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _versions.clear()
+
+
+def mark_changed(session, *tables: str):
+    """Отмечает таблицы изменёнными в текущей транзакции; версии повысятся после COMMIT."""
+    on_commit.pending(session, _PENDING_KEY, set).update(tables)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    changed = {obj.__table__.name for obj in (*session.new, *session.dirty, *session.deleted)}
+    if changed:
+        mark_changed(session, *changed)
+
+
+on_commit.register(_PENDING_KEY, lambda tables: bump(*tables))
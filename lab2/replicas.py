@@ -0,0 +1,192 @@
+# replicas.py
+"""
+Чтение с реплик PostgreSQL для роутов, которые только читают.
+
+    DATABASE_REPLICA_URLS         реплики через запятую (пусто — всё идёт в основную БД)
+    REPLICA_MAX_LAG_SECONDS       реплика с отставанием больше этого не используется (5)
+    REPLICA_LAG_CHECK_INTERVAL    как часто процесс перепроверяет отставание реплики, с (1)
+    REPLICA_STICKY_SECONDS        сколько пользователь читает из основной БД после своей записи (5)
+
+Роут помечается декоратором @read_only: его GET-запрос получает реплику (по кругу среди
+свежих) в g.read_engine, и RoutingSession отправляет туда SELECT. Запись, flush, text() и
+SELECT ... FOR UPDATE всегда идут в основную БД, как и все запросы вне @read_only-роутов.
+
+Чтение идёт в основную БД, если:
+  * пользователь недавно что-то изменил (POST/PUT/PATCH/DELETE): метка в cookie сессии,
+    поэтому действует во всех воркерах — пользователь сразу видит свою запись;
+  * все реплики отстают больше REPLICA_MAX_LAG_SECONDS или недоступны.
+
+Отставание измеряется на самой реплике (время последней применённой транзакции; реплика,
+догнавшая основную БД, отстаёт на 0) и кэшируется в процессе на REPLICA_LAG_CHECK_INTERVAL.
+Маршрутизация считается в /metrics: db_read_routing_total{target, reason}.
+"""
+import itertools
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import g, has_request_context, request, session as http_session
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import metrics
+from db_pool import create_engine_from_env
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Ключ cookie-сессии: до какого времени (unix time) читать из основной БД
+_PIN_KEY = "_primary_until"
+
+ROUTED = metrics.counter("db_read_routing_total", "Чтения @read_only-роутов: куда направлены и почему",
+                         ("target", "reason"))
+
+_LAG_SQL = text("""
+    SELECT CASE
+      WHEN NOT pg_is_in_recovery() THEN 0
+      WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+      ELSE COALESCE(EXTRACT(EPOCH FROM clock_timestamp() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+def replica_lag(engine) -> float | None:
+    """Отставание реплики в секундах; None — реплика недоступна."""
+    if engine.dialect.name != "postgresql":
+        return 0.0
+    try:
+        with engine.connect() as conn:
+            return float(conn.execute(_LAG_SQL).scalar())
+    except Exception:
+        return None
+
+
+class ReplicaSet:
+    """Реплики с кэшированным отставанием; pick() — свежая реплика по кругу или None."""
+
+    def __init__(self, engines: list, max_lag: float = 5.0, check_interval: float = 1.0, probe=replica_lag):
+        self.engines = list(engines)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.probe = probe
+        self._lock = threading.Lock()
+        self._lag = {}  # engine -> (время проверки, отставание или None)
+        self._next = itertools.count()
+
+    @classmethod
+    def from_env(cls):
+        urls = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+        return cls(
+            [create_engine_from_env(url) for url in urls],
+            max_lag=float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5")),
+            check_interval=float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "1")),
+        )
+
+    def lag(self, engine) -> float | None:
+        now = time.monotonic()
+        checked = self._lag.get(engine)
+        if checked is not None and now - checked[0] < self.check_interval:
+            return checked[1]
+        # Проверяет один поток; остальные тем временем берут предыдущее значение
+        if not self._lock.acquire(blocking=False):
+            return checked[1] if checked is not None else None
+        try:
+            lag = self.probe(engine)
+            self._lag[engine] = (time.monotonic(), lag)
+            return lag
+        finally:
+            self._lock.release()
+
+    def pick(self):
+        """(engine, None) — свежая реплика; (None, причина) — читать из основной БД."""
+        if not self.engines:
+            return None, "no_replicas"
+        start = next(self._next)
+        reason = "unavailable"
+        for i in range(len(self.engines)):
+            engine = self.engines[(start + i) % len(self.engines)]
+            lag = self.lag(engine)
+            if lag is None:
+                continue
+            if lag <= self.max_lag:
+                return engine, None
+            reason = "lag"
+        return None, reason
+
+    def dispose(self, close: bool = True):
+        for engine in self.engines:
+            engine.dispose(close=close)
+        self._lag.clear()
+
+
+_replicas = ReplicaSet([])
+
+
+def _reset_after_fork():
+    # Соединения и замеры отставания родителя потомку не подходят
+    _replicas.dispose(close=False)
+    _replicas._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def configure(replica_set: ReplicaSet):
+    global _replicas
+    _replicas.dispose()
+    _replicas = replica_set
+
+
+def is_pinned() -> bool:
+    return http_session.get(_PIN_KEY, 0) > time.time()
+
+
+def route_read():
+    """Engine реплики для текущего запроса или None (основная БД)."""
+    if not _replicas.engines:
+        return None
+    if is_pinned():
+        ROUTED.inc(target="primary", reason="pinned")
+        return None
+    engine, reason = _replicas.pick()
+    ROUTED.inc(target="replica" if engine is not None else "primary", reason=reason or "fresh")
+    return engine
+
+
+def read_only(view):
+    """Декоратор роута: SELECT его GET-запросов (и маркеров условного GET) — на реплику."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method in SAFE_METHODS:
+            g.read_engine = route_read()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(Session):
+    """Session, отправляющая SELECT @read_only-роута на реплику из g.read_engine."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = g.get("read_engine") if has_request_context() else None
+        if (
+            replica is not None
+            and not self._flushing
+            and getattr(clause, "is_select", False)
+            and getattr(clause, "_for_update_arg", None) is None
+        ):
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+def init_app(app, replica_set: ReplicaSet | None = None):
+    """Реплики из окружения (или replica_set) и закрепление за основной БД после записи."""
+    configure(replica_set if replica_set is not None else ReplicaSet.from_env())
+    sticky = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+
+    def pin_after_write(response):
+        if _replicas.engines and sticky > 0 and request.method not in SAFE_METHODS:
+            http_session[_PIN_KEY] = time.time() + sticky
+        return response
+
+    app.after_request(pin_after_write)
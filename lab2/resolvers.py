@@ -0,0 +1,124 @@
+# resolvers.py
+"""
+Резолверы имя -> id для справочников Publisher и Author.
+
+resolve() обрабатывает сразу список имён: попадания берутся из ограниченного LRU-кэша,
+промахи читаются одним SELECT, отсутствующие создаются одним INSERT ... ON CONFLICT DO NOTHING
+RETURNING (гонка с параллельной вставкой добирается ещё одним SELECT). Число обращений к БД
+не зависит от количества имён.
+
+Найденные и созданные в транзакции id сначала попадают в кэш сессии (session.info) и переносятся
+в общий кэш только после COMMIT; при ROLLBACK они отбрасываются, поэтому в общем кэше
+не оказываются id записей, которых нет в БД.
+"""
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+import on_commit
+from models import Publisher, Author
+
+_PENDING_KEY = "name_resolver_pending"
+
+
+def insert_ignore(session, table, rows: list, conflict_column: str):
+    """INSERT ... ON CONFLICT (conflict_column) DO NOTHING для PostgreSQL и SQLite; иначе обычный INSERT."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table).values(rows).on_conflict_do_nothing(index_elements=[conflict_column])
+    if dialect == "sqlite":
+        return sqlite.insert(table).values(rows).on_conflict_do_nothing(index_elements=[conflict_column])
+    return insert(table).values(rows)
+
+
+class NameResolver:
+    def __init__(self, model, column, maxsize: int = 10000):
+        self.model = model
+        self.column = column
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ---- общий LRU-кэш ----
+
+    def _cache_get(self, names) -> dict:
+        found = {}
+        with self._lock:
+            for name in names:
+                id_ = self._cache.get(name)
+                if id_ is not None:
+                    self._cache.move_to_end(name)
+                    found[name] = id_
+        return found
+
+    def _cache_put(self, mapping: dict):
+        with self._lock:
+            for name, id_ in mapping.items():
+                self._cache[name] = id_
+                self._cache.move_to_end(name)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, name: str | None = None):
+        with self._lock:
+            if name is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(name, None)
+
+    # ---- кэш транзакции ----
+
+    def _pending(self, session) -> dict:
+        return on_commit.pending(session, _PENDING_KEY, dict).setdefault(self, {})
+
+    # ---- разрешение имён ----
+
+    def resolve(self, session, names, create: bool = True) -> dict:
+        """Имя -> id для всех непустых имён; при create=True отсутствующие создаются."""
+        names = {n for n in names if n}
+        if not names:
+            return {}
+        pending = self._pending(session)
+        found = {n: pending[n] for n in names if n in pending}
+        found.update(self._cache_get(names - found.keys()))
+
+        missing = names - found.keys()
+        if missing:
+            found.update(self._select(session, missing))
+            missing = names - found.keys()
+        if missing and create:
+            table = self.model.__table__
+            key = self.column.key
+            stmt = insert_ignore(session, table, [{key: n} for n in missing], key)
+            created = session.execute(stmt.returning(table.c.id, table.c[key])).all()
+            found.update({name: id_ for id_, name in created})
+            missing = names - found.keys()
+            if missing:
+                # Имена, вставленные параллельной транзакцией между нашими SELECT и INSERT
+                found.update(self._select(session, missing))
+
+        pending.update(found)
+        return found
+
+    def resolve_one(self, session, name: str | None, create: bool = True) -> int | None:
+        if not name:
+            return None
+        return self.resolve(session, [name], create=create).get(name)
+
+    def _select(self, session, names) -> dict:
+        stmt = select(self.model.id, self.column).where(self.column.in_(names))
+        return {name: id_ for id_, name in session.execute(stmt)}
+
+
+publisher_resolver = NameResolver(Publisher, Publisher.name)
+author_resolver = NameResolver(Author, Author.full_name)
+
+
+def _promote_pending(pending: dict):
+    for resolver, mapping in pending.items():
+        resolver._cache_put(mapping)
+
+
+on_commit.register(_PENDING_KEY, _promote_pending)
@@ -0,0 +1,223 @@
+# search.py
+"""
+Поиск по каталогу: название книги, авторы, издательство. Результаты ранжируются,
+страницы — keyset по (rank, id).
+
+PostgreSQL (миграция 009):
+    books.search_vector   документ книги в конфигурации russian (стемминг): название — вес A,
+                          авторы — B, издательство — C; ведут триггеры на books, book_authors,
+                          authors, publishers; GIN-индекс
+    search_words          словарь слов каталога с GIN-индексом pg_trgm: если по запросу ничего
+                          не нашлось, неизвестные слова заменяются ближайшими по триграммам
+                          (опечатки), и поиск повторяется
+Запрос разбирает websearch_to_tsquery (слова через И, "фраза", -исключение, or), ранг — ts_rank (веса полей, поправка на длину документа).
+Страницы листают не больше SEARCH_MAX_CANDIDATES (3000) лучших по рангу совпадений: у слишком
+общего запроса страница помечается truncated — пользователю стоит уточнить запрос.
+Для текстового поиска нужна БД с UTF-8 LC_CTYPE (в локали C кириллица не приводится к нижнему регистру).
+
+Другие СУБД (SQLite в тестах): инвертированный индекс в памяти процесса, строится из БД и
+перестраивается через ref_cache после изменения таблиц каталога. Слова запроса — И, каждое
+сравнивается как префикс слов индекса (грубая замена стемминга), опечатки — difflib.
+"""
+import bisect
+import difflib
+import logging
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from sqlalchemy import Float, and_, cast, func, or_, select, text
+
+import ref_cache
+from models import Author, Book, BookAuthor, Publisher, SearchWord
+from pagination import decode_cursor, encode_cursor
+
+CONFIG = "russian"
+# Веса полей — как у ts_rank по умолчанию для весов A, B, C
+FIELD_WEIGHTS = {"title": 1.0, "author": 0.4, "publisher": 0.2}
+# Таблицы, от которых зависит индекс в памяти
+TABLES = ("books", "authors", "book_authors", "publishers")
+
+_WORD = re.compile(r"\w+")
+
+logger = logging.getLogger(__name__)
+
+
+def settings() -> dict:
+    return {"max_candidates": int(os.getenv("SEARCH_MAX_CANDIDATES", "3000"))}
+
+
+@dataclass
+class SearchPage:
+    hits: list = field(default_factory=list)  # [(book_id, rank)] по убыванию rank, затем id
+    next_cursor: str | None = None
+    corrected: str | None = None  # запрос с исправленными опечатками, если найдено по нему
+    truncated: bool = False  # совпадений больше SEARCH_MAX_CANDIDATES, ранжирована их часть
+
+
+def words(value: str) -> list:
+    return _WORD.findall(value.lower().replace("ё", "е"))
+
+
+def _after(cursor: str | None):
+    return decode_cursor(cursor, 2) if cursor else None
+
+
+# ---------- PostgreSQL ----------
+
+_trgm = {}  # engine -> установлен ли pg_trgm
+
+
+def _has_trgm(session) -> bool:
+    bind = session.get_bind(clause=select(SearchWord))
+    if bind not in _trgm:
+        _trgm[bind] = session.scalar(text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"))
+        if not _trgm[bind]:
+            logger.warning("pg_trgm не установлен: опечатки в поиске не исправляются")
+    return _trgm[bind]
+
+
+def _pg_hits(session, q: str, after, limit: int, max_candidates: int):
+    tsquery = func.websearch_to_tsquery(CONFIG, q)
+    # Нормализация 1: ранг делится на 1 + log(длины документа) — короткое точное название выше
+    # double precision: real при выводе в текст округляется, и курсор (rank, id) не совпал бы с рангом в БД
+    rank = cast(func.ts_rank(Book.search_vector, tsquery, 1), Float)
+    # Кандидаты — max_candidates лучших по рангу среди всех совпадений (GIN): ранг считается для
+    # каждого совпадения, но сортировка с LIMIT держит в памяти только top-N, и набор одинаков
+    # на всех страницах (при равном ранге — по id)
+    candidates = (
+        select(Book.id, rank.label("rank"))
+        .where(Book.search_vector.op("@@")(tsquery))
+        .order_by(rank.desc(), Book.id)
+        .limit(max_candidates)
+        .subquery()
+    )
+    stmt = select(candidates.c.id, candidates.c.rank, func.count().over().label("total"))
+    if after:
+        last_rank, last_id = after
+        stmt = stmt.where(or_(candidates.c.rank < last_rank,
+                              and_(candidates.c.rank == last_rank, candidates.c.id > last_id)))
+    rows = session.execute(stmt.order_by(candidates.c.rank.desc(), candidates.c.id).limit(limit + 1)).all()
+    truncated = bool(rows) and after is None and rows[0].total >= max_candidates
+    return [(r.id, r.rank) for r in rows], truncated
+
+
+def _pg_correct(session, q: str) -> str | None:
+    """Запрос, в котором слова не из словаря каталога заменены ближайшими по триграммам."""
+    terms = words(q)
+    if not terms or not _has_trgm(session):
+        return None
+    known = set(session.scalars(select(SearchWord.word).where(SearchWord.word.in_(terms))))
+    corrected = []
+    for term in terms:
+        if term not in known and len(term) >= 3:
+            # word % term — сходство не ниже pg_trgm.similarity_threshold (0.3), по GIN-индексу
+            term = session.scalar(
+                select(SearchWord.word).where(SearchWord.word.op("%")(term))
+                .order_by(SearchWord.word.op("<->")(term), SearchWord.word).limit(1)
+            ) or term
+        corrected.append(term)
+    return " ".join(corrected) if corrected != terms else None
+
+
+# ---------- Инвертированный индекс в памяти (другие СУБД) ----------
+
+class InvertedIndex:
+    """Слово -> {book_id: вес}; слова отсортированы для поиска по префиксу."""
+
+    def __init__(self, documents):
+        self.postings = defaultdict(dict)
+        for book_id, weight, value in documents:
+            for word in set(words(value or "")):
+                posting = self.postings[word]
+                posting[book_id] = posting.get(book_id, 0.0) + weight
+        self.vocabulary = sorted(self.postings)
+
+    def _matches(self, term: str) -> dict:
+        matched = {}
+        start = bisect.bisect_left(self.vocabulary, term)
+        for word in self.vocabulary[start:]:
+            if not word.startswith(term):
+                break
+            for book_id, weight in self.postings[word].items():
+                matched[book_id] = max(matched.get(book_id, 0.0), weight)
+        return matched
+
+    def search(self, terms: list) -> list:
+        """[(book_id, rank)] книг, где есть все слова, по убыванию rank, затем id."""
+        ranks = None
+        for term in terms:
+            matched = self._matches(term)
+            ranks = matched if ranks is None else {b: ranks[b] + w for b, w in matched.items() if b in ranks}
+            if not ranks:
+                return []
+        return sorted((ranks or {}).items(), key=lambda hit: (-hit[1], hit[0]))
+
+    def correct(self, term: str) -> str:
+        if self._matches(term):
+            return term
+        close = difflib.get_close_matches(term, self.vocabulary, n=1, cutoff=0.75)
+        return close[0] if close else term
+
+
+def _load_index(session) -> InvertedIndex:
+    weights = FIELD_WEIGHTS
+    titles = session.execute(select(Book.id, Book.title))
+    authors = session.execute(
+        select(BookAuthor.book_id, Author.full_name).join(Author, Author.id == BookAuthor.author_id)
+    )
+    publishers = session.execute(select(Book.id, Publisher.name).join(Publisher, Publisher.id == Book.publisher_id))
+    return InvertedIndex([
+        *((book_id, weights["title"], value) for book_id, value in titles),
+        *((book_id, weights["author"], value) for book_id, value in authors),
+        *((book_id, weights["publisher"], value) for book_id, value in publishers),
+    ])
+
+
+def _memory_index(session) -> InvertedIndex:
+    return ref_cache.get("search_index", TABLES, lambda: _load_index(session))
+
+
+def _memory_hits(session, q: str, after, limit: int, max_candidates: int):
+    hits = _memory_index(session).search(words(q))
+    truncated = after is None and len(hits) > max_candidates
+    hits = hits[:max_candidates]
+    if after:
+        last_rank, last_id = after
+        hits = [h for h in hits if h[1] < last_rank or (h[1] == last_rank and h[0] > last_id)]
+    return hits[:limit + 1], truncated
+
+
+def _memory_correct(session, q: str) -> str | None:
+    index = _memory_index(session)
+    terms = words(q)
+    corrected = [index.correct(term) for term in terms]
+    return " ".join(corrected) if corrected != terms else None
+
+
+# ---------- Общий вход ----------
+
+def search_books(session, q: str, cursor: str | None = None, limit: int = 20) -> SearchPage:
+    """
+    Страница результатов поиска по запросу q после cursor (CursorError при порче курсора).
+    Если на первой странице ничего не нашлось, повторяет поиск с исправленными опечатками.
+    """
+    after = _after(cursor)
+    q = (q or "").strip()
+    if not words(q):
+        return SearchPage()
+    postgres = session.get_bind(clause=select(Book)).dialect.name == "postgresql"
+    hits_for, correct = (_pg_hits, _pg_correct) if postgres else (_memory_hits, _memory_correct)
+    max_candidates = settings()["max_candidates"]
+
+    hits, truncated = hits_for(session, q, after, limit, max_candidates)
+    corrected = None
+    if not hits and after is None:
+        corrected = correct(session, q)
+        if corrected:
+            hits, truncated = hits_for(session, corrected, None, limit, max_candidates)
+    page = SearchPage(hits=hits[:limit], corrected=corrected if hits else None, truncated=truncated)
+    if len(hits) > limit:
+        page.next_cursor = encode_cursor(hits[limit - 1][1], hits[limit - 1][0])
+    return page
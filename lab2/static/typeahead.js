@@ -0,0 +1,91 @@
+// Поля выбора с подсказками: текстовое поле с data-typeahead="<url>" и data-target="<id скрытого поля>".
+// Подсказки (не больше TYPEAHEAD_LIMIT) запрашиваются по введённому префиксу и попадают в <datalist>;
+// выбранная подсказка записывает id в скрытое поле, которое и уходит с формой.
+// Одинаковые подписи (тёзки) в одном ответе различаются номером: «Иванов И.И. (№12)».
+(function () {
+  var DELAY_MS = 150;
+  var ID_SUFFIX = / \(№\d+\)$/;
+
+  function attach(input) {
+    var hidden = document.getElementById(input.dataset.target);
+    var list = document.getElementById(input.getAttribute('list'));
+    var ids = {};  // значение подсказки -> id: только последний ответ и текущий выбор
+    var timer = null;
+    var last = null;
+
+    if (input.value && hidden.value) {
+      ids[input.value] = hidden.value;
+    }
+
+    function sync() {
+      var id = ids[input.value];
+      hidden.value = id || '';
+      // Обязательное поле: текст, не совпавший ни с одной подсказкой, не отправляется
+      input.setCustomValidity(input.required && !id ? 'Выберите значение из списка' : '');
+    }
+
+    function show(items) {
+      var counts = {};
+      items.forEach(function (item) {
+        counts[item.label] = (counts[item.label] || 0) + 1;
+      });
+      // Прежние подсказки отбрасываются целиком; сделанный выбор остаётся, пока текст не изменён
+      var selected = {};
+      if (hidden.value) {
+        selected[input.value] = hidden.value;
+      }
+      ids = selected;
+      list.replaceChildren();
+      items.forEach(function (item) {
+        var value = counts[item.label] > 1 ? item.label + ' (№' + item.id + ')' : item.label;
+        if (!(value in ids)) {
+          ids[value] = String(item.id);
+        }
+        var option = document.createElement('option');
+        option.value = value;
+        option.dataset.id = String(item.id);
+        list.appendChild(option);
+      });
+      sync();
+    }
+
+    function load() {
+      // Номер тёзки — не часть названия: префикс запрашивается без него
+      var q = input.value.replace(ID_SUFFIX, '').trim();
+      if (q === last) {
+        return;
+      }
+      last = q;
+      fetch(input.dataset.typeahead + '?q=' + encodeURIComponent(q))
+        .then(function (response) {
+          if (!response.ok) {
+            throw new Error('typeahead: HTTP ' + response.status);
+          }
+          return response.json();
+        })
+        .then(function (data) {
+          if (q !== last) {
+            return;  // пока шёл запрос, пользователь ввёл другой префикс
+          }
+          show(data.items);
+        })
+        .catch(function () {
+          if (q !== last) {
+            return;
+          }
+          last = null;  // следующий ввод или фокус повторит запрос
+          show([]);
+        });
+    }
+
+    input.addEventListener('input', function () {
+      sync();
+      clearTimeout(timer);
+      timer = setTimeout(load, DELAY_MS);
+    });
+    input.addEventListener('focus', load);
+    sync();
+  }
+
+  document.querySelectorAll('input[data-typeahead]').forEach(attach);
+})();
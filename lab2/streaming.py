@@ -0,0 +1,109 @@
+# streaming.py
+"""
+Потоковая выдача списков в NDJSON (одна JSON-запись на строку) для API чтения.
+
+Строки читаются серверным курсором (yield_per: в PostgreSQL — именованный курсор psycopg2,
+FETCH по STREAM_YIELD_PER строк) и сразу уходят клиенту: память приложения не зависит от
+размера выгрузки, клиент тоже может обрабатывать ответ построчно.
+
+Кроме записей поток содержит служебные строки (ключи с подчёркиванием):
+    {"_resume": "<курсор>"}                    каждые STREAM_CHECKPOINT_ROWS записей: всё до неё отдано
+    {"_resume": "<курсор>", "_done": true}     конец выгрузки (false — достигнут limit, есть ещё)
+    {"_error": "...", "_resume": "<курсор>"}   ошибка посреди потока (статус 200 уже отправлен)
+Оборванную выгрузку продолжают запросом с ?after=<последний _resume>; записи после последней
+контрольной точки придут повторно. Порядок — по возрастанию ключа (keyset), без OFFSET.
+"""
+import json
+import logging
+import os
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Response, stream_with_context
+from sqlalchemy import tuple_
+
+from pagination import decode_cursor, encode_cursor
+
+MIMETYPE = "application/x-ndjson"
+
+logger = logging.getLogger(__name__)
+
+
+def settings() -> dict:
+    return {
+        "yield_per": int(os.getenv("STREAM_YIELD_PER", "1000")),
+        "checkpoint_rows": int(os.getenv("STREAM_CHECKPOINT_ROWS", "1000")),
+    }
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # Строкой, чтобы не терять точность денежных сумм
+        return str(value)
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def _line(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_json_default) + "\n"
+
+
+def keyset_after(stmt, key_columns: tuple, cursor: str | None):
+    """Условие «ключ больше курсора» и порядок по ключу; при порче курсора — CursorError."""
+    if cursor:
+        stmt = stmt.where(tuple_(*key_columns) > tuple_(*decode_cursor(cursor, len(key_columns))))
+    return stmt.order_by(*key_columns)
+
+
+def ndjson_rows(session_factory, stmt, key_columns: tuple, cursor: str | None = None,
+                limit: int | None = None):
+    """
+    Генератор NDJSON-фрагментов: stmt (select именованных колонок) по возрастанию key_columns
+    после cursor, не больше limit записей. Курсор проверяется до первого yield.
+    """
+    options = settings()
+    stmt = keyset_after(stmt, key_columns, cursor)
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+    key_names = [c.key for c in key_columns]
+
+    def generate():
+        last, sent = None, 0
+
+        def resume():
+            # Курсор последней отданной записи (кодируется только для служебных строк)
+            return encode_cursor(*(last[k] for k in key_names)) if last is not None else cursor
+
+        try:
+            with session_factory() as session:
+                result = session.execute(stmt.execution_options(yield_per=options["yield_per"]))
+                for rows in result.partitions():
+                    chunk = []
+                    for row in rows:
+                        if limit is not None and sent == limit:
+                            chunk.append(_line({"_resume": resume(), "_done": False}))
+                            yield "".join(chunk)
+                            return
+                        last = row._mapping
+                        chunk.append(_line(dict(last)))
+                        sent += 1
+                        if sent % options["checkpoint_rows"] == 0:
+                            chunk.append(_line({"_resume": resume()}))
+                    yield "".join(chunk)
+        except Exception as e:
+            logger.exception("Ошибка потоковой выгрузки")
+            yield _line({"_error": str(e), "_resume": resume()})
+            return
+        yield _line({"_resume": resume(), "_done": True})
+
+    return generate()
+
+
+def ndjson_response(chunks) -> Response:
+    """Ответ-поток; контекст запроса (g, реплика для чтения) доступен генератору до конца."""
+    response = Response(stream_with_context(chunks), mimetype=MIMETYPE)
+    response.headers["Cache-Control"] = "no-store"
+    # Прокси (nginx) не должен копить поток в буфере
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
@@ -2,10 +2,19 @@
 Pytest configuration and fixtures for testing Flask application
 """
 import os
+from contextlib import contextmanager
+
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+# Импорт app не должен выполнять DDL и демо-наполнение: таблицы создаёт фикстура test_session
+os.environ.setdefault("DB_BOOTSTRAP", "off")
+# Сводку выдач тесты обновляют явно: фоновый поток писал бы в таблицы, которые фикстуры пересоздают
+os.environ.setdefault("CIRCULATION_REFRESH_INTERVAL", "0")
+# Проверка секций журналов на первом запросе не должна попадать в бюджеты запросов тестов
+os.environ.setdefault("PARTITION_CHECK_INTERVAL", "0")
+
 # Используем тестовую БД (можно использовать SQLite для тестов)
 TEST_DATABASE_URL = os.getenv(
     "TEST_DATABASE_URL",
@@ -40,22 +49,33 @@ def test_session(test_engine):
     # Очищаем после теста
     session.rollback()
     session.close()
+    # Фоновый писатель журнала событий должен закончить запись до удаления таблиц
+    import event_sink
+    event_sink.flush()
     # Очищаем таблицы
     Base.metadata.drop_all(test_engine)
 
+@pytest.fixture(autouse=True)
+def reset_caches():
+    """Сбрасывает кэши уровня процесса: таблицы пересоздаются в каждом тесте"""
+    yield
+    from resolvers import publisher_resolver, author_resolver
+    import ref_cache
+    import user_cache
+    publisher_resolver.invalidate()
+    author_resolver.invalidate()
+    ref_cache.clear()
+    user_cache.invalidate()
+
 @pytest.fixture
-def app(test_engine):
+def app(test_engine, test_session):
     """Создает тестовое Flask приложение"""
-    # Импортируем после создания engine, чтобы избежать циклических импортов
-    import sys
-    import importlib
-    
-    # Перезагружаем модуль app для использования тестовой БД
-    if 'app' in sys.modules:
-        importlib.reload(sys.modules['app'])
-    
-    from app import app as flask_app
-    from app import SessionLocal
+    # Схему создаёт test_session: импорт и create_app() DDL не выполняют (DB_BOOTSTRAP=off),
+    # и тестам только с client таблицы нужны так же, как тестам с test_session
+    # Приложение собирается фабрикой: модуль app не перезагружается, иначе классы
+    # (BorrowError и др.), импортированные другими тестами, перестают совпадать
+    from app import create_app
+    flask_app = create_app()
     
     # Создаем тестовую сессию
     TestSessionLocal = sessionmaker(bind=test_engine, autoflush=False, future=True)
@@ -106,3 +126,22 @@ def sample_branch_data():
         "address": "Test Address 123"
     }
 
+@pytest.fixture
+def query_budget():
+    """
+    Бюджет SQL-запросов: тест падает, если код внутри блока выполнил больше max_queries операторов.
+
+        with query_budget(3):
+            client.get('/inventories')
+    """
+    from query_stats import count_queries
+
+    @contextmanager
+    def _budget(max_queries: int):
+        with count_queries() as stats:
+            yield stats
+        if stats.count > max_queries:
+            statements = "\n".join(f"  {i}. {s}" for i, s in enumerate(stats.statements, 1))
+            pytest.fail(f"Превышен бюджет запросов: {stats.count} > {max_queries}\n{statements}", pytrace=False)
+
+    return _budget
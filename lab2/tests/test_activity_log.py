@@ -0,0 +1,85 @@
+"""
+Тесты аудита действий пользователей (activity_log)
+"""
+import json
+
+import pytest
+
+import event_sink
+from activity_log import Sampler, _parse_rates, _resource
+from models import User, UserActivityLog
+
+
+@pytest.fixture
+def audited(request, monkeypatch, test_session):
+    """Клиент приложения с аудитом: чтения не пишутся, изменения пишутся всегда; вошедший пользователь"""
+    monkeypatch.setenv("ACTIVITY_SAMPLE_READ", "0")
+    monkeypatch.setenv("ACTIVITY_SAMPLE_WRITE", "1")
+    monkeypatch.setenv("ACTIVITY_SAMPLE_RATES", "book_detail=1")
+    client = request.getfixturevalue("client")
+    user = User(username="auditor", email="auditor@example.com", password_hash="x")
+    test_session.add(user)
+    test_session.commit()
+    return client, user
+
+
+def _login(client, user):
+    with client.session_transaction() as http_session:
+        http_session["_user_id"] = str(user.id)
+        http_session["_fresh"] = True
+
+
+def _activity(session):
+    event_sink.flush()
+    return session.query(UserActivityLog).order_by(UserActivityLog.id).all()
+
+
+class TestSampler:
+    """Доли выборки"""
+
+    def test_read_write_and_overrides(self):
+        """Тест: чтения и изменения по методу, переопределение по действию"""
+        sampler = Sampler(read=0.1, write=1.0, overrides=_parse_rates("books_list=0.01, login=1"))
+        assert sampler.rate("book_detail", "GET") == 0.1
+        assert sampler.rate("borrow", "POST") == 1.0
+        assert sampler.rate("books_list", "GET") == 0.01
+        assert sampler.rate("login", "GET") == 1
+
+    def test_resource_from_path(self):
+        """Тест: ресурс — последний параметр пути *_id"""
+        assert _resource({"branch_id": 1, "book_id": 7}) == ("book", 7)
+        assert _resource({}) == (None, None)
+        assert _resource(None) == (None, None)
+
+
+class TestMiddleware:
+    """Запись действий после запросов"""
+
+    def test_records_user_action_and_resource(self, audited, test_session):
+        """Тест: запись содержит пользователя, действие, ресурс, IP и User-Agent"""
+        client, user = audited
+        _login(client, user)
+        client.get('/books/99999', headers={"User-Agent": "pytest-agent"})
+
+        [row] = _activity(test_session)
+        assert row.user_id == user.id
+        assert row.action == "book_detail"
+        assert (row.resource_type, row.resource_id) == ("book", 99999)
+        assert row.ip_address == "127.0.0.1"
+        assert row.user_agent == "pytest-agent"
+        assert json.loads(row.additional_data) == {"method": "GET", "status": 404, "sample_rate": 1.0}
+
+    def test_sampled_reads_and_kept_writes(self, audited, test_session):
+        """Тест: чтения с долей 0 не пишутся, изменения пишутся"""
+        client, user = audited
+        _login(client, user)
+        client.get('/login')
+        client.post('/return/99999')
+
+        assert [row.action for row in _activity(test_session)] == ["do_return"]
+
+    def test_anonymous_not_recorded(self, audited, test_session):
+        """Тест: запросы без входа не записываются (user_id обязателен)"""
+        client, _ = audited
+        client.get('/books/99999')
+        assert _activity(test_session) == []
@@ -0,0 +1,51 @@
+"""
+Тесты фабрики приложения и сброса пула соединений после fork
+"""
+import os
+
+import pytest
+
+from app import create_app
+
+
+@pytest.fixture
+def factory_app():
+    """Приложение из фабрики без перезагрузки модуля app и без обращения к БД"""
+    return create_app("off")
+
+
+class TestCreateApp:
+    """Тесты create_app()"""
+
+    def test_registers_routes_and_commands(self, factory_app):
+        """Тест: роуты и CLI-команды подключаются с прежними именами endpoint"""
+        endpoints = {rule.endpoint for rule in factory_app.url_map.iter_rules()}
+        assert {"index", "books_list", "book_form", "borrow", "events", "debug_queries"} <= endpoints
+        assert {"init-db", "check-db", "import-catalog", "check-inventory"} <= set(factory_app.cli.commands)
+
+    def test_independent_instances(self, factory_app):
+        """Тест: каждый вызов фабрики создаёт отдельное приложение"""
+        other = create_app("off")
+        assert other is not factory_app
+        assert other.url_map.bind("localhost").match("/books") == ("books_list", {})
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="нужен os.fork")
+class TestForkSafety:
+    """Пул соединений не разделяется между мастером и воркерами"""
+
+    def test_child_gets_fresh_pool(self):
+        """Тест: после fork у потомка новый пул"""
+        import app as app_module
+        parent_pool = id(app_module.engine.pool)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            os.write(write_fd, b"1" if id(app_module.engine.pool) != parent_pool else b"0")
+            os._exit(0)
+        os.close(write_fd)
+        result = os.read(read_fd, 1)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+        assert result == b"1"
@@ -0,0 +1,75 @@
+"""
+Тесты режимов запуска (DB_BOOTSTRAP) и проверки ревизии схемы
+"""
+import pytest
+from sqlalchemy import text
+
+from db_bootstrap import alembic_head, bootstrap, check_db, SchemaNotReady
+from query_stats import count_queries
+
+
+@pytest.fixture
+def alembic_version(test_engine):
+    """Таблица lib.alembic_version с ревизией head"""
+    with test_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE lib.alembic_version (version_num VARCHAR(32) NOT NULL)"))
+        conn.execute(text("INSERT INTO lib.alembic_version VALUES (:v)"), {"v": alembic_head()})
+    yield
+    with test_engine.begin() as conn:
+        conn.execute(text("DROP TABLE lib.alembic_version"))
+
+
+class TestBootstrap:
+    """Тесты bootstrap/check_db"""
+
+    def test_alembic_head_matches_alembic(self):
+        """Тест: head по файлам совпадает с head, который вычисляет сам Alembic"""
+        from alembic.script import ScriptDirectory
+        from db_bootstrap import _alembic_config
+        assert alembic_head() == ScriptDirectory.from_config(_alembic_config()).get_current_head()
+
+    def test_check_passes_with_single_query(self, test_session, test_engine, alembic_version):
+        """Тест: режим check — одна проверка ревизии и никакого DDL"""
+        with count_queries() as stats:
+            bootstrap(test_engine, "check")
+        assert stats.count == 1
+
+    def test_check_fails_on_old_revision(self, test_session, test_engine, alembic_version):
+        """Тест: устаревшая ревизия — SchemaNotReady"""
+        with pytest.raises(SchemaNotReady):
+            check_db(test_engine, expected="999_future")
+
+    def test_check_fails_without_schema(self, test_session, test_engine):
+        """Тест: нет таблицы alembic_version — SchemaNotReady"""
+        with pytest.raises(SchemaNotReady):
+            check_db(test_engine)
+
+    def test_auto_migrates_before_seeding(self, test_engine, monkeypatch):
+        """Тест: режим auto — create_all, миграции до head и только затем демо-данные"""
+        import db_bootstrap
+        calls = []
+        for step in ("_create_tables", "upgrade_schema", "_seed_demo"):
+            monkeypatch.setattr(db_bootstrap, step, lambda engine, step=step: calls.append((step, engine)))
+        bootstrap(test_engine, "auto")
+        assert calls == [("_create_tables", test_engine), ("upgrade_schema", test_engine),
+                         ("_seed_demo", test_engine)]
+
+    def test_init_db_without_demo_still_migrates(self, test_engine, monkeypatch):
+        """Тест: init-db без --demo доводит схему до head и не наполняет её"""
+        import db_bootstrap
+        calls = []
+        for step in ("_create_tables", "upgrade_schema", "_seed_demo"):
+            monkeypatch.setattr(db_bootstrap, step, lambda engine, step=step: calls.append(step))
+        db_bootstrap.init_db(test_engine, with_demo=False)
+        assert calls == ["_create_tables", "upgrade_schema"]
+
+    def test_off_does_not_touch_db(self, test_engine):
+        """Тест: режим off не выполняет запросов"""
+        with count_queries() as stats:
+            bootstrap(test_engine, "off")
+        assert stats.count == 0
+
+    def test_unknown_mode(self, test_engine):
+        """Тест: неизвестный режим — ValueError"""
+        with pytest.raises(ValueError):
+            bootstrap(test_engine, "fast")
@@ -0,0 +1,80 @@
+"""
+Тесты потокового импорта каталога
+"""
+import io
+import json
+
+from sqlalchemy.orm import sessionmaker
+
+from models import Book, Author, Publisher, BookAuthor
+from catalog_import import import_catalog, parse_record
+
+
+CSV_DATA = (
+    "title,publisher,year,pages,illustrations,price,authors\n"
+    "Book A,Pub 1,2001,100,0,10.50,\"Author 1, Author 2\"\n"
+    "Book B,Pub 1,2002,200,5,,Author 2\n"
+    "Book C,,1200,10,0,1,Author 3\n"
+)
+
+
+class TestParseRecord:
+    """Тесты нормализации записи"""
+
+    def test_authors_string_is_split_and_deduplicated(self):
+        """Тест: авторы через запятую, без повторов"""
+        record = parse_record({"title": " T ", "authors": "A, B, A"})
+        assert record["title"] == "T"
+        assert record["authors"] == ["A", "B"]
+
+    def test_invalid_rows_are_rejected(self):
+        """Тест: строки, нарушающие ограничения таблицы, отбрасываются"""
+        assert parse_record({"title": ""}) is None
+        assert parse_record({"title": "T", "year": "1200"}) is None
+        assert parse_record({"title": "T", "pages": "abc"}) is None
+        assert parse_record(None) is None
+
+    def test_non_string_fields_are_rejected(self):
+        """Тест: число, список или объект вместо строки в NDJSON — строка отклоняется, а не падает"""
+        assert parse_record({"title": 42}) is None
+        assert parse_record({"title": ["T"]}) is None
+        assert parse_record({"title": "T", "publisher": {"name": "P"}}) is None
+        assert parse_record({"title": "T", "authors": 7}) is None
+        assert parse_record({"title": "T", "authors": {"A": 1}}) is None
+
+
+class TestImportCatalog:
+    """Тесты импорта в БД"""
+
+    def test_non_string_title_counted_as_skipped(self, test_engine, test_session):
+        """Тест: строка NDJSON с числовым названием пропускается, остальные импортируются"""
+        factory = sessionmaker(bind=test_engine, future=True)
+        lines = [json.dumps({"title": 123, "authors": ["Author 1"]}),
+                 json.dumps({"title": "Book", "publisher": "Pub", "authors": ["Author 1"]})]
+        stats = import_catalog(factory, io.StringIO("\n".join(lines) + "\n"), "ndjson")
+        assert (stats.rows, stats.books, stats.skipped) == (2, 1, 1)
+        assert test_session.query(Book).one().title == "Book"
+
+    def test_import_csv_in_chunks(self, test_engine, test_session):
+        """Тест: импорт CSV чанками создаёт книги, издательства и авторов без дублей"""
+        factory = sessionmaker(bind=test_engine, future=True)
+        progress = []
+        stats = import_catalog(factory, io.StringIO(CSV_DATA), "csv", chunk_size=2, progress=progress.append)
+
+        assert (stats.rows, stats.books, stats.skipped) == (3, 2, 1)
+        assert len(progress) == 2
+        assert test_session.query(Book).count() == 2
+        assert test_session.query(Publisher).count() == 1
+        assert test_session.query(Author).count() == 2
+        assert test_session.query(BookAuthor).count() == 3
+
+    def test_import_ndjson_reuses_existing_authors(self, test_engine, test_session):
+        """Тест: повторный импорт переиспользует существующих авторов"""
+        factory = sessionmaker(bind=test_engine, future=True)
+        line = json.dumps({"title": "Book", "publisher": "Pub", "authors": ["Author 1"]})
+        import_catalog(factory, io.StringIO(line + "\n"), "ndjson")
+        import_catalog(factory, io.StringIO(line + "\nnot json\n"), "ndjson")
+
+        assert test_session.query(Book).count() == 2
+        assert test_session.query(Author).count() == 1
+        assert test_session.query(Publisher).count() == 1
@@ -0,0 +1,146 @@
+"""
+Тесты инкрементальной сводки выдач (circulation.py) и панели /dashboard
+"""
+import re
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import circulation
+from models import Book, Borrow, Branch, CirculationDaily, Faculty, RollupState, Student
+
+NOW = datetime(2024, 3, 10, 12, 0)
+
+
+@pytest.fixture
+def library(test_session):
+    physics, history = Faculty(name="Физический"), Faculty(name="Исторический")
+    main, second = Branch(name="Главный", address="-"), Branch(name="Второй", address="-")
+    books = [Book(title=f"Книга {i}", year=2020) for i in range(3)]
+    test_session.add_all([physics, history, main, second, *books])
+    test_session.flush()
+    students = [Student(full_name="Физик", faculty_id=physics.id), Student(full_name="Историк", faculty_id=history.id)]
+    test_session.add_all(students)
+    test_session.commit()
+    return {"students": students, "branches": [main, second], "books": books}
+
+
+def _borrow(session, library, student, book, branch, borrowed_at, returned_at=None) -> Borrow:
+    borrow = Borrow(student_id=library["students"][student].id, book_id=library["books"][book].id,
+                    branch_id=library["branches"][branch].id, borrowed_at=borrowed_at, returned_at=returned_at)
+    session.add(borrow)
+    session.commit()
+    return borrow
+
+
+def _rollup(session) -> dict:
+    return {
+        (r.day, r.book_id, r.branch_id, r.faculty_id): (r.borrows, r.returns, r.loan_seconds)
+        for r in session.query(CirculationDaily)
+    }
+
+
+def _rebuilt(session, returned_until: datetime, last_id: int) -> dict:
+    """Та же сводка, посчитанная по lib.borrows целиком (эталон для инкрементальной)."""
+    expected = defaultdict(lambda: [0, 0, 0])
+    for b, faculty_id in session.query(Borrow, Student.faculty_id).join(Student, Student.id == Borrow.student_id):
+        if b.id > last_id:
+            continue
+        expected[(b.borrowed_at.date(), b.book_id, b.branch_id, faculty_id)][0] += 1
+        if b.returned_at and b.returned_at <= returned_until:
+            key = (b.returned_at.date(), b.book_id, b.branch_id, faculty_id)
+            expected[key][1] += 1
+            expected[key][2] += int((b.returned_at - b.borrowed_at).total_seconds())
+    return {key: tuple(value) for key, value in expected.items()}
+
+
+class TestRefresh:
+    """circulation.refresh на SQLite"""
+
+    def test_first_refresh_counts_settled_rows(self, test_session, library):
+        """Тест: выдачи по дню borrowed_at, возвраты и срок — по дню returned_at"""
+        _borrow(test_session, library, 0, 0, 0, datetime(2024, 3, 1, 10), datetime(2024, 3, 3, 10))
+        _borrow(test_session, library, 0, 0, 0, datetime(2024, 3, 1, 15))
+        _borrow(test_session, library, 1, 1, 1, datetime(2024, 3, 2, 9))
+        report = circulation.refresh(test_session, NOW)
+        test_session.commit()
+
+        rows = _rollup(test_session)
+        book0, main = library["books"][0].id, library["branches"][0].id
+        physics = library["students"][0].faculty_id
+        assert rows[(date(2024, 3, 1), book0, main, physics)] == (2, 0, 0)
+        assert rows[(date(2024, 3, 3), book0, main, physics)] == (0, 1, 2 * 86400)
+        assert report.rows == 3
+        assert test_session.get(RollupState, circulation.NAME).last_borrow_id == report.last_borrow_id
+
+    def test_incremental_matches_full_rebuild(self, test_session, library):
+        """Тест: после новых выдач и возвратов сводка совпадает с пересчётом с нуля, без двойного учёта"""
+        first = _borrow(test_session, library, 0, 0, 0, datetime(2024, 3, 1, 10))
+        _borrow(test_session, library, 1, 2, 1, datetime(2024, 3, 2, 10), datetime(2024, 3, 4, 10))
+        circulation.refresh(test_session, NOW)
+        test_session.commit()
+
+        first.returned_at = datetime(2024, 3, 11, 9)
+        _borrow(test_session, library, 1, 0, 0, datetime(2024, 3, 11, 8))
+        # Историческая выдача, добавленная задним числом уже возвращённой
+        _borrow(test_session, library, 0, 1, 1, datetime(2024, 2, 1, 10), datetime(2024, 2, 10, 10))
+        later = NOW + timedelta(days=1)
+        report = circulation.refresh(test_session, later)
+        test_session.commit()
+        circulation.refresh(test_session, later)
+        test_session.commit()
+
+        assert _rollup(test_session) == _rebuilt(test_session, report.last_returned_at, report.last_borrow_id)
+
+    def test_recent_rows_wait_for_settle_window(self, test_session, library, monkeypatch):
+        """Тест: выдача моложе окна не учитывается, и отметка id не перескакивает через неё"""
+        monkeypatch.setenv("CIRCULATION_SETTLE_SECONDS", "60")
+        recent = _borrow(test_session, library, 0, 0, 0, NOW - timedelta(seconds=10))
+        _borrow(test_session, library, 1, 1, 1, datetime(2024, 3, 1, 10))
+        report = circulation.refresh(test_session, NOW)
+        test_session.commit()
+        assert report.last_borrow_id == recent.id - 1
+        assert _rollup(test_session) == {}
+
+        report = circulation.refresh(test_session, NOW + timedelta(minutes=2))
+        test_session.commit()
+        assert sum(borrows for borrows, _, _ in _rollup(test_session).values()) == 2
+        assert report.last_borrow_id == recent.id + 1
+
+    def test_refresh_without_changes_is_noop(self, test_session, library):
+        """Тест: повторное обновление без новых строк ничего не пишет"""
+        _borrow(test_session, library, 0, 0, 0, datetime(2024, 3, 1, 10), datetime(2024, 3, 2, 10))
+        circulation.refresh(test_session, NOW)
+        test_session.commit()
+        before = _rollup(test_session)
+        assert circulation.refresh(test_session, NOW).rows == 0
+        test_session.commit()
+        assert _rollup(test_session) == before
+
+
+class TestDashboard:
+    """GET /dashboard"""
+
+    def test_answers_from_rollups_only(self, client, test_session, library, query_budget):
+        """Тест: панель строится из сводки, lib.borrows не читается"""
+        today = datetime.utcnow().replace(microsecond=0) - timedelta(days=3)
+        _borrow(test_session, library, 0, 2, 0, today, today + timedelta(days=1, hours=12))
+        _borrow(test_session, library, 0, 2, 1, today)
+        _borrow(test_session, library, 1, 1, 0, today)
+        circulation.refresh(test_session)
+        test_session.commit()
+
+        with query_budget(4) as stats:
+            response = client.get('/dashboard?days=7')
+        assert response.status_code == 200
+        assert not any(re.search(r"\blib\.borrows\b", s) for s in stats.statements)
+        html = response.get_data(as_text=True)
+        assert "Книга 2" in html
+        assert "1.5" in html  # средний срок в днях
+
+    def test_empty_rollup(self, client, test_session):
+        """Тест: панель без сводки подсказывает, как её построить"""
+        response = client.get('/dashboard')
+        assert response.status_code == 200
+        assert "refresh-circulation" in response.get_data(as_text=True)
@@ -0,0 +1,108 @@
+"""
+Нагрузочный тест атомарной выдачи (reserve_copy) при конкурентных запросах.
+
+Требует PostgreSQL: задайте TEST_DATABASE_URL=postgresql+psycopg2://...
+Запуск: pytest tests/test_concurrency.py -m integration -s
+"""
+import os
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Book, Branch, Faculty, Student, Inventory, Borrow
+from app import borrow_book, BorrowError
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "")
+
+THREADS = 16
+ATTEMPTS_PER_THREAD = 150
+COPIES = 2000  # меньше, чем THREADS * ATTEMPTS_PER_THREAD: часть попыток обязана получить отказ
+
+pytestmark = [
+    pytest.mark.integration,
+    pytest.mark.slow,
+    pytest.mark.skipif(
+        not TEST_DATABASE_URL.startswith("postgresql"),
+        reason="нужен PostgreSQL (TEST_DATABASE_URL)",
+    ),
+]
+
+
+@pytest.fixture
+def pg_engine():
+    """Отдельный engine с пулом на все потоки теста"""
+    engine = create_engine(TEST_DATABASE_URL, future=True, pool_size=THREADS, max_overflow=0)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE SCHEMA IF NOT EXISTS lib;")
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+class TestConcurrentBorrow:
+    """Конкурентные выдачи одной книги в одном филиале"""
+
+    def test_no_overselling_under_concurrency(self, pg_engine):
+        """Тест: при параллельных выдачах выдаётся ровно copies_total экземпляров"""
+        Session = sessionmaker(bind=pg_engine, autoflush=False, future=True)
+        with Session() as session:
+            book = Book(title="Stress Book", year=2020)
+            branch = Branch(name="Stress Branch", address="Test Address")
+            faculty = Faculty(name="Stress Faculty")
+            session.add_all([book, branch, faculty])
+            session.flush()
+            student = Student(full_name="Stress Student", faculty_id=faculty.id)
+            session.add(student)
+            session.add(Inventory(book_id=book.id, branch_id=branch.id, copies_total=COPIES))
+            session.commit()
+            ids = (student.id, book.id, branch.id)
+
+        results = {"ok": 0, "rejected": 0, "errors": []}
+        lock = threading.Lock()
+        start = threading.Barrier(THREADS)
+
+        def worker():
+            ok = rejected = 0
+            start.wait()
+            for _ in range(ATTEMPTS_PER_THREAD):
+                with Session() as session:
+                    try:
+                        borrow_book(session, *ids)
+                        session.commit()
+                        ok += 1
+                    except BorrowError:
+                        session.rollback()
+                        rejected += 1
+                    except Exception as e:  # любая другая ошибка — провал теста
+                        session.rollback()
+                        with lock:
+                            results["errors"].append(repr(e))
+            with lock:
+                results["ok"] += ok
+                results["rejected"] += rejected
+
+        threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+        attempts = THREADS * ATTEMPTS_PER_THREAD
+        print(
+            f"\n{THREADS} потоков, {attempts} попыток за {elapsed:.2f} с: "
+            f"{results['ok'] / elapsed:.0f} выдач/с, {attempts / elapsed:.0f} попыток/с"
+        )
+
+        assert results["errors"] == []
+        assert results["ok"] == COPIES
+        assert results["rejected"] == attempts - COPIES
+        with Session() as session:
+            assert session.query(Borrow).count() == COPIES
+            inv = session.query(Inventory).one()
+            assert inv.active_count == COPIES
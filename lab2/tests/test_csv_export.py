@@ -0,0 +1,143 @@
+"""
+Тесты CSV-выгрузок для отчётов
+"""
+import csv
+import gzip
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+from werkzeug.datastructures import MultiDict
+
+from models import Book, Borrow, Branch, Faculty, Inventory, Student
+from csv_export import export_chunks, write_export
+
+
+def _rows(data: bytes) -> list:
+    return list(csv.reader(io.StringIO(data.decode("utf-8"))))
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """Фрагменты по 64 байта: выгрузка из многих фрагментов"""
+    monkeypatch.setenv("EXPORT_CHUNK_BYTES", "64")
+
+
+@pytest.fixture
+def borrows(test_session):
+    faculty = Faculty(name="Export Faculty")
+    branch = Branch(name="Export, Branch", address="-")
+    book = Book(title='Книга "в кавычках"', year=2020)
+    test_session.add_all([faculty, branch, book])
+    test_session.flush()
+    student = Student(full_name="Export Student", faculty_id=faculty.id)
+    test_session.add(student)
+    test_session.flush()
+    start = datetime(2024, 3, 1, 10, 30)
+    for i in range(6):
+        test_session.add(Borrow(student_id=student.id, book_id=book.id, branch_id=branch.id,
+                                borrowed_at=start + timedelta(days=i),
+                                returned_at=start + timedelta(days=i + 7) if i % 2 else None))
+    test_session.add(Inventory(book_id=book.id, branch_id=branch.id, copies_total=5, active_count=3))
+    test_session.commit()
+    return book.id
+
+
+class TestExportRoutes:
+    """GET /export/<имя>.csv"""
+
+    def test_borrows_csv(self, client, borrows, small_chunks):
+        """Тест: заголовок, строки по borrowed_at, экранирование запятых и кавычек, NULL — пусто"""
+        response = client.get(f'/export/borrows.csv?book_id={borrows}')
+        assert response.status_code == 200
+        assert response.mimetype == "text/csv"
+        assert "attachment" in response.headers["Content-Disposition"]
+        rows = _rows(response.get_data())
+        assert rows[0] == ["id", "student_id", "student", "book_id", "book", "branch_id", "branch",
+                           "borrowed_at", "returned_at"]
+        assert len(rows) == 7
+        assert rows[1][4] == 'Книга "в кавычках"'
+        assert rows[1][6] == "Export, Branch"
+        assert rows[1][7] == "2024-03-01 10:30:00"
+        assert [r[8] == "" for r in rows[1:]] == [True, False] * 3
+
+    def test_filters_and_gzip(self, client, borrows):
+        """Тест: фильтр active и сжатый поток"""
+        response = client.get(f'/export/borrows.csv?book_id={borrows}&active=1&gzip=1')
+        assert response.mimetype == "application/gzip"
+        assert response.headers["Content-Disposition"].endswith('.csv.gz"')
+        rows = _rows(gzip.decompress(response.get_data()))
+        assert len(rows) == 4
+
+    def test_inventory_availability(self, client, borrows):
+        """Тест: инвентарь с вычисляемой доступностью"""
+        rows = _rows(client.get(f'/export/inventory.csv?book_id={borrows}').get_data())
+        assert rows[0][-1] == "available"
+        assert [r[-3:] for r in rows[1:]] == [["5", "3", "2"]]
+
+    def test_unknown_export(self, client):
+        """Тест: неизвестная выгрузка — 404"""
+        assert client.get('/export/users.csv').status_code == 404
+
+
+class TestExportChunks:
+    """export_chunks / write_export"""
+
+    def test_bounded_chunks(self, test_session, borrows, small_chunks):
+        """Тест: фрагменты не больше EXPORT_CHUNK_BYTES с запасом в одну строку"""
+        import app as app_module
+        factory = sessionmaker(bind=test_session.get_bind())
+        chunks = list(export_chunks(factory, app_module.EXPORTS["borrows"](MultiDict({"book_id": borrows}))))
+        assert len(chunks) > 1
+        assert all(len(chunk) < 64 + 200 for chunk in chunks)
+
+    def test_copy_matches_cursor(self, test_session, borrows):
+        """Тест: COPY и серверный курсор дают байт в байт одинаковый CSV (только PostgreSQL)"""
+        if test_session.get_bind().dialect.name != "postgresql":
+            pytest.skip("COPY TO STDOUT — только PostgreSQL")
+        import app as app_module
+        factory = sessionmaker(bind=test_session.get_bind())
+        for name in ("borrows", "inventory"):
+            stmt = app_module.EXPORTS[name](MultiDict({"book_id": borrows}))
+            copied = b"".join(export_chunks(factory, stmt, method="copy"))
+            fetched = b"".join(export_chunks(factory, stmt, method="cursor"))
+            assert copied == fetched
+
+    def test_early_close_releases_connection(self, test_session, borrows, small_chunks):
+        """Тест: брошенная выгрузка останавливается, соединение снова пригодно"""
+        import app as app_module
+        factory = sessionmaker(bind=test_session.get_bind())
+        chunks = export_chunks(factory, app_module.EXPORTS["borrows"](MultiDict()))
+        next(chunks)
+        chunks.close()
+        with factory() as session:
+            assert session.query(Borrow).filter_by(book_id=borrows).count() == 6
+
+    def test_write_export_gzip(self, test_session, borrows):
+        """Тест: write_export считает байты CSV и сжатые байты"""
+        import app as app_module
+        factory = sessionmaker(bind=test_session.get_bind())
+        out = io.BytesIO()
+        stmt = app_module.EXPORTS["borrows"](MultiDict({"book_id": borrows}))
+        stats = write_export(factory, stmt, out, gzip=True)
+        assert stats.written == len(out.getvalue())
+        assert stats.bytes == len(gzip.decompress(out.getvalue()))
+
+
+class TestExportCommand:
+    """flask export-csv"""
+
+    def test_cli_export(self, app, borrows, tmp_path):
+        """Тест: фильтры --filter и сжатие по расширению .gz"""
+        path = tmp_path / "borrows.csv.gz"
+        result = app.test_cli_runner().invoke(
+            args=["export-csv", "borrows", "-o", str(path), "--filter", f"book_id={borrows}", "--filter", "active=1"]
+        )
+        assert result.exit_code == 0, result.output
+        assert len(_rows(gzip.decompress(path.read_bytes()))) == 4
+
+    def test_cli_bad_filter(self, app):
+        """Тест: фильтр без «=» — ошибка параметра"""
+        result = app.test_cli_runner().invoke(args=["export-csv", "borrows", "-o", "-", "--filter", "book_id"])
+        assert result.exit_code != 0
@@ -0,0 +1,107 @@
+"""
+Тесты настраиваемого пула соединений и его статистики (db_pool)
+"""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from db_pool import Histogram, create_engine_from_env, instrument, pool_settings, pool_stats
+
+
+@pytest.fixture
+def small_pool_engine(tmp_path):
+    """Engine с пулом из одного соединения и коротким таймаутом"""
+    engine = instrument(create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=QueuePool,
+                                      pool_size=1, max_overflow=0, pool_timeout=0.1))
+    yield engine
+    engine.dispose()
+
+
+class TestPoolSettings:
+    """Параметры пула из окружения"""
+
+    def test_defaults(self, monkeypatch):
+        """Тест: значения по умолчанию"""
+        for name in ("DB_POOL_SIZE", "DB_MAX_OVERFLOW", "DB_POOL_PRE_PING", "DB_STATEMENT_TIMEOUT_MS"):
+            monkeypatch.delenv(name, raising=False)
+        settings = pool_settings()
+        assert settings["pool_size"] == 5
+        assert settings["max_overflow"] == 10
+        assert settings["pool_pre_ping"] is True
+        assert settings["statement_timeout_ms"] == 0
+
+    def test_from_env(self, monkeypatch):
+        """Тест: параметры пула задаются переменными окружения"""
+        monkeypatch.setenv("DB_POOL_SIZE", "2")
+        monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+        monkeypatch.setenv("DB_POOL_PRE_PING", "0")
+        engine = create_engine_from_env("postgresql+psycopg2://u:p@localhost/db")
+        assert type(engine.pool) is QueuePool
+        assert engine.pool.size() == 2
+        assert engine.pool._pre_ping is False
+
+
+class TestPoolStats:
+    """Статистика пула по событиям QueuePool"""
+
+    def test_checkout_wait_and_hold(self, small_pool_engine):
+        """Тест: выдачи, ожидание и удержание соединения учитываются"""
+        for _ in range(3):
+            with small_pool_engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        stats = pool_stats(small_pool_engine)
+        assert stats["checkouts"] == 3
+        assert stats["connects"] == 1
+        assert stats["wait"]["count"] == 3
+        assert stats["hold"]["count"] == 3
+        assert stats["checked_out"] == 0
+
+    def test_timeout_counted(self, small_pool_engine):
+        """Тест: исчерпание пула — таймаут в статистике"""
+        with small_pool_engine.connect():
+            assert pool_stats(small_pool_engine)["checked_out"] == 1
+            with pytest.raises(PoolTimeoutError):
+                small_pool_engine.connect()
+        assert pool_stats(small_pool_engine)["timeouts"] == 1
+
+    def test_overflow_checkout_counted_once(self, tmp_path):
+        """Тест: выдача через overflow учитывается один раз"""
+        engine = instrument(create_engine(f"sqlite:///{tmp_path / 'overflow.db'}", poolclass=QueuePool,
+                                          pool_size=1, max_overflow=2, pool_timeout=0.1))
+        with engine.connect(), engine.connect(), engine.connect():
+            stats = pool_stats(engine)
+            assert stats["checked_out"] == 3
+            assert stats["overflow"] == 2
+        stats = pool_stats(engine)
+        assert stats["checkouts"] == 3
+        assert stats["wait"]["count"] == 3
+        assert stats["hold"]["count"] == 3
+        assert stats["connects"] == 3
+        engine.dispose()
+
+    def test_instrument_is_idempotent(self, small_pool_engine):
+        """Тест: повторное подключение статистики не удваивает счётчики"""
+        instrument(small_pool_engine)
+        with small_pool_engine.connect():
+            pass
+        assert pool_stats(small_pool_engine)["checkouts"] == 1
+
+    def test_dispose_resets_stats(self, small_pool_engine):
+        """Тест: после dispose (как после fork) статистика нового пула пустая"""
+        with small_pool_engine.connect():
+            pass
+        small_pool_engine.dispose(close=False)
+        assert pool_stats(small_pool_engine)["checkouts"] == 0
+
+
+class TestHistogram:
+    """Гистограмма времени"""
+
+    def test_buckets(self):
+        """Тест: значение попадает в корзину с ближайшей верхней границей"""
+        hist = Histogram(bounds=(1, 10))
+        for ms in (0.5, 1, 5, 50):
+            hist.observe(ms)
+        assert hist.as_dict()["buckets"] == {"le_1": 2, "le_10": 1, "inf": 1}
+        assert hist.as_dict()["count"] == 4
@@ -0,0 +1,126 @@
+"""
+Тесты фонового писателя журнала событий (event_sink)
+"""
+from datetime import datetime
+
+import pytest
+
+import event_sink
+from app import BorrowError, borrow_book, log_event
+from models import Book, Branch, EventLog
+
+
+def _row(event):
+    return {"event": event, "details": None, "created_at": datetime.utcnow()}
+
+
+@pytest.fixture
+def make_sink(monkeypatch, tmp_path):
+    """Отдельный EventSink с настройками из окружения; поток останавливается после теста"""
+    sinks = []
+
+    def _make(**env):
+        monkeypatch.setenv("EVENT_SINK_SPILL_PATH", str(tmp_path / "spill.ndjson"))
+        for name, value in env.items():
+            monkeypatch.setenv(f"EVENT_SINK_{name.upper()}", str(value))
+        sink = event_sink.EventSink(EventLog.__table__)
+        sinks.append(sink)
+        return sink
+
+    yield _make
+    for sink in sinks:
+        sink.shutdown()
+
+
+class TestTransactionSemantics:
+    """События и исход транзакции запроса"""
+
+    def test_written_after_commit(self, test_session):
+        """Тест: событие записывается после COMMIT, без строки в транзакции запроса"""
+        log_event(test_session, "AFTER_COMMIT")
+        assert not test_session.new
+        test_session.commit()
+        event_sink.flush()
+        assert test_session.query(EventLog).filter_by(event="AFTER_COMMIT").count() == 1
+
+    def test_discarded_on_rollback(self, test_session):
+        """Тест: событие транзакции, откаченной ROLLBACK, не записывается"""
+        log_event(test_session, "ROLLED_BACK")
+        test_session.rollback()
+        event_sink.flush()
+        assert test_session.query(EventLog).filter_by(event="ROLLED_BACK").count() == 0
+
+    def test_no_copies_event_survives_rollback(self, test_session):
+        """Тест: отказ в выдаче попадает в журнал, хотя вызывающий откатывает транзакцию"""
+        book = Book(title="Test Book", year=2020)
+        branch = Branch(name="Test Branch", address="Test Address")
+        test_session.add_all([book, branch])
+        test_session.commit()
+
+        with pytest.raises(BorrowError):
+            borrow_book(test_session, student_id=1, book_id=book.id, branch_id=branch.id)
+        test_session.rollback()
+        event_sink.flush()
+        assert test_session.query(EventLog).filter_by(event="NO_COPIES_AVAILABLE").count() == 1
+
+
+class TestWriter:
+    """Пакетная запись и завершение"""
+
+    def test_batches_and_shutdown(self, make_sink, test_engine, test_session):
+        """Тест: все события очереди записываются пачками, shutdown дописывает очередь"""
+        sink = make_sink(batch_size=7)
+        for i in range(50):
+            sink.put(test_engine, _row("BATCHED"))
+        sink.shutdown()
+        assert test_session.query(EventLog).filter_by(event="BATCHED").count() == 50
+
+    def test_write_error_does_not_stop_writer(self, make_sink, test_engine, test_session):
+        """Тест: ошибка записи не останавливает поток, следующие события пишутся"""
+        sink = make_sink(overflow="drop")
+        sink.put(test_engine, {"event": None, "details": None, "created_at": datetime.utcnow()})
+        sink.flush()
+        sink.put(test_engine, _row("AFTER_ERROR"))
+        sink.flush()
+        assert test_session.query(EventLog).filter_by(event="AFTER_ERROR").count() == 1
+
+
+class TestOverflow:
+    """Политики переполнения очереди"""
+
+    def _stalled(self, sink):
+        # Писатель не запущен: очередь только заполняется
+        sink._ensure_thread = lambda: None
+        return sink
+
+    def test_drop(self, make_sink, test_engine):
+        """Тест: drop — лишние события отбрасываются сразу"""
+        sink = self._stalled(make_sink(queue_size=2, overflow="drop"))
+        for _ in range(5):
+            sink.put(test_engine, _row("DROP"))
+        assert sink._queue.qsize() == 2
+
+    def test_block_times_out(self, make_sink, test_engine):
+        """Тест: block — ожидание места ограничено таймаутом"""
+        sink = self._stalled(make_sink(queue_size=1, overflow="block", block_timeout=0.05))
+        sink.put(test_engine, _row("BLOCK"))
+        sink.put(test_engine, _row("BLOCK"))
+        assert sink._queue.qsize() == 1
+
+    def test_spill_and_replay(self, make_sink, test_engine, test_session, tmp_path):
+        """Тест: spill — лишние события в файл, затем дозапись файла в основную БД"""
+        sink = self._stalled(make_sink(queue_size=1, overflow="spill"))
+        sink.default_engine = test_engine
+        for _ in range(4):
+            sink.put(test_engine, _row("SPILL"))
+        assert len((tmp_path / "spill.ndjson").read_text().splitlines()) == 3
+
+        sink._replay_spill()
+        assert not (tmp_path / "spill.ndjson").exists()
+        assert test_session.query(EventLog).filter_by(event="SPILL").count() == 3
+
+    def test_invalid_policy(self, monkeypatch):
+        """Тест: неизвестная политика переполнения — ошибка конфигурации"""
+        monkeypatch.setenv("EVENT_SINK_OVERFLOW", "ignore")
+        with pytest.raises(ValueError, match="EVENT_SINK_OVERFLOW"):
+            event_sink.EventSink(EventLog.__table__)
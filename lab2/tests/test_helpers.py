@@ -2,9 +2,15 @@
 Тесты для вспомогательных функций
 """
 import pytest
-from datetime import datetime
-from models import Book, Branch, Inventory, Borrow, Student, EventLog
-from app import available_copies, borrow_book, BorrowError, log_event
+from datetime import datetime, timedelta
+from models import Book, Branch, Inventory, Borrow, Student, EventLog, Faculty
+from app import (
+    available_copies, borrow_book, BorrowError, log_event, borrow_history_page, events_page,
+    parse_event_filters, return_book, check_inventory_counters, reserve_copy, borrow_batch, return_batch,
+    set_copies_total, InventoryError,
+)
+import event_sink
+from pagination import encode_cursor, decode_cursor, CursorError
 
 
 class TestAvailableCopies:
@@ -56,15 +62,10 @@ class TestAvailableCopies:
             copies_total=5
         )
         test_session.add(inventory)
+        test_session.flush()
         
-        # Создаем выдачу
-        borrow = Borrow(
-            student_id=student.id,
-            book_id=book.id,
-            branch_id=branch.id,
-            borrowed_at=datetime.utcnow()
-        )
-        test_session.add(borrow)
+        # Создаем выдачу (счётчик active_count ведёт borrow_book)
+        borrow_book(test_session, student.id, book.id, branch.id)
         test_session.commit()
         
         result = available_copies(test_session, book_id=book.id, branch_id=branch.id)
@@ -130,6 +131,160 @@ class TestBorrowBook:
             borrow_book(test_session, student.id, book.id, branch.id)
 
 
+class TestReserveCopy:
+    """Тесты атомарной резервации экземпляра"""
+
+    def test_reserve_until_exhausted(self, test_session):
+        """Тест: резервация возвращает id выдачи, пока есть свободные экземпляры"""
+        book = Book(title="Test Book", year=2020)
+        branch = Branch(name="Test Branch", address="Test Address")
+        faculty = Faculty(name="Test Faculty")
+        test_session.add_all([book, branch, faculty])
+        test_session.flush()
+        student = Student(full_name="Test Student", faculty_id=faculty.id)
+        test_session.add_all([student, Inventory(book_id=book.id, branch_id=branch.id, copies_total=2)])
+        test_session.commit()
+
+        first = reserve_copy(test_session, student.id, book.id, branch.id)
+        second = reserve_copy(test_session, student.id, book.id, branch.id)
+        third = reserve_copy(test_session, student.id, book.id, branch.id)
+        test_session.commit()
+
+        assert first is not None and second is not None and first != second
+        assert third is None
+        assert test_session.query(Borrow).count() == 2
+        assert available_copies(test_session, book.id, branch.id) == 0
+
+
+class TestReturnBook:
+    """Тесты функции return_book и счётчика активных выдач"""
+
+    def _setup(self, session, copies=2):
+        book = Book(title="Test Book", year=2020)
+        branch = Branch(name="Test Branch", address="Test Address")
+        faculty = Faculty(name="Test Faculty")
+        session.add_all([book, branch, faculty])
+        session.flush()
+        student = Student(full_name="Test Student", faculty_id=faculty.id)
+        inventory = Inventory(book_id=book.id, branch_id=branch.id, copies_total=copies)
+        session.add_all([student, inventory])
+        session.commit()
+        return student, book, branch, inventory
+
+    def test_return_decrements_active_count(self, test_session):
+        """Тест: возврат уменьшает active_count и возвращает экземпляр в доступные"""
+        student, book, branch, inventory = self._setup(test_session)
+        borrow_book(test_session, student.id, book.id, branch.id)
+        test_session.commit()
+        assert available_copies(test_session, book.id, branch.id) == 1
+
+        borrow = test_session.query(Borrow).one()
+        assert return_book(test_session, borrow.id) is True
+        test_session.commit()
+        assert available_copies(test_session, book.id, branch.id) == 2
+
+    def test_double_return(self, test_session):
+        """Тест: повторный возврат не меняет счётчик"""
+        student, book, branch, inventory = self._setup(test_session)
+        borrow_book(test_session, student.id, book.id, branch.id)
+        test_session.commit()
+        borrow = test_session.query(Borrow).one()
+        assert return_book(test_session, borrow.id) is True
+        assert return_book(test_session, borrow.id) is False
+        test_session.commit()
+        test_session.refresh(inventory)
+        assert inventory.active_count == 0
+
+    def test_check_inventory_counters_fix(self, test_session):
+        """Тест: проверка находит и исправляет рассинхронизацию счётчика"""
+        student, book, branch, inventory = self._setup(test_session)
+        borrow_book(test_session, student.id, book.id, branch.id)
+        test_session.commit()
+        assert check_inventory_counters(test_session) == []
+
+        inventory.active_count = 2
+        test_session.commit()
+        mismatches = check_inventory_counters(test_session, fix=True)
+        assert [(m[3], m[4]) for m in mismatches] == [(2, 1)]
+        assert check_inventory_counters(test_session) == []
+
+
+class TestSetCopiesTotal:
+    """Тесты изменения числа экземпляров (set_copies_total)"""
+
+    def test_cannot_go_below_active_count(self, test_session):
+        """Тест: число экземпляров не уменьшается ниже выданных на руки"""
+        student, book, branch, inventory = TestReturnBook()._setup(test_session, copies=3)
+        borrow_book(test_session, student.id, book.id, branch.id)
+        borrow_book(test_session, student.id, book.id, branch.id)
+        test_session.commit()
+
+        with pytest.raises(InventoryError):
+            set_copies_total(test_session, book.id, branch.id, 1)
+        test_session.rollback()
+        set_copies_total(test_session, book.id, branch.id, 2)
+        test_session.commit()
+        assert available_copies(test_session, book.id, branch.id) == 0
+
+    def test_creates_row_and_rejects_negative(self, test_session):
+        """Тест: новая строка инвентаря; отрицательное число отклоняется и попадает в журнал"""
+        book = Book(title="Test Book", year=2020)
+        branch = Branch(name="Test Branch", address="Test Address")
+        test_session.add_all([book, branch])
+        test_session.commit()
+        with pytest.raises(InventoryError):
+            set_copies_total(test_session, book.id, branch.id, -1)
+        test_session.rollback()
+        event_sink.flush()
+        attempt = test_session.query(EventLog).filter_by(event="NEGATIVE_INVENTORY_ATTEMPT").one()
+        assert attempt.details == {"book_id": book.id, "branch_id": branch.id, "copies_total": -1}
+        set_copies_total(test_session, book.id, branch.id, 4)
+        test_session.commit()
+        assert available_copies(test_session, book.id, branch.id) == 4
+
+
+class TestBatchOperations:
+    """Тесты пакетной выдачи и возврата"""
+
+    def _setup(self, session, copies=2):
+        book = Book(title="Test Book", year=2020)
+        branch = Branch(name="Test Branch", address="Test Address")
+        faculty = Faculty(name="Test Faculty")
+        session.add_all([book, branch, faculty])
+        session.flush()
+        student = Student(full_name="Test Student", faculty_id=faculty.id)
+        session.add_all([student, Inventory(book_id=book.id, branch_id=branch.id, copies_total=copies)])
+        session.commit()
+        return student, book, branch
+
+    def test_borrow_batch_respects_availability(self, test_session):
+        """Тест: пакет выдаёт не больше доступных экземпляров и сообщает результат по каждой позиции"""
+        student, book, branch = self._setup(test_session, copies=2)
+        item = {"student_id": student.id, "book_id": book.id, "branch_id": branch.id}
+        results = borrow_batch(test_session, [item, item, item, {"student_id": "x"}])
+        test_session.commit()
+
+        assert [r["status"] for r in results] == ["ok", "ok", "error", "error"]
+        assert test_session.query(Borrow).count() == 2
+        assert available_copies(test_session, book.id, branch.id) == 0
+        assert check_inventory_counters(test_session) == []
+
+    def test_return_batch(self, test_session):
+        """Тест: пакетный возврат, повторный и несуществующий id"""
+        student, book, branch = self._setup(test_session, copies=2)
+        item = {"student_id": student.id, "book_id": book.id, "branch_id": branch.id}
+        ids = [r["borrow_id"] for r in borrow_batch(test_session, [item, item])]
+        test_session.commit()
+
+        results = return_batch(test_session, ids + [ids[0], 99999])
+        test_session.commit()
+        event_sink.flush()
+
+        assert [r["status"] for r in results] == ["ok", "ok", "error", "error"]
+        assert available_copies(test_session, book.id, branch.id) == 2
+        assert test_session.query(EventLog).filter_by(event="BORROW_RETURNED").count() == 2
+
+
 class TestLogEvent:
     """Тесты функции log_event"""
     
@@ -137,17 +292,148 @@ class TestLogEvent:
         """Тест: создание записи в логе событий"""
         log_event(test_session, "TEST_EVENT", '{"test": "data"}')
         test_session.commit()
+        event_sink.flush()
         
         event = test_session.query(EventLog).filter_by(event="TEST_EVENT").first()
         assert event is not None
-        assert event.details == '{"test": "data"}'
+        # Строка с JSON хранится разобранной: колонка details — JSON/JSONB
+        assert event.details == {"test": "data"}
     
     def test_log_event_without_details(self, test_session):
         """Тест: создание записи без деталей"""
         log_event(test_session, "SIMPLE_EVENT")
         test_session.commit()
+        event_sink.flush()
         
         event = test_session.query(EventLog).filter_by(event="SIMPLE_EVENT").first()
         assert event is not None
         assert event.details is None
 
+
+class TestBorrowHistoryPage:
+    """Тесты keyset-пагинации истории выдач"""
+
+    def _make_borrows(self, session, count):
+        book = Book(title="Test Book", year=2020)
+        branch = Branch(name="Test Branch", address="Test Address")
+        faculty = Faculty(name="Test Faculty")
+        session.add_all([book, branch, faculty])
+        session.flush()
+        student = Student(full_name="Test Student", faculty_id=faculty.id)
+        session.add(student)
+        session.flush()
+        start = datetime(2024, 1, 1)
+        for i in range(count):
+            session.add(Borrow(
+                student_id=student.id, book_id=book.id, branch_id=branch.id,
+                # по две выдачи на одну метку времени — проверяем разрешение равенства по id
+                borrowed_at=start + timedelta(hours=i // 2),
+                returned_at=start if i % 3 == 0 else None,
+            ))
+        session.commit()
+        return student, book, branch
+
+    def test_pages_cover_all_rows_without_duplicates(self, test_session):
+        """Тест: обход всех страниц возвращает каждую выдачу ровно один раз"""
+        self._make_borrows(test_session, 25)
+        seen, cursor = [], None
+        while True:
+            rows, cursor = borrow_history_page(test_session, {}, cursor=cursor, limit=10)
+            seen.extend(r.id for r in rows)
+            if cursor is None:
+                break
+        assert len(seen) == 25
+        assert len(set(seen)) == 25
+
+    def test_pages_ordered_newest_first(self, test_session):
+        """Тест: порядок (borrowed_at, id) по убыванию"""
+        self._make_borrows(test_session, 6)
+        rows, _ = borrow_history_page(test_session, {}, limit=10)
+        keys = [(r.borrowed_at, r.id) for r in rows]
+        assert keys == sorted(keys, reverse=True)
+
+    def test_active_only_filter(self, test_session):
+        """Тест: фильтр «только не возвращённые»"""
+        self._make_borrows(test_session, 9)
+        rows, cursor = borrow_history_page(test_session, {"active": True}, limit=50)
+        assert len(rows) == 6
+        assert all(r.returned_at is None for r in rows)
+        assert cursor is None
+
+    def test_date_range_filter(self, test_session):
+        """Тест: фильтр по диапазону дат включает дату «по»"""
+        self._make_borrows(test_session, 4)
+        day = datetime(2024, 1, 1)
+        rows, _ = borrow_history_page(test_session, {"date_from": day, "date_to": day}, limit=50)
+        assert len(rows) == 4
+        rows, _ = borrow_history_page(test_session, {"date_from": day + timedelta(days=1)}, limit=50)
+        assert rows == []
+
+
+class TestEventsPage:
+    """Тесты поиска по журналу событий"""
+
+    def _make_events(self, session):
+        start = datetime(2024, 3, 1, 9, 0)
+        for i in range(12):
+            session.add(EventLog(
+                event="BORROW_RETURNED" if i % 2 else "NO_COPIES_AVAILABLE",
+                details={"book_id": i % 3 + 1, "branch_id": 7},
+                # по три события на одну метку времени — проверяем разрешение равенства по id
+                created_at=start + timedelta(days=i // 3),
+            ))
+        session.commit()
+
+    def test_pages_cover_all_rows_newest_first(self, test_session):
+        """Тест: обход страниц возвращает каждое событие один раз, новые сверху"""
+        self._make_events(test_session)
+        seen, cursor = [], None
+        while True:
+            rows, cursor = events_page(test_session, {}, cursor=cursor, limit=5)
+            seen.extend((r.created_at, r.id) for r in rows)
+            if cursor is None:
+                break
+        assert len(seen) == 12
+        assert seen == sorted(set(seen), reverse=True)
+
+    def test_filter_by_event_and_detail_keys(self, test_session):
+        """Тест: тип события и ключи details сочетаются через И"""
+        self._make_events(test_session)
+        rows, _ = events_page(test_session, {"event": "BORROW_RETURNED", "book_id": 2, "branch_id": 7}, limit=50)
+        assert [r.details["book_id"] for r in rows] == [2, 2]
+        assert {r.event for r in rows} == {"BORROW_RETURNED"}
+        rows, _ = events_page(test_session, {"branch_id": 8}, limit=50)
+        assert rows == []
+
+    def test_date_range_filter(self, test_session):
+        """Тест: диапазон дат включает дату «по»"""
+        self._make_events(test_session)
+        day = datetime(2024, 3, 2)
+        rows, _ = events_page(test_session, {"date_from": day, "date_to": day}, limit=50)
+        assert len(rows) == 3
+        assert all(r.created_at.date() == day.date() for r in rows)
+
+    def test_parse_filters(self):
+        """Тест: некорректные значения фильтров игнорируются"""
+        from werkzeug.datastructures import MultiDict
+        filters = parse_event_filters(MultiDict(
+            {"event": " BORROW_RETURNED ", "book_id": "5", "branch_id": "x", "date_from": "2024-13-01"}
+        ))
+        assert filters["event"] == "BORROW_RETURNED"
+        assert filters["book_id"] == 5
+        assert filters["branch_id"] is None
+        assert filters["date_from"] is None
+
+
+class TestCursor:
+    """Тесты кодирования курсора"""
+
+    def test_cursor_roundtrip(self):
+        """Тест: курсор восстанавливает значения ключа"""
+        at = datetime(2024, 5, 1, 12, 30)
+        assert decode_cursor(encode_cursor(at, 42), 2) == (at, 42)
+
+    def test_invalid_cursor(self):
+        """Тест: испорченный курсор вызывает CursorError"""
+        with pytest.raises(CursorError):
+            decode_cursor("not-a-cursor", 2)
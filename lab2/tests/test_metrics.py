@@ -0,0 +1,117 @@
+"""
+Тесты метрик Prometheus (metrics) и эндпоинта /metrics
+"""
+import json
+import os
+
+import pytest
+from sqlalchemy import text
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics(monkeypatch):
+    """Значения метрик процесса пустые, снимки в файлы не пишутся"""
+    monkeypatch.delenv("METRICS_DIR", raising=False)
+    metrics._values.clear()
+    yield
+    metrics._values.clear()
+
+
+def _value(name, *labels):
+    return metrics.collect().get(json.dumps([name, *labels]))
+
+
+class TestRender:
+    """Текстовый формат Prometheus"""
+
+    def test_counter_and_histogram(self):
+        """Тест: счётчик с метками и гистограмма с накопленными корзинами"""
+        requests_total = metrics.counter("test_render_total", "Тестовый счётчик", ("kind",))
+        latency = metrics.histogram("test_render_seconds", "Тестовая гистограмма", buckets=(0.1, 1.0))
+        requests_total.inc(kind='a"b')
+        requests_total.inc(2, kind='a"b')
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(5)
+
+        body = metrics.render(metrics.collect())
+        assert "# TYPE test_render_total counter" in body
+        assert 'test_render_total{kind="a\\"b"} 3' in body
+        assert "# TYPE test_render_seconds histogram" in body
+        assert 'test_render_seconds_bucket{le="0.1"} 1' in body
+        assert 'test_render_seconds_bucket{le="1"} 2' in body
+        assert 'test_render_seconds_bucket{le="+Inf"} 3' in body
+        assert "test_render_seconds_count 3" in body
+        assert "test_render_seconds_sum 5.55" in body
+
+
+class TestRequestMetrics:
+    """Метрики запросов по роутам"""
+
+    def test_per_endpoint_histograms(self, client, test_session):
+        """Тест: после запросов есть гистограммы по endpoint и счётчик по коду ответа"""
+        client.get('/login')
+        client.get('/login')
+        client.get('/no-such-page')
+
+        latency = _value("http_request_duration_seconds", "login")
+        assert latency is not None and sum(latency[:-1]) == 2
+        assert sum(_value("http_request_render_seconds", "login")[:-1]) == 2
+        assert _value("http_requests_total", "login", "GET", "200") == 2
+        assert _value("http_requests_total", "unknown", "GET", "404") == 1
+
+    def test_metrics_endpoint(self, client, test_session):
+        """Тест: /metrics отдаёт текстовый формат с данными роутов"""
+        client.get('/login')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.mimetype == "text/plain"
+        body = response.get_data(as_text=True)
+        assert 'http_request_duration_seconds_count{endpoint="login"} 1' in body
+        assert 'http_requests_total{endpoint="login",method="GET",status="200"} 1' in body
+        assert "# TYPE library_borrows_total counter" in body
+
+
+class TestCountOnCommit:
+    """Счётчики, учитываемые только после COMMIT"""
+
+    def test_commit_counts(self, test_session):
+        """Тест: inc_on_commit учитывается после COMMIT"""
+        events = metrics.counter("test_commit_total", "Тест")
+        test_session.execute(text("SELECT 1"))
+        events.inc_on_commit(test_session, 3)
+        assert _value("test_commit_total") is None
+        test_session.commit()
+        assert _value("test_commit_total") == 3
+
+    def test_rollback_discards(self, test_session):
+        """Тест: при ROLLBACK отложенное увеличение отбрасывается"""
+        events = metrics.counter("test_rollback_total", "Тест")
+        test_session.execute(text("SELECT 1"))
+        events.inc_on_commit(test_session)
+        test_session.rollback()
+        test_session.execute(text("SELECT 1"))
+        test_session.commit()
+        assert _value("test_rollback_total") is None
+
+
+class TestMultiProcess:
+    """Суммирование снимков нескольких процессов через METRICS_DIR"""
+
+    def test_collect_sums_snapshots(self, tmp_path, monkeypatch):
+        """Тест: значения живого соседа складываются, снимок завершившегося уходит в архив"""
+        monkeypatch.setenv("METRICS_DIR", str(tmp_path))
+        events = metrics.counter("test_workers_total", "Тест")
+        events.inc(1)
+        key = json.dumps(["test_workers_total"])
+        # Живой процесс (родитель pytest) и заведомо несуществующий pid
+        (tmp_path / f"{os.getppid()}.json").write_text(json.dumps({key: 10}))
+        (tmp_path / "999999999.json").write_text(json.dumps({key: 100}))
+
+        assert metrics.collect()[key] == 111
+        assert not (tmp_path / "999999999.json").exists()
+        assert json.loads((tmp_path / "archive.json").read_text()) == {key: 100}
+        # Повторный сбор не удваивает архив
+        assert metrics.collect()[key] == 111
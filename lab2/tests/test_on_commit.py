@@ -0,0 +1,63 @@
+"""
+Тесты действий, отложенных до COMMIT (on_commit)
+"""
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import on_commit
+from models import Faculty
+
+
+@pytest.fixture
+def committed():
+    items = []
+    on_commit.register("test_on_commit", items.extend)
+    yield items
+    on_commit._handlers.pop("test_on_commit", None)
+
+
+class TestOnCommit:
+    """Накопление в транзакции и вызов обработчика"""
+
+    def test_handler_called_once_after_commit(self, test_session, committed):
+        """Тест: обработчик получает всё накопленное за транзакцию одним вызовом после COMMIT"""
+        on_commit.add(test_session, "test_on_commit", 1)
+        on_commit.add(test_session, "test_on_commit", 2)
+        test_session.add(Faculty(name="On commit"))
+        test_session.flush()
+        assert committed == []
+        test_session.commit()
+        assert committed == [1, 2]
+        test_session.commit()
+        assert committed == [1, 2]
+
+    def test_rollback_drops_pending(self, test_session, committed):
+        """Тест: ROLLBACK отбрасывает накопленное"""
+        test_session.add(Faculty(name="Rolled back"))
+        test_session.flush()
+        on_commit.add(test_session, "test_on_commit", 1)
+        test_session.rollback()
+        test_session.add(Faculty(name="Committed"))
+        test_session.commit()
+        assert committed == []
+
+    def test_close_without_commit_drops_pending(self, test_engine, test_session, committed):
+        """Тест: сессия, закрытая без COMMIT, ничего не передаёт обработчику"""
+        session = sessionmaker(bind=test_engine)()
+        session.add(Faculty(name="Closed"))
+        session.flush()
+        on_commit.add(session, "test_on_commit", 1)
+        session.close()
+        assert committed == []
+        assert "on_commit" not in session.info
+
+    def test_pending_readable_before_commit(self, test_session):
+        """Тест: накопленное можно читать до COMMIT (кэш транзакции резолверов)"""
+        on_commit.register("test_on_commit_dict", lambda pending: None)
+        test_session.add(Faculty(name="Pending"))
+        test_session.flush()
+        on_commit.pending(test_session, "test_on_commit_dict", dict)["a"] = 1
+        assert on_commit.pending(test_session, "test_on_commit_dict", dict) == {"a": 1}
+        test_session.rollback()
+        assert on_commit.pending(test_session, "test_on_commit_dict", dict) == {}
+        on_commit._handlers.pop("test_on_commit_dict")
@@ -0,0 +1,138 @@
+"""
+Тесты помесячных секций журналов (partitions)
+"""
+import os
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import text
+
+from partitions import (
+    add_months, apply_retention, create_partition, ensure_partitions, list_partitions, maintain, missing_partitions,
+    month_start,
+)
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "")
+TABLE = "part_test_log"
+
+requires_pg = pytest.mark.skipif(
+    not TEST_DATABASE_URL.startswith("postgresql"),
+    reason="нужен PostgreSQL (TEST_DATABASE_URL)",
+)
+
+
+@pytest.fixture
+def partitioned(test_engine):
+    """Секционированная по created_at таблица lib.part_test_log с секцией по умолчанию"""
+    with test_engine.begin() as conn:
+        conn.execute(text("CREATE SCHEMA IF NOT EXISTS lib"))
+        conn.execute(text(f"DROP TABLE IF EXISTS lib.{TABLE} CASCADE"))
+        conn.execute(text(
+            f"CREATE TABLE lib.{TABLE} (id bigserial, created_at timestamp NOT NULL, event text, "
+            f"PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)"
+        ))
+        conn.execute(text(f"CREATE TABLE lib.{TABLE}_default PARTITION OF lib.{TABLE} DEFAULT"))
+    yield test_engine
+    with test_engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS lib.{TABLE} CASCADE"))
+        conn.execute(text(f"DROP TABLE IF EXISTS lib.{TABLE}_p202401"))
+
+
+class TestMonths:
+    """Арифметика месяцев"""
+
+    def test_add_months(self):
+        """Тест: переход через границу года в обе стороны"""
+        assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+        assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+        assert month_start(date(2024, 5, 17)) == date(2024, 5, 1)
+
+    def test_maintain_skips_sqlite(self, tmp_path):
+        """Тест: вне PostgreSQL обслуживание ничего не делает"""
+        from sqlalchemy import create_engine
+        assert maintain(create_engine(f"sqlite:///{tmp_path / 'x.db'}")) == {}
+        assert missing_partitions(create_engine(f"sqlite:///{tmp_path / 'x.db'}")) == []
+
+
+class TestWorkerCheck:
+    """Проверка секций в веб-процессе: только предупреждение, без DDL"""
+
+    def test_warns_once_per_interval(self, monkeypatch, caplog):
+        """Тест: нет секции следующего месяца — одно предупреждение за интервал, maintain не вызывается"""
+        from flask import Flask
+        import partitions
+        calls = []
+        monkeypatch.setenv("PARTITION_CHECK_INTERVAL", "3600")
+        monkeypatch.setattr(partitions, "missing_partitions",
+                            lambda engine: calls.append(engine) or ["event_log_p202502"])
+        monkeypatch.setattr(partitions, "maintain", lambda *a, **kw: pytest.fail("DDL в веб-процессе"))
+        app = Flask(__name__)
+        app.add_url_rule("/", "index", lambda: "ok")
+        partitions.init_app(app, lambda: "engine")
+        with caplog.at_level("WARNING", logger="partitions"):
+            client = app.test_client()
+            client.get("/")
+            client.get("/")
+        assert calls == ["engine"]
+        assert [r.getMessage() for r in caplog.records if "event_log_p202502" in r.getMessage()]
+
+    def test_check_disabled(self, monkeypatch):
+        """Тест: PARTITION_CHECK_INTERVAL=0 — проверка не подключается"""
+        from flask import Flask
+        import partitions
+        monkeypatch.setenv("PARTITION_CHECK_INTERVAL", "0")
+        app = Flask(__name__)
+        partitions.init_app(app, lambda: pytest.fail("проверка не должна выполняться"))
+        assert not app.before_request_funcs
+
+
+@requires_pg
+class TestPartitions:
+    """Создание секций и срок хранения"""
+
+    def test_ensure_creates_ahead(self, partitioned):
+        """Тест: секции текущего месяца и на months_ahead вперёд, повторный вызов ничего не создаёт"""
+        with partitioned.begin() as conn:
+            created = ensure_partitions(conn, TABLE, 2, today=date(2024, 12, 15))
+            assert created == [f"{TABLE}_p202412", f"{TABLE}_p202501", f"{TABLE}_p202502"]
+            assert ensure_partitions(conn, TABLE, 2, today=date(2024, 12, 15)) == []
+
+    def test_rows_moved_from_default(self, partitioned):
+        """Тест: строки месяца, попавшие в default, переносятся в созданную секцию"""
+        with partitioned.begin() as conn:
+            conn.execute(text(f"INSERT INTO lib.{TABLE} (created_at, event) VALUES (:a, 'a'), (:b, 'b')"),
+                         {"a": datetime(2024, 3, 5), "b": datetime(2024, 4, 1)})
+            create_partition(conn, TABLE, date(2024, 3, 1))
+            in_march = conn.execute(text(f"SELECT event FROM lib.{TABLE}_p202403")).scalars().all()
+            in_default = conn.execute(text(f"SELECT event FROM lib.{TABLE}_default")).scalars().all()
+        assert in_march == ["a"]
+        assert in_default == ["b"]
+
+    def test_retention_detach_and_drop(self, partitioned):
+        """Тест: секции старше срока снимаются (detach) или удаляются (drop), свежие остаются"""
+        with partitioned.begin() as conn:
+            for month in (date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1), date(2024, 4, 1)):
+                create_partition(conn, TABLE, month)
+            detached = apply_retention(conn, TABLE, 4, "detach", today=date(2024, 5, 10))
+            assert detached == [f"{TABLE}_p202401"]
+            dropped = apply_retention(conn, TABLE, 2, "drop", today=date(2024, 5, 10))
+            assert dropped == [f"{TABLE}_p202402", f"{TABLE}_p202403"]
+            assert sorted(list_partitions(conn, TABLE).values()) == [f"{TABLE}_p202404"]
+            # Снятая секция — обычная таблица с данными для архива; удалённая — исчезла
+            assert conn.execute(text(f"SELECT to_regclass('lib.{TABLE}_p202401')")).scalar() is not None
+            assert conn.execute(text(f"SELECT to_regclass('lib.{TABLE}_p202402')")).scalar() is None
+
+    def test_missing_next_month(self, partitioned, monkeypatch):
+        """Тест: проверка веб-процесса находит отсутствующую секцию следующего месяца"""
+        import partitions
+        monkeypatch.setattr(partitions, "PARTITIONED_TABLES", (TABLE,))
+        assert missing_partitions(partitioned, today=date(2024, 12, 15)) == [f"{TABLE}_p202501"]
+        with partitioned.begin() as conn:
+            create_partition(conn, TABLE, date(2025, 1, 1))
+        assert missing_partitions(partitioned, today=date(2024, 12, 15)) == []
+
+    def test_retention_disabled(self, partitioned):
+        """Тест: срок 0 — ничего не снимается"""
+        with partitioned.begin() as conn:
+            create_partition(conn, TABLE, date(2020, 1, 1))
+            assert apply_retention(conn, TABLE, 0, "drop") == []
@@ -0,0 +1,52 @@
+"""
+Тесты кэша справочных списков (ref_cache)
+"""
+from models import Book, Branch, Faculty
+from query_stats import count_queries
+import ref_cache
+
+
+def _titles(session):
+    return [t for (t,) in session.query(Book.title).order_by(Book.title).all()]
+
+
+class TestRefCache:
+    """Тесты версионируемого кэша"""
+
+    def test_cached_until_table_changes(self, test_session):
+        """Тест: повторное чтение без запросов, после COMMIT в таблице — перечитывание"""
+        test_session.add(Book(title="A", year=2020))
+        test_session.commit()
+        assert ref_cache.get("titles", ("books",), lambda: _titles(test_session)) == ["A"]
+
+        with count_queries() as stats:
+            assert ref_cache.get("titles", ("books",), lambda: _titles(test_session)) == ["A"]
+        assert stats.count == 0
+
+        test_session.add(Book(title="B", year=2020))
+        test_session.commit()
+        assert ref_cache.get("titles", ("books",), lambda: _titles(test_session)) == ["A", "B"]
+
+    def test_other_table_does_not_invalidate(self, test_session):
+        """Тест: изменение другой таблицы не сбрасывает запись"""
+        ref_cache.get("titles", ("books",), lambda: _titles(test_session))
+        test_session.add(Branch(name="Branch", address="Address"))
+        test_session.commit()
+        assert ref_cache.version("branches") == 1
+        with count_queries() as stats:
+            ref_cache.get("titles", ("books",), lambda: _titles(test_session))
+        assert stats.count == 0
+
+    def test_rollback_does_not_bump(self, test_session):
+        """Тест: откаченная запись не меняет версию"""
+        test_session.add(Faculty(name="Ghost"))
+        test_session.flush()
+        test_session.rollback()
+        assert ref_cache.version("faculties") == 0
+
+    def test_mark_changed_bumps_after_commit(self, test_session):
+        """Тест: явная отметка для записи через Core применяется после COMMIT"""
+        ref_cache.mark_changed(test_session, "books")
+        assert ref_cache.version("books") == 0
+        test_session.commit()
+        assert ref_cache.version("books") == 1
@@ -0,0 +1,123 @@
+"""
+Тесты маршрутизации чтения на реплики
+"""
+import pytest
+from flask import Flask, g
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+
+import replicas
+from models import Book, Branch
+from replicas import ReplicaSet, RoutingSession
+
+
+@pytest.fixture
+def replica_engine(test_engine):
+    """Второй engine к той же тестовой БД — «реплика»; statements — выполненные на ней запросы"""
+    engine = create_engine(test_engine.url, future=True)
+    engine.statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        engine.statements.append(statement)
+
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def routed(app, test_engine, test_session, replica_engine):
+    """Приложение с RoutingSession и одной репликой; lag[0] — отставание, которое «измерит» проба"""
+    import app as app_module
+    lag = [0.0]
+    replicas.configure(ReplicaSet([replica_engine], max_lag=5, check_interval=0, probe=lambda e: lag[0]))
+    app_module.SessionLocal = sessionmaker(bind=test_engine, class_=RoutingSession, autoflush=False, future=True)
+    yield app.test_client(), replica_engine, lag
+    replicas.configure(ReplicaSet([]))
+
+
+class TestReplicaSet:
+    """Выбор реплики по отставанию"""
+
+    def test_fresh_replica_round_robin(self):
+        """Тест: свежие реплики выбираются по кругу"""
+        a, b = object(), object()
+        replica_set = ReplicaSet([a, b], probe=lambda e: 0.0)
+        assert [replica_set.pick()[0] for _ in range(4)] == [a, b, a, b]
+
+    def test_lagging_and_unavailable(self):
+        """Тест: отстающая реплика пропускается, без свежих — чтение из основной БД"""
+        a, b = object(), object()
+        lags = {a: 30.0, b: 1.0}
+        replica_set = ReplicaSet([a, b], max_lag=5, check_interval=0, probe=lambda e: lags[e])
+        assert replica_set.pick() == (b, None)
+        lags[b] = None
+        assert replica_set.pick() == (None, "lag")
+        lags[a] = None
+        assert replica_set.pick() == (None, "unavailable")
+        assert ReplicaSet([]).pick() == (None, "no_replicas")
+
+    def test_lag_is_cached(self):
+        """Тест: отставание перепроверяется не чаще check_interval"""
+        calls = []
+        replica = object()
+        replica_set = ReplicaSet([replica], check_interval=60, probe=lambda e: calls.append(e) or 0.0)
+        for _ in range(5):
+            replica_set.pick()
+        assert calls == [replica]
+
+
+class TestRoutingSession:
+    """Куда RoutingSession отправляет запросы"""
+
+    def test_only_selects_go_to_replica(self, test_engine, test_session, replica_engine):
+        """Тест: SELECT — на реплику, flush и SELECT ... FOR UPDATE — в основную БД"""
+        with Flask(__name__).test_request_context():
+            g.read_engine = replica_engine
+            with RoutingSession(bind=test_engine) as session:
+                assert session.get_bind(clause=select(Book)) is replica_engine
+                assert session.get_bind(clause=select(Book).with_for_update()) is test_engine
+                assert session.get_bind() is test_engine
+                session.add(Branch(name="Replica Branch", address="-"))
+                session.flush()
+                session.rollback()
+        assert not any(s.lstrip().upper().startswith("INSERT") for s in replica_engine.statements)
+
+    def test_without_request_uses_primary(self, test_engine, replica_engine):
+        """Тест: вне запроса (CLI, фоновые потоки) — основная БД"""
+        with RoutingSession(bind=test_engine) as session:
+            assert session.get_bind(clause=select(Book)) is test_engine
+
+
+class TestReadRouting:
+    """Маршрутизация роутов"""
+
+    def test_read_only_route_reads_replica(self, routed):
+        """Тест: GET @read_only-роута читает с реплики"""
+        client, replica, _ = routed
+        assert client.get('/books').status_code == 200
+        assert any("lib.books" in s for s in replica.statements)
+
+    def test_other_routes_use_primary(self, routed):
+        """Тест: роут без @read_only не трогает реплику"""
+        client, replica, _ = routed
+        client.get('/borrow')
+        assert replica.statements == []
+
+    def test_lagging_replica_falls_back_to_primary(self, routed):
+        """Тест: реплика отстаёт больше REPLICA_MAX_LAG_SECONDS — чтение из основной БД"""
+        client, replica, lag = routed
+        lag[0] = 60.0
+        assert client.get('/books').status_code == 200
+        assert replica.statements == []
+
+    def test_user_pinned_to_primary_after_write(self, routed):
+        """Тест: после POST пользователь читает из основной БД, пока не истечёт метка"""
+        client, replica, _ = routed
+        client.post('/return/99999')
+        client.get('/books')
+        assert replica.statements == []
+        with client.session_transaction() as http_session:
+            http_session["_primary_until"] = 0
+        client.get('/books')
+        assert replica.statements
@@ -0,0 +1,61 @@
+"""
+Тесты резолверов имя -> id (Publisher, Author)
+"""
+import pytest
+
+from models import Author, Publisher
+from resolvers import NameResolver
+from query_stats import count_queries
+
+
+@pytest.fixture
+def resolver():
+    """Отдельный резолвер авторов с пустым кэшем"""
+    return NameResolver(Author, Author.full_name, maxsize=3)
+
+
+class TestNameResolver:
+    """Тесты NameResolver"""
+
+    def test_resolve_creates_missing_in_constant_statements(self, resolver, test_session):
+        """Тест: десять новых имён — не больше трёх операторов"""
+        test_session.add(Author(full_name="A0"))
+        test_session.commit()
+        names = [f"A{i}" for i in range(10)]
+        with count_queries() as stats:
+            ids = resolver.resolve(test_session, names)
+        test_session.commit()
+
+        assert set(ids) == set(names)
+        assert stats.count <= 3
+        assert test_session.query(Author).count() == 10
+
+    def test_committed_names_served_from_cache(self, resolver, test_session):
+        """Тест: после COMMIT имена берутся из кэша без запросов"""
+        resolver.resolve(test_session, ["A", "B"])
+        test_session.commit()
+        with count_queries() as stats:
+            ids = resolver.resolve(test_session, ["A", "B"])
+        assert stats.count == 0
+        assert len(ids) == 2
+
+    def test_rollback_discards_created_names(self, resolver, test_session):
+        """Тест: при ROLLBACK созданные в транзакции id не попадают в кэш"""
+        resolver.resolve(test_session, ["Ghost"])
+        test_session.rollback()
+        assert resolver._cache_get(["Ghost"]) == {}
+        assert test_session.query(Author).filter_by(full_name="Ghost").count() == 0
+
+    def test_cache_is_bounded(self, resolver, test_session):
+        """Тест: LRU-кэш не растёт больше maxsize"""
+        resolver.resolve(test_session, ["A", "B", "C", "D", "E"])
+        test_session.commit()
+        assert len(resolver._cache) == 3
+
+    def test_resolve_one_publisher(self, test_session):
+        """Тест: resolve_one для издательства и пустое имя"""
+        publishers = NameResolver(Publisher, Publisher.name)
+        pub_id = publishers.resolve_one(test_session, "Наука")
+        test_session.commit()
+        assert test_session.get(Publisher, pub_id).name == "Наука"
+        assert publishers.resolve_one(test_session, "") is None
@@ -2,7 +2,8 @@
 Тесты для основных роутов приложения
 """
 import pytest
-from models import Book, Branch, Publisher, Faculty, Student
+from query_stats import count_queries
+from models import Book, Branch, Publisher, Faculty, Student, Author, BookAuthor, Inventory, BookFaculty
 
 
 class TestIndexRoute:
@@ -56,6 +57,68 @@ class TestBooksRoutes:
         assert response.status_code == 200
 
 
+class TestBookDetailRoute:
+    """Тесты карточки книги"""
+
+    def _make_book(self, session, authors_count, branches_count, suffix=""):
+        publisher = Publisher(name=f"Test Publisher{suffix}")
+        faculty = Faculty(name=f"Test Faculty{suffix}")
+        book = Book(title=f"Detail Book{suffix}", year=2020, publisher=publisher)
+        session.add_all([publisher, faculty, book])
+        session.flush()
+        for i in range(authors_count):
+            session.add(BookAuthor(book=book, author=Author(full_name=f"Author {i}{suffix}")))
+        for i in range(branches_count):
+            branch = Branch(name=f"Branch {i}{suffix}", address="Test Address")
+            session.add(branch)
+            session.flush()
+            session.add(Inventory(book_id=book.id, branch_id=branch.id, copies_total=3))
+            session.add(BookFaculty(book_id=book.id, faculty_id=faculty.id, branch_id=branch.id))
+        session.commit()
+        return book.id
+
+    def _count_queries(self, client, url):
+        with count_queries() as stats:
+            response = client.get(url)
+        assert response.status_code == 200
+        return stats.count, response
+
+    def test_book_detail_shows_related_data(self, client, test_session):
+        """Тест: карточка показывает авторов, издательство, филиалы и факультеты"""
+        book_id = self._make_book(test_session, authors_count=2, branches_count=1)
+        response = client.get(f'/books/{book_id}')
+        assert response.status_code == 200
+        for text in (b'Author 0', b'Author 1', b'Test Publisher', b'Branch 0', b'Test Faculty'):
+            assert text in response.data
+
+    def test_book_detail_query_count_is_fixed(self, client, test_session):
+        """Тест: число запросов не зависит от числа авторов и филиалов"""
+        small = self._make_book(test_session, authors_count=1, branches_count=1)
+        small_queries, _ = self._count_queries(client, f'/books/{small}')
+        big = self._make_book(test_session, authors_count=8, branches_count=5, suffix=" big")
+        big_queries, _ = self._count_queries(client, f'/books/{big}')
+        assert big_queries == small_queries
+
+    def test_book_detail_query_budget(self, client, test_session, query_budget):
+        """Тест: карточка книги укладывается в 5 запросов"""
+        book_id = self._make_book(test_session, authors_count=3, branches_count=2)
+        with query_budget(5):
+            response = client.get(f'/books/{book_id}')
+        assert response.status_code == 200
+
+    def test_book_detail_not_found(self, client, test_session):
+        """Тест: несуществующая книга — 404"""
+        response = client.get('/books/99999')
+        assert response.status_code == 404
+
+    def test_book_edit_page_shows_authors(self, client, test_session):
+        """Тест: форма редактирования заполняет авторов"""
+        book_id = self._make_book(test_session, authors_count=2, branches_count=0)
+        response = client.get(f'/books/{book_id}/edit')
+        assert response.status_code == 200
+        assert b'Author 0, Author 1' in response.data or b'Author 1, Author 0' in response.data
+
+
 class TestBranchesRoutes:
     """Тесты роутов для филиалов"""
     
@@ -113,6 +176,38 @@ class TestBorrowRoute:
         response = client.get('/borrow')
         assert response.status_code == 200
 
+    def test_borrow_page_accepts_filters(self, client, test_session):
+        """Тест: страница выдачи принимает фильтры и размер страницы"""
+        response = client.get('/borrow?student_id=1&active=1&date_from=2024-01-01&limit=10')
+        assert response.status_code == 200
+
+    def test_borrow_page_invalid_cursor(self, client, test_session):
+        """Тест: некорректный курсор не ломает страницу"""
+        response = client.get('/borrow?cursor=broken')
+        assert response.status_code == 200
+
+
+class TestBatchApi:
+    """Тесты пакетного JSON API выдачи/возврата"""
+
+    def test_borrow_batch_requires_items(self, client, test_session):
+        """Тест: пустой пакет отклоняется"""
+        response = client.post('/api/borrows/batch', json={"items": []})
+        assert response.status_code == 400
+
+    def test_borrow_batch_too_large(self, client, test_session):
+        """Тест: слишком большой пакет отклоняется"""
+        response = client.post('/api/borrows/batch', json={"items": [{}] * 1001})
+        assert response.status_code == 413
+
+    def test_returns_batch_reports_per_item(self, client, test_session):
+        """Тест: результат возвращается по каждой позиции"""
+        response = client.post('/api/returns/batch', json={"borrow_ids": [12345]})
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["ok"] == 0
+        assert data["results"][0]["status"] == "error"
+
 
 class TestEventsRoute:
     """Тесты роута для событий"""
@@ -122,3 +217,174 @@ class TestEventsRoute:
         response = client.get('/events')
         assert response.status_code == 200
 
+    def test_events_page_filters_and_paging(self, client, test_session):
+        """Тест: фильтр по типу и ключу details, ссылка на следующую страницу"""
+        from models import EventLog
+        test_session.add_all([EventLog(event="BORROW_RETURNED", details={"borrow_id": i}) for i in range(1, 4)])
+        test_session.add(EventLog(event="NO_COPIES_AVAILABLE", details={"book_id": 77}))
+        test_session.commit()
+        response = client.get('/events?event=NO_COPIES_AVAILABLE&book_id=77')
+        assert response.status_code == 200
+        assert b'NO_COPIES_AVAILABLE</td>' in response.data
+        assert b'BORROW_RETURNED</td>' not in response.data
+        response = client.get('/events?event=BORROW_RETURNED&limit=2')
+        assert 'Следующая страница'.encode() in response.data
+
+    def test_events_page_invalid_cursor(self, client, test_session):
+        """Тест: некорректный курсор не ломает страницу"""
+        response = client.get('/events?cursor=broken')
+        assert response.status_code == 200
+
+
+class TestQueryBudgets:
+    """Бюджеты SQL-запросов для страниц со списками"""
+
+    def _fill(self, session, n):
+        faculty = Faculty(name="Budget Faculty")
+        session.add(faculty)
+        session.flush()
+        for i in range(n):
+            book = Book(title=f"Budget Book {i}", year=2020)
+            branch = Branch(name=f"Budget Branch {i}", address="Test Address")
+            session.add_all([book, branch, Student(full_name=f"Budget Student {i}", faculty_id=faculty.id)])
+            session.flush()
+            session.add(Inventory(book_id=book.id, branch_id=branch.id, copies_total=2))
+        session.commit()
+
+    @pytest.mark.parametrize("url, budget", [
+        ('/inventories', 2),
+        ('/borrow', 3),
+        ('/books', 2),
+    ])
+    def test_list_pages_within_budget(self, client, test_session, query_budget, url, budget):
+        """Тест: число запросов списка не растёт с числом строк"""
+        self._fill(test_session, 10)
+        with query_budget(budget):
+            response = client.get(url)
+        assert response.status_code == 200
+
+    def test_copies_page_single_query(self, client, test_session, query_budget):
+        """Тест: страница остатков делает один запрос"""
+        self._fill(test_session, 1)
+        book = test_session.query(Book).one()
+        branch = test_session.query(Branch).one()
+        with query_budget(1):
+            response = client.get(f'/branches/{branch.id}/books/{book.id}/copies')
+        assert response.status_code == 200
+        assert b'Budget Book 0' in response.data
+
+    def test_response_has_query_headers(self, client, test_session):
+        """Тест: ответ содержит число запросов и время в БД"""
+        response = client.get('/inventories')
+        assert response.headers['X-DB-Queries'] == '2'
+        assert 'X-DB-Time-Ms' in response.headers
+        assert response.headers['Server-Timing'].startswith('db;dur=')
+
+    def test_failed_statement_leaves_no_start_time(self, test_engine):
+        """Тест: упавший оператор не оставляет время начала, следующие считаются верно"""
+        from sqlalchemy import text
+        with test_engine.connect() as conn, count_queries() as stats:
+            with pytest.raises(Exception):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            conn.rollback()
+            conn.execute(text("SELECT 1"))
+            assert conn.info.get("query_stats_start") == {}
+        assert stats.count == 1
+
+    def test_streamed_response_counted_in_history(self, client, test_session, monkeypatch):
+        """Тест: запросы потокового ответа попадают в /debug/queries после закрытия потока"""
+        monkeypatch.setenv("QUERY_STATS_DEBUG", "1")
+        test_session.add_all([Book(title=f"Stream Book {i}", year=2020) for i in range(3)])
+        test_session.commit()
+        response = client.get('/api/books')
+        assert b'Stream Book 2' in response.get_data()
+        response.close()
+        entry = next(e for e in client.get('/debug/queries').get_json()["requests"] if e["path"] == '/api/books')
+        assert entry["streamed"] is True
+        assert entry["queries"] >= 1
+
+
+class TestConditionalGet:
+    """Условные GET (ETag / Last-Modified) для списков"""
+
+    @pytest.mark.parametrize("url", ['/books', '/branches', '/students', '/inventories', '/events'])
+    def test_not_modified_without_main_query(self, client, test_session, query_budget, url):
+        """Тест: повторный запрос с If-None-Match — 304 и только запрос маркера"""
+        first = client.get(url)
+        assert first.status_code == 200
+        assert first.headers['Cache-Control'] == 'no-cache'
+        etag = first.headers['ETag']
+        with query_budget(1):
+            second = client.get(url, headers={'If-None-Match': etag})
+        assert second.status_code == 304
+        assert second.data == b''
+
+    def test_insert_changes_etag(self, client, test_session):
+        """Тест: новая строка меняет ETag"""
+        etag = client.get('/branches').headers['ETag']
+        test_session.add(Branch(name="New Branch", address="Addr"))
+        test_session.commit()
+        response = client.get('/branches', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert b'New Branch' in response.data
+
+    def test_update_changes_etag(self, client, test_session):
+        """Тест: правка строки меняет ETag"""
+        branch = Branch(name="Old Name", address="Addr")
+        test_session.add(branch)
+        test_session.commit()
+        etag = client.get('/branches').headers['ETag']
+        branch.name = "New Name"
+        test_session.commit()
+        response = client.get('/branches', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert b'New Name' in response.data
+
+    def test_update_after_backfill_changes_etag(self, client, test_session):
+        """Тест: правка строки, updated_at которой заполнен сервером (как в миграции), меняет ETag"""
+        from sqlalchemy import text
+        test_session.execute(text("INSERT INTO lib.branches (name, address) VALUES ('Backfilled', 'Addr')"))
+        test_session.commit()
+        etag = client.get('/branches').headers['ETag']
+        branch = test_session.query(Branch).filter_by(name="Backfilled").one()
+        branch.name = "Edited"
+        test_session.commit()
+        response = client.get('/branches', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert b'Edited' in response.data
+
+    def test_updated_at_server_default_is_utc(self):
+        """Тест: значение по умолчанию updated_at в PostgreSQL — UTC, как datetime.utcnow() в ORM"""
+        from sqlalchemy.dialects import postgresql
+        from sqlalchemy.schema import CreateTable
+        ddl = str(CreateTable(Branch.__table__).compile(dialect=postgresql.dialect()))
+        assert "updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT timezone('utc', now()) NOT NULL" in ddl
+
+    def test_postgres_marker_reads_indexes_only(self):
+        """Тест: маркер в PostgreSQL — max по индексам и счётчик удалений, без count(*) по таблице"""
+        from sqlalchemy import select
+        from sqlalchemy.dialects import postgresql
+        from app import _marker_columns
+        sql = str(select(*_marker_columns(Inventory, "postgresql")).compile(dialect=postgresql.dialect()))
+        assert "count(" not in sql
+        assert "lib.table_deletes" in sql
+        assert "max(lib.inventories.updated_at)" in sql
+        assert any(i.name == "ix_inventories_updated_at" for i in Inventory.__table__.indexes)
+
+    def test_delete_changes_etag(self, client, test_session):
+        """Тест: удаление строки меняет ETag"""
+        test_session.add_all([Branch(name="Keep", address="Addr"), Branch(name="Drop", address="Addr")])
+        test_session.commit()
+        etag = client.get('/branches').headers['ETag']
+        test_session.delete(test_session.query(Branch).filter_by(name="Drop").one())
+        test_session.commit()
+        assert client.get('/branches', headers={'If-None-Match': etag}).status_code == 200
+
+    def test_if_modified_since(self, client, test_session):
+        """Тест: If-Modified-Since без If-None-Match сравнивается с Last-Modified"""
+        test_session.add(Branch(name="Branch", address="Addr"))
+        test_session.commit()
+        last_modified = client.get('/branches').headers['Last-Modified']
+        response = client.get('/branches', headers={'If-Modified-Since': last_modified})
+        assert response.status_code == 304
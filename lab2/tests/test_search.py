@@ -0,0 +1,176 @@
+"""
+Тесты поиска по каталогу (индекс в памяти на SQLite, триггеры миграции 009 на PostgreSQL,
+маршрут /books/search)
+"""
+import importlib.util
+import os
+
+import pytest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import text
+
+from models import Author, Book, BookAuthor, Publisher
+from search import InvertedIndex, search_books, words
+
+MIGRATION_009 = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "alembic", "versions", "009_catalog_search.py")
+
+
+def _install_search_triggers(session):
+    """PostgreSQL: поисковый документ ведут функции и триггеры миграции 009, create_all их не создаёт"""
+    bind = session.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    spec = importlib.util.spec_from_file_location("migration_009_catalog_search", MIGRATION_009)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    with bind.begin() as conn, Operations.context(MigrationContext.configure(conn)):
+        migration.upgrade()
+
+
+@pytest.fixture
+def typos(test_session):
+    """Исправление опечаток: в PostgreSQL нужно расширение pg_trgm"""
+    bind = test_session.get_bind()
+    if bind.dialect.name == "postgresql" and not test_session.execute(
+            text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")).scalar():
+        pytest.skip("нет расширения pg_trgm")
+
+
+@pytest.fixture
+def catalog(test_session):
+    _install_search_triggers(test_session)
+    publisher = Publisher(name="Наука")
+    tolstoy = Author(full_name="Толстой Лев")
+    pushkin = Author(full_name="Пушкин Александр")
+    test_session.add_all([publisher, tolstoy, pushkin])
+    test_session.flush()
+    books = {
+        "war": Book(title="Война и мир", publisher_id=publisher.id),
+        "anna": Book(title="Анна Каренина"),
+        "onegin": Book(title="Евгений Онегин", publisher_id=publisher.id),
+        "history": Book(title="История войны 1812 года"),
+    }
+    test_session.add_all(books.values())
+    test_session.flush()
+    test_session.add_all([
+        BookAuthor(book_id=books["war"].id, author_id=tolstoy.id),
+        BookAuthor(book_id=books["anna"].id, author_id=tolstoy.id),
+        BookAuthor(book_id=books["onegin"].id, author_id=pushkin.id),
+    ])
+    test_session.commit()
+    return {name: book.id for name, book in books.items()}
+
+
+def _ids(page) -> list:
+    return [book_id for book_id, _ in page.hits]
+
+
+class TestInvertedIndex:
+    """Инвертированный индекс в памяти"""
+
+    def test_words_normalized(self):
+        """Тест: нижний регистр, ё -> е, пунктуация отбрасывается"""
+        assert words("Ёжик, в ТУМАНЕ!") == ["ежик", "в", "тумане"]
+
+    def test_all_terms_required_and_prefix_match(self):
+        """Тест: слова запроса — через И, каждое — префикс слова документа"""
+        index = InvertedIndex([(1, 1.0, "Война и мир"), (2, 1.0, "Мирная жизнь"), (3, 0.4, "Война")])
+        assert [b for b, _ in index.search(["мир"])] == [1, 2]
+        assert [b for b, _ in index.search(["вой", "мир"])] == [1]
+
+    def test_rank_by_field_weight(self):
+        """Тест: совпадение в названии выше совпадения в авторе, при равенстве — по id"""
+        index = InvertedIndex([(5, 0.4, "Толстой"), (7, 1.0, "Толстой"), (2, 1.0, "Толстой")])
+        assert index.search(["толстой"]) == [(2, 1.0), (7, 1.0), (5, 0.4)]
+
+    def test_correct_typo(self):
+        """Тест: неизвестное слово заменяется ближайшим из словаря"""
+        index = InvertedIndex([(1, 1.0, "Каренина")])
+        assert index.correct("карелина") == "каренина"
+        assert index.correct("кар") == "кар"
+
+
+class TestSearchBooks:
+    """search_books"""
+
+    def test_title_author_publisher(self, test_session, catalog):
+        """Тест: поиск по названию, автору и издательству"""
+        assert _ids(search_books(test_session, "каренина")) == [catalog["anna"]]
+        assert set(_ids(search_books(test_session, "толстой"))) == {catalog["war"], catalog["anna"]}
+        assert set(_ids(search_books(test_session, "наука"))) == {catalog["war"], catalog["onegin"]}
+
+    def test_terms_across_fields(self, test_session, catalog):
+        """Тест: слова запроса могут совпасть в разных полях (автор и название)"""
+        page = search_books(test_session, "толстой война")
+        assert _ids(page) == [catalog["war"]]
+
+    def test_typo_corrected(self, test_session, catalog, typos):
+        """Тест: пустой результат повторяется с исправленным запросом"""
+        page = search_books(test_session, "онегни")
+        assert page.corrected == "онегин"
+        assert _ids(page) == [catalog["onegin"]]
+
+    def test_empty_query(self, test_session, catalog):
+        """Тест: пустой запрос — пустая страница без обращения к индексу"""
+        assert search_books(test_session, "  ,. ").hits == []
+
+    def test_keyset_pages(self, test_session, catalog):
+        """Тест: страницы по курсору не пересекаются и покрывают все совпадения"""
+        first = search_books(test_session, "толстой", limit=1)
+        assert first.next_cursor
+        second = search_books(test_session, "толстой", cursor=first.next_cursor, limit=1)
+        assert second.next_cursor is None
+        assert set(_ids(first) + _ids(second)) == {catalog["war"], catalog["anna"]}
+
+    def test_truncated(self, test_session, catalog, monkeypatch):
+        """Тест: совпадений больше SEARCH_MAX_CANDIDATES — ранжируется их часть"""
+        monkeypatch.setenv("SEARCH_MAX_CANDIDATES", "1")
+        page = search_books(test_session, "толстой")
+        assert page.truncated
+        assert len(page.hits) == 1
+
+    def test_truncated_keeps_best_ranked(self, test_session, catalog, monkeypatch):
+        """Тест: при ограничении кандидатов остаётся лучший по рангу, а не первый найденный"""
+        monkeypatch.setenv("SEARCH_MAX_CANDIDATES", "1")
+        # «Наука» у двух книг — издательство (вес C); новая книга с этим словом в названии (вес A)
+        book = Book(title="Наука и жизнь")
+        test_session.add(book)
+        test_session.commit()
+        page = search_books(test_session, "наука")
+        assert page.truncated
+        assert _ids(page) == [book.id]
+
+    def test_index_rebuilt_after_commit(self, test_session, catalog):
+        """Тест: новая книга находится после COMMIT (версия таблицы в ref_cache)"""
+        assert search_books(test_session, "капитанская").hits == []
+        test_session.add(Book(title="Капитанская дочка"))
+        test_session.commit()
+        assert len(search_books(test_session, "капитанская").hits) == 1
+
+
+class TestSearchRoute:
+    """GET /books/search"""
+
+    def test_results_page(self, client, catalog, query_budget):
+        """Тест: страница с авторами и издательством за постоянное число запросов"""
+        with query_budget(5):
+            response = client.get('/books/search?q=толстой')
+        assert response.status_code == 200
+        html = response.get_data(as_text=True)
+        assert "Война и мир" in html
+        assert "Анна Каренина" in html
+        assert "Евгений Онегин" not in html
+
+    def test_corrected_query_shown(self, client, catalog, typos):
+        """Тест: исправленный запрос показывается пользователю"""
+        html = client.get('/books/search?q=каренена').get_data(as_text=True)
+        assert "Анна Каренина" in html
+        assert "каренина" in html
+
+    def test_bad_cursor_falls_back_to_first_page(self, client, catalog):
+        """Тест: испорченный курсор — первая страница"""
+        response = client.get('/books/search?q=толстой&cursor=garbage')
+        assert response.status_code == 200
+        assert "Война и мир" in response.get_data(as_text=True)
@@ -0,0 +1,119 @@
+"""
+Тесты потокового API чтения (NDJSON)
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, text
+
+from models import Book, Borrow, Branch, EventLog, Faculty, Inventory, Publisher, Student
+from streaming import ndjson_rows
+
+
+def _lines(response) -> list:
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def _records(lines) -> list:
+    return [line for line in lines if not any(key.startswith("_") for key in line)]
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    """Маленькие пачки курсора и частые контрольные точки: поток из нескольких фрагментов"""
+    monkeypatch.setenv("STREAM_YIELD_PER", "2")
+    monkeypatch.setenv("STREAM_CHECKPOINT_ROWS", "3")
+
+
+@pytest.fixture
+def books(test_session):
+    publisher = Publisher(name="Stream Publisher")
+    test_session.add(publisher)
+    test_session.flush()
+    test_session.add_all([
+        Book(title=f"Stream Book {i}", year=2000 + i, price=10 + i, publisher_id=publisher.id) for i in range(7)
+    ])
+    test_session.commit()
+    return [b.id for b in test_session.query(Book).order_by(Book.id)]
+
+
+class TestStreamApi:
+    """GET /api/<список> — NDJSON-поток с курсорами продолжения"""
+
+    def test_books_stream_with_checkpoints(self, client, books, small_batches):
+        """Тест: все записи по возрастанию id, контрольные точки и завершающая строка"""
+        response = client.get('/api/books')
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        lines = _lines(response)
+        records = _records(lines)
+        assert [r["id"] for r in records] == books
+        assert records[0]["publisher"] == "Stream Publisher"
+        assert records[0]["price"] == "10.00"
+        assert len([line for line in lines if "_resume" in line and "_done" not in line]) == 2
+        assert lines[-1]["_done"] is True
+
+    def test_resume_after_limit(self, client, books, small_batches):
+        """Тест: limit обрывает поток с _done=false, after продолжает без пропусков и повторов"""
+        first = _lines(client.get('/api/books?limit=4'))
+        assert first[-1]["_done"] is False
+        rest = _lines(client.get(f'/api/books?after={first[-1]["_resume"]}'))
+        ids = [r["id"] for r in _records(first) + _records(rest)]
+        assert ids == books
+        assert rest[-1]["_done"] is True
+
+    def test_invalid_cursor_and_limit(self, client, test_session):
+        """Тест: испорченный курсор и неположительный limit — 400 до начала потока"""
+        assert client.get('/api/books?after=broken').status_code == 400
+        assert client.get('/api/books?limit=0').status_code == 400
+
+    def test_borrows_filters_and_key(self, client, test_session, small_batches):
+        """Тест: фильтры истории выдач, порядок (borrowed_at, id), курсор из обоих полей"""
+        faculty = Faculty(name="Stream Faculty")
+        branch = Branch(name="Stream Branch", address="-")
+        book = Book(title="Borrowed", year=2020)
+        test_session.add_all([faculty, branch, book])
+        test_session.flush()
+        student = Student(full_name="Stream Student", faculty_id=faculty.id)
+        test_session.add(student)
+        test_session.flush()
+        start = datetime(2024, 2, 1)
+        for i in range(5):
+            test_session.add(Borrow(student_id=student.id, book_id=book.id, branch_id=branch.id,
+                                    borrowed_at=start - timedelta(hours=i), returned_at=start if i == 0 else None))
+        test_session.commit()
+        first = _lines(client.get('/api/borrows?active=1&limit=2'))
+        rest = _lines(client.get(f'/api/borrows?active=1&after={first[-1]["_resume"]}'))
+        records = _records(first) + _records(rest)
+        assert len(records) == 4
+        assert [r["borrowed_at"] for r in records] == sorted(r["borrowed_at"] for r in records)
+        assert records[0]["student"] == "Stream Student"
+        assert all(r["returned_at"] is None for r in records)
+
+    def test_inventories_and_events(self, client, test_session):
+        """Тест: вычисляемая доступность в инвентаре, details событий — JSON-объект"""
+        branch = Branch(name="Inv Branch", address="-")
+        book = Book(title="Inv Book", year=2020)
+        test_session.add_all([branch, book])
+        test_session.flush()
+        test_session.add(Inventory(book_id=book.id, branch_id=branch.id, copies_total=5, active_count=2))
+        test_session.add(EventLog(event="STREAMED", details={"book_id": book.id}))
+        test_session.commit()
+        inventory = _records(_lines(client.get(f'/api/inventories?book_id={book.id}')))
+        assert [(r["copies_total"], r["available"]) for r in inventory] == [(5, 3)]
+        events = _records(_lines(client.get(f'/api/events?event=STREAMED&book_id={book.id}')))
+        assert [e["details"] for e in events] == [{"book_id": book.id}]
+
+
+class TestNdjsonRows:
+    """Генератор ndjson_rows"""
+
+    def test_error_mid_stream(self, test_session):
+        """Тест: ошибка запроса — строка _error вместо оборванного ответа"""
+        from sqlalchemy.orm import sessionmaker
+        factory = sessionmaker(bind=test_session.get_bind())
+        stmt = select(text("id")).select_from(text("lib.no_such_table"))
+        lines = [json.loads(line) for chunk in ndjson_rows(factory, stmt, (Book.id,)) for line in chunk.splitlines()]
+        assert "_error" in lines[-1]
+        assert lines[-1]["_resume"] is None
@@ -0,0 +1,101 @@
+"""
+Тесты подсказок по префиксу для полей выбора (typeahead.py, /api/typeahead)
+"""
+import pytest
+
+from models import Book, Branch, Faculty, Student
+from typeahead import labels, suggest
+
+
+@pytest.fixture
+def students(test_session):
+    faculty = Faculty(name="Typeahead Faculty")
+    test_session.add(faculty)
+    test_session.flush()
+    names = ["Иванов Иван", "иванова Мария", "Ивлев Пётр", "Петров 100%", "Петров_2", "Сидоров Сидор"]
+    rows = [Student(full_name=name, faculty_id=faculty.id) for name in names]
+    test_session.add_all(rows)
+    test_session.commit()
+    return {row.full_name: row.id for row in rows}
+
+
+class TestSuggest:
+    """typeahead.suggest на SQLite"""
+
+    def test_prefix_case_insensitive_sorted(self, test_session, students):
+        """Тест: префикс без учёта регистра, результат по алфавиту"""
+        assert [label for _, label in suggest(test_session, "students", "ИВА")] == ["Иванов Иван", "иванова Мария"]
+        assert [label for _, label in suggest(test_session, "students", "ив")] == [
+            "Иванов Иван", "иванова Мария", "Ивлев Пётр",
+        ]
+
+    def test_limit_capped(self, test_session, students, monkeypatch):
+        """Тест: limit не больше TYPEAHEAD_MAX_LIMIT, пустой префикс — первые по алфавиту"""
+        monkeypatch.setenv("TYPEAHEAD_MAX_LIMIT", "2")
+        assert len(suggest(test_session, "students", "", limit=100)) == 2
+        assert len(suggest(test_session, "students", "ив", limit=1)) == 1
+
+    def test_like_wildcards_are_literal(self, test_session, students):
+        """Тест: % и _ в префиксе — обычные символы"""
+        assert [label for _, label in suggest(test_session, "students", "петров_")] == ["Петров_2"]
+        assert [label for _, label in suggest(test_session, "students", "петров 100%")] == ["Петров 100%"]
+
+    def test_new_row_visible_after_commit(self, test_session, students):
+        """Тест: список в памяти перестраивается после COMMIT в таблице"""
+        assert suggest(test_session, "branches", "нов") == []
+        test_session.add(Branch(name="Новый филиал", address="-"))
+        test_session.commit()
+        assert [label for _, label in suggest(test_session, "branches", "нов")] == ["Новый филиал"]
+
+    def test_labels(self, test_session, students):
+        """Тест: подписи выбранных значений по id"""
+        student_id = students["Ивлев Пётр"]
+        assert labels(test_session, "students", [student_id, None]) == {student_id: "Ивлев Пётр"}
+        assert labels(test_session, "students", [None]) == {}
+
+
+class TestTypeaheadRoute:
+    """GET /api/typeahead/<источник>"""
+
+    def test_json_and_cache_headers(self, client, students):
+        """Тест: JSON с id и подписями, кэшируемый ответ с ETag"""
+        response = client.get('/api/typeahead/students?q=сид')
+        assert response.status_code == 200
+        assert response.get_json() == {"items": [{"id": students["Сидоров Сидор"], "label": "Сидоров Сидор"}]}
+        assert response.cache_control.public
+        assert response.cache_control.max_age == 60
+        again = client.get('/api/typeahead/students?q=сид', headers={'If-None-Match': response.headers['ETag']})
+        assert again.status_code == 304
+
+    def test_unknown_source(self, client):
+        """Тест: неизвестный источник — 404"""
+        assert client.get('/api/typeahead/users?q=a').status_code == 404
+
+    def test_new_book_visible(self, client, test_session):
+        """Тест: книга, добавленная через форму, сразу есть в подсказках"""
+        client.post('/books/add', data={"title": "Свежая книга", "year": 2020})
+        items = client.get('/api/typeahead/books?q=свеж').get_json()["items"]
+        assert [item["label"] for item in items] == ["Свежая книга"]
+
+
+class TestFormsWithoutFullLists:
+    """Формы не выводят справочники целиком"""
+
+    def test_page_weight_does_not_grow(self, client, test_session, query_budget):
+        """Тест: /borrow не содержит <option> читателей и книг и не читает справочники"""
+        faculty = Faculty(name="Weight Faculty")
+        test_session.add(faculty)
+        test_session.flush()
+        test_session.add_all([Student(full_name=f"Weight Student {i}", faculty_id=faculty.id) for i in range(50)])
+        test_session.add_all([Book(title=f"Weight Book {i}", year=2020) for i in range(50)])
+        test_session.commit()
+        with query_budget(1):
+            response = client.get('/borrow')
+        assert b'Weight Student' not in response.data
+        assert b'Weight Book' not in response.data
+        assert b'data-typeahead' in response.data
+
+    def test_filter_shows_selected_label(self, client, students):
+        """Тест: выбранный в фильтре читатель показан подписью"""
+        html = client.get(f'/borrow?student_id={students["Ивлев Пётр"]}').get_data(as_text=True)
+        assert 'value="Ивлев Пётр"' in html
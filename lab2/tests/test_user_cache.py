@@ -0,0 +1,64 @@
+"""
+Тесты кэша пользователей (user_cache)
+"""
+from sqlalchemy.orm import sessionmaker
+
+from models import User
+from query_stats import count_queries
+import user_cache
+
+
+def _make_user(session, username="cached"):
+    user = User(username=username, email=f"{username}@example.com", password_hash="x")
+    session.add(user)
+    session.commit()
+    return user.id
+
+
+class TestUserCache:
+    """Тесты TTL-кэша load_user"""
+
+    def test_second_lookup_without_queries(self, test_session, test_engine):
+        """Тест: повторный поиск пользователя не обращается к БД"""
+        factory = sessionmaker(bind=test_engine, future=True)
+        user_id = _make_user(test_session)
+        assert user_cache.get(factory, user_id).username == "cached"
+        with count_queries() as stats:
+            user = user_cache.get(factory, user_id)
+        assert stats.count == 0
+        assert user.id == user_id
+        assert user.get_id() == str(user_id)
+
+    def test_update_invalidates(self, test_session, test_engine):
+        """Тест: изменение пользователя сбрасывает запись после COMMIT"""
+        factory = sessionmaker(bind=test_engine, future=True)
+        user_id = _make_user(test_session)
+        user_cache.get(factory, user_id)
+        test_session.get(User, user_id).username = "renamed"
+        test_session.commit()
+        assert user_cache.get(factory, user_id).username == "renamed"
+
+    def test_delete_invalidates(self, test_session, test_engine):
+        """Тест: удалённый пользователь больше не загружается"""
+        factory = sessionmaker(bind=test_engine, future=True)
+        user_id = _make_user(test_session)
+        user_cache.get(factory, user_id)
+        test_session.delete(test_session.get(User, user_id))
+        test_session.commit()
+        assert user_cache.get(factory, user_id) is None
+
+    def test_ttl_expiry(self, test_session, test_engine, monkeypatch):
+        """Тест: по истечении TTL пользователь перечитывается"""
+        factory = sessionmaker(bind=test_engine, future=True)
+        user_id = _make_user(test_session)
+        monkeypatch.setattr(user_cache, "TTL", 0)
+        user_cache.get(factory, user_id)
+        with count_queries() as stats:
+            user_cache.get(factory, user_id)
+        assert stats.count == 1
+
+    def test_cached_user_is_not_shared(self, test_session, test_engine):
+        """Тест: каждый вызов возвращает отдельный объект"""
+        factory = sessionmaker(bind=test_engine, future=True)
+        user_id = _make_user(test_session)
+        assert user_cache.get(factory, user_id) is not user_cache.get(factory, user_id)
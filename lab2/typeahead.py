@@ -0,0 +1,95 @@
+# typeahead.py
+"""
+Подсказки по префиксу для полей выбора (читатель, книга, филиал) вместо полных <select>:
+форма запрашивает GET /api/typeahead/<источник>?q=<префикс> и получает не больше
+TYPEAHEAD_MAX_LIMIT строк [{"id": ..., "label": ...}] по алфавиту.
+
+PostgreSQL (миграция 010): сравнение идёт по lower(название) COLLATE "C", для каждого
+источника — btree-индекс по тому же выражению. В collation C условие LIKE 'префикс%'
+превращается в диапазон индекса (как с text_pattern_ops), а порядок индекса совпадает с
+ORDER BY: страница подсказок — ограниченный проход по индексу без сортировки совпадений.
+
+Другие СУБД (SQLite в тестах): отсортированный список в памяти процесса, перестраивается
+через ref_cache после изменения таблицы (lower() в SQLite не знает кириллицы).
+"""
+import bisect
+import os
+
+from sqlalchemy import func, select
+
+import ref_cache
+from models import Book, Branch, Student
+
+# Источник -> (модель, колонка подписи)
+SOURCES = {
+    "students": (Student, Student.full_name),
+    "books": (Book, Book.title),
+    "branches": (Branch, Branch.name),
+}
+
+
+def settings() -> dict:
+    return {
+        "limit": int(os.getenv("TYPEAHEAD_LIMIT", "10")),
+        "max_limit": int(os.getenv("TYPEAHEAD_MAX_LIMIT", "50")),
+        # Время жизни ответа в кэше браузера: повторные нажатия не доходят до сервера
+        "max_age": int(os.getenv("TYPEAHEAD_MAX_AGE", "60")),
+    }
+
+
+def normalize(value: str) -> str:
+    return (value or "").strip().lower()
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _pg_suggest(session, model, label, prefix: str, limit: int) -> list:
+    key = func.lower(label).collate("C")
+    stmt = select(model.id, label).order_by(key, model.id).limit(limit)
+    if prefix:
+        stmt = stmt.where(key.like(_escape_like(prefix) + "%", escape="\\"))
+    return [(row[0], row[1]) for row in session.execute(stmt)]
+
+
+def _sorted_labels(session, name: str, model, label) -> list:
+    """[(подпись в нижнем регистре, id, подпись)] по возрастанию."""
+    return ref_cache.get(
+        f"typeahead_{name}", (model.__tablename__,),
+        lambda: sorted((normalize(text), id_, text) for id_, text in session.execute(select(model.id, label))),
+    )
+
+
+def _memory_suggest(session, name: str, model, label, prefix: str, limit: int) -> list:
+    entries = _sorted_labels(session, name, model, label)
+    start = bisect.bisect_left(entries, (prefix,))
+    found = []
+    for key, id_, text in entries[start:start + limit]:
+        if not key.startswith(prefix):
+            break
+        found.append((id_, text))
+    return found
+
+
+def suggest(session, name: str, q: str, limit: int | None = None) -> list:
+    """
+    [(id, подпись)] источника name, подпись которых начинается с q (без учёта регистра),
+    по алфавиту; не больше limit. KeyError — неизвестный источник.
+    """
+    model, label = SOURCES[name]
+    config = settings()
+    limit = max(1, min(limit or config["limit"], config["max_limit"]))
+    prefix = normalize(q)
+    if session.get_bind(clause=select(model)).dialect.name == "postgresql":
+        return _pg_suggest(session, model, label, prefix, limit)
+    return _memory_suggest(session, name, model, label, prefix, limit)
+
+
+def labels(session, name: str, ids) -> dict:
+    """{id: подпись} для уже выбранных значений (предзаполнение полей формы); один запрос по PK."""
+    model, label = SOURCES[name]
+    ids = [i for i in ids if i]
+    if not ids:
+        return {}
+    return dict(session.execute(select(model.id, label).where(model.id.in_(ids))).all())
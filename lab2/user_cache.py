@@ -0,0 +1,85 @@
+# user_cache.py
+"""
+Кэш пользователей для Flask-Login: load_user() обслуживается из памяти, без checkout
+соединения и запроса к БД на каждый запрос.
+
+Хранится снимок полей (без password_hash), на каждый запрос из него собирается новый
+отсоединённый объект User — общий экземпляр между потоками не разделяется.
+
+Запись живёт USER_CACHE_TTL секунд. Изменение или удаление пользователя через ORM
+сбрасывает запись после COMMIT (для записи мимо ORM — invalidate(user_id)); TTL
+ограничивает устаревание, если пользователя изменил другой процесс.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+import on_commit
+from models import User
+
+TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+MAXSIZE = 10000
+FIELDS = ("id", "username", "email", "created_at")
+
+_PENDING_KEY = "user_cache_changed"
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # id -> (истекает, снимок полей)
+
+
+def _snapshot(user) -> dict:
+    return {f: getattr(user, f) for f in FIELDS}
+
+
+def _build(snapshot: dict):
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
+
+def get(session_factory, user_id: int):
+    """User по id: из кэша или одним запросом к БД (результат кладётся в кэш)."""
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is not None and entry[0] > now:
+            _entries.move_to_end(user_id)
+            return _build(entry[1])
+    with session_factory() as session:
+        user = session.get(User, user_id)
+        if user is None:
+            return None
+        snapshot = _snapshot(user)
+    with _lock:
+        _entries[user_id] = (now + TTL, snapshot)
+        _entries.move_to_end(user_id)
+        while len(_entries) > MAXSIZE:
+            _entries.popitem(last=False)
+    return _build(snapshot)
+
+
+def invalidate(user_id: int | None = None):
+    with _lock:
+        if user_id is None:
+            _entries.clear()
+        else:
+            _entries.pop(user_id, None)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    ids = {obj.id for obj in (*session.dirty, *session.deleted) if isinstance(obj, User)}
+    if ids:
+        on_commit.pending(session, _PENDING_KEY, set).update(ids)
+
+
+def _invalidate_committed(user_ids: set):
+    for user_id in user_ids:
+        invalidate(user_id)
+
+
+on_commit.register(_PENDING_KEY, _invalidate_committed)